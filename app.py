@@ -1,17 +1,22 @@
 """Streamlit UI for RADIUS Accounting Assurance Test Bed"""
 
 import time
-import logging
 from typing import List
 import os
 import yaml
-from streamlit.logger import get_logger
 import streamlit as st
-import pytest
-import src.testbed_setup as ts
 from src.testbed_setup import TestConfig
 import src.files as files
 import src.inputs as inputs
+from src.jobs import JobManager, Job, QUEUED, RUNNING
+from src.live import LiveSeries
+from src.data_transfer import TRANSFER_MODES
+from src.payload import PAYLOAD_MODES
+from src.capture import CAPTURE_ENGINES
+from src.radius_server import RADIUS_SERVERS
+
+# Seconds between refreshes of the jobs panel
+JOBS_REFRESH = 2
 
 
 def get_selected_markers(possible_markers, checked_markers=[]) -> List[str]:
@@ -120,23 +125,95 @@ def checkbox_select_test_parts(
     return generate_pcap, execute_test_cases
 
 
+def checkbox_profile():
+    """Checkbox to profile the phases of a run"""
+    st.header("Profiling")
+    help = "Profile each phase with cProfile. Profiles and top-N summaries are written to the logs directory and the bundle."
+    profile = st.checkbox("Profile Phases", value=False, help=help)
+    help = "Also trace memory allocations with tracemalloc, this slows the run down."
+    profile_memory = st.checkbox("Profile Memory", value=False, help=help, disabled=not profile)
+    return profile, profile and profile_memory
+
+
 def text_input_client_interface(default=inputs.CLIENT_IFACE):
     """Client interface input field"""
     help = "Wireless interface used by the 802.1X client."
     return st.text_input("Client Interface", value=default, help=help)
 
+def text_input_client_interfaces(default=inputs.CLIENT_IFACES):
+    """Additional client interfaces input field"""
+    help = "Comma separated wireless interfaces, each runs its own concurrent session. Leave empty to use the client interface only."
+    value = st.text_input("Client Interfaces", value=", ".join(default or []), help=help)
+    return [iface.strip() for iface in value.split(",") if iface.strip()]
+
 def text_input_radius_port(default=inputs.RADIUS_PORT):
     """RADIUS port"""
     help = "RADIUS port to listen on."
     return st.number_input("RADIUS port", value=default, help=help)
 
 
+def selectbox_transfer_mode(default=inputs.TRANSFER_MODE):
+    """Transfer mode selection"""
+    help = "Run each data transfer endpoint in a thread or in its own worker process. Worker processes avoid GIL contention on multi-core test beds."
+    return st.selectbox("Transfer Mode", TRANSFER_MODES, index=TRANSFER_MODES.index(default), help=help)
+
+
+def selectbox_capture_engine(default=inputs.CAPTURE_ENGINE):
+    """Capture engine selection"""
+    help = "Capture RADIUS with tcpdump or in-process from an AF_PACKET ring buffer, which filters RADIUS in the kernel and needs no tcpdump process."
+    return st.selectbox("Capture Engine", CAPTURE_ENGINES, index=CAPTURE_ENGINES.index(default), help=help)
+
+
+def selectbox_radius_server(default=inputs.RADIUS_SERVER):
+    """RADIUS server selection"""
+    help = "Run FreeRADIUS or the built-in asyncio RADIUS server. The built-in server does not support EAP, use it for development with the load generator."
+    return st.selectbox("RADIUS Server", RADIUS_SERVERS, index=RADIUS_SERVERS.index(default), help=help)
+
+
+def selectbox_payload(default=inputs.PAYLOAD):
+    """Payload selection"""
+    help = "Data sent during transfers. random: incompressible buffer reused for every chunk, prng: random buffer sliced and stamped differently for every send so no two sends repeat, zeros: compressible zeros."
+    return st.selectbox("Payload", PAYLOAD_MODES, index=PAYLOAD_MODES.index(default), help=help)
+
+
 def text_input_server_interface(default=inputs.SERVER_IFACE):
     """Server interface input field"""
     help = "Interface used by the RADIUS and data servers."
     return st.text_input("Server Interface", value=default, help=help)
 
 
+def expander_socket_options(opts):
+    """Socket tuning options for data transfers, empty values keep kernel defaults"""
+    help = "Leave empty or 0 to keep the kernel default."
+    with st.expander("Socket Tuning"):
+        so_sndbuf = st.number_input(
+            "Send buffer size (SO_SNDBUF)", value=opts[inputs.KEY_SO_SNDBUF], min_value=0, step=1, help=help
+        )
+        so_rcvbuf = st.number_input(
+            "Receive buffer size (SO_RCVBUF)", value=opts[inputs.KEY_SO_RCVBUF], min_value=0, step=1, help=help
+        )
+        tcp_nodelay = st.checkbox("TCP_NODELAY", value=bool(opts[inputs.KEY_TCP_NODELAY]))
+        tcp_congestion = st.text_input(
+            "Congestion control (TCP_CONGESTION)", value=opts[inputs.KEY_TCP_CONGESTION] or "",
+            help="For example bbr or cubic. " + help,
+        )
+        tcp_maxseg = st.number_input(
+            "Maximum segment size (TCP_MAXSEG)", value=opts[inputs.KEY_TCP_MAXSEG], min_value=0, step=1, help=help
+        )
+        ip_tos = st.number_input(
+            "IP TOS", value=opts[inputs.KEY_IP_TOS], min_value=0, max_value=255, step=1,
+            help="TOS byte, DSCP is the upper 6 bits. " + help,
+        )
+    return {
+        inputs.KEY_SO_SNDBUF: int(so_sndbuf) if so_sndbuf else None,
+        inputs.KEY_SO_RCVBUF: int(so_rcvbuf) if so_rcvbuf else None,
+        inputs.KEY_TCP_NODELAY: tcp_nodelay or None,
+        inputs.KEY_TCP_CONGESTION: tcp_congestion or None,
+        inputs.KEY_TCP_MAXSEG: int(tcp_maxseg) if tcp_maxseg else None,
+        inputs.KEY_IP_TOS: int(ip_tos) if ip_tos else None,
+    }
+
+
 def text_input_local_output_directory(default=inputs.ROOT_DIR):
     help = (
         "Local output directory on the test bed where the test results will be stored."
@@ -144,16 +221,6 @@ def text_input_local_output_directory(default=inputs.ROOT_DIR):
     return st.text_input("Output directory on test bed", value=default, help=help)
 
 
-class StreamlitLogHandler(logging.Handler):
-    def __init__(self, widget_update_func):
-        super().__init__()
-        self.widget_update_func = widget_update_func
-
-    def emit(self, record):
-        msg = self.format(record)
-        self.widget_update_func(msg)
-
-
 def update_widget(msg):
     st.write(msg)
 
@@ -163,19 +230,86 @@ def get_possible_markers():
     pytest_ini_file = os.path.join(curdir, inputs.RELATIVE_PYTEST_INI)
     return files.get_marker_list(pytest_ini_file)
 
-def execute_test_cases(
-    config: ts.TestConfig, logger: logging.Logger, markers: List[str]
-):
-    """Run tests against PCAP."""
-    test_name = config.test_name
-    markers_str = " or ".join(markers)
-    logger.info("Executing Test Cases")
-    pytest_args = ["-v", "raatests", "--test_name", test_name]
-    extra_args = ["-m", markers_str]
-    pytest.main(pytest_args + extra_args)
-    logger.info(f"Finished test cases for {test_name} with markers: {markers_str}")
-    time.sleep(2)
-    logger.info(f"Tests executed. Results written to {config.local_output_directory}")
+def get_job_log(manager: JobManager, job_id: str) -> str:
+    """Return the log of a job, reading only what was written since the last refresh"""
+    logs = st.session_state.setdefault("job_logs", {})
+    text, offset = logs.get(job_id, ("", 0))
+    new_text, offset = manager.read_log(job_id, offset)
+    logs[job_id] = (text + new_text, offset)
+    return logs[job_id][0]
+
+
+def get_live_series(job: Job) -> LiveSeries:
+    """Return the live samples of a job, extended by what was written since the last refresh"""
+    series = st.session_state.setdefault("live_series", {})
+    if job.id not in series:
+        series[job.id] = LiveSeries(files.get_live_samples_filename(job.test_name, job.root_dir))
+    series[job.id].refresh()
+    return series[job.id]
+
+
+def show_live_dashboard(job: Job):
+    """Interface throughput next to the usage reported in accounting, on the same time axis"""
+    series = get_live_series(job)
+    if series.start is None:
+        return
+    st.subheader("Throughput (Mbit/s)")
+    st.line_chart(series.throughput, x="elapsed", y="value", color="series",
+                  x_label="Seconds since start", y_label="Mbit/s")
+    st.subheader("Cumulative Octets")
+    st.line_chart(series.octets, x="elapsed", y="value", color="series",
+                  x_label="Seconds since start", y_label="Octets")
+    for interface, lag in series.get_lag().items():
+        columns = st.columns(3)
+        age = lag["report_age"]
+        columns[0].metric(f"{interface} last usage report", "none yet" if age is None else f"{age:.0f} s ago")
+        columns[1].metric(f"{interface} upload not reported", f"{lag['unreported_upload']:,} B")
+        columns[2].metric(f"{interface} download not reported", f"{lag['unreported_download']:,} B")
+
+
+def format_job(job: Job) -> str:
+    """One line summary of a job"""
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job.created))
+    summary = f"{job.test_name} ({job.id}): {job.state}"
+    if job.state == RUNNING and job.phase:
+        summary += f", {job.phase}"
+    if job.duration is not None:
+        summary += f", {job.duration:.0f} s"
+    return f"{summary}, queued {started}"
+
+
+def show_job(manager: JobManager, job: Job, expanded=False):
+    """Job state, log and a cancel button while it is not done"""
+    with st.expander(format_job(job), expanded=expanded):
+        if not job.done and st.button("Cancel", key=f"cancel-{job.id}", disabled=job.cancel_requested):
+            manager.cancel(job.id)
+        if job.error:
+            st.error(job.error)
+        if job.done and job.exit_code not in (None, 0):
+            st.error(f"Job exited with code {job.exit_code}")
+        show_live_dashboard(job)
+        st.code(get_job_log(manager, job.id) or "No output yet", language="log")
+        if job.done:
+            st.write(f"Results written to {job.root_dir}")
+
+
+@st.fragment(run_every=JOBS_REFRESH)
+def show_jobs(jobs_dir: str):
+    """Jobs panel with logs and live charts, refreshed on its own so polling never blocks the rest of the page"""
+    manager = JobManager(jobs_dir)
+    jobs = manager.list_jobs()
+    active = [job for job in jobs if job.state in (QUEUED, RUNNING)]
+    done = [job for job in jobs if job.done]
+    st.header("Jobs")
+    if not jobs:
+        st.write("No jobs yet")
+        return
+    for job in active:
+        show_job(manager, job, expanded=job.state == RUNNING)
+    if done:
+        st.subheader("Completed Jobs")
+        for job in reversed(done):
+            show_job(manager, job)
 
 def get_all_optional_inputs(uploaded_file):
     """Merge default values with user input"""
@@ -192,6 +326,7 @@ def build_form(opts):
     test_name = text_input_test_name()
     chunk_size = number_input_chunk_size(opts[inputs.KEY_CHUNK_SIZE])
     chunks = number_input_num_chunks(opts[inputs.KEY_CHUNKS])
+    payload = selectbox_payload(opts[inputs.KEY_PAYLOAD])
     data_server_listen_port = text_input_data_server_listen_port(
         opts[inputs.KEY_DATA_SERVER_LISTEN_PORT]
     )
@@ -212,10 +347,15 @@ def build_form(opts):
     possible_markers = get_possible_markers()
     markers = get_selected_markers(possible_markers, opts[inputs.KEY_MARKERS])
     client_interface = text_input_client_interface(opts[inputs.KEY_CLIENT_IFACE])
+    client_interfaces = text_input_client_interfaces(opts[inputs.KEY_CLIENT_IFACES])
     server_interface = text_input_server_interface(opts[inputs.KEY_SERVER_IFACE])
     local_output_directory = text_input_local_output_directory(
         opts[inputs.KEY_ROOT_DIR]
     )
+    transfer_mode = selectbox_transfer_mode(opts[inputs.KEY_TRANSFER_MODE])
+    capture_engine = selectbox_capture_engine(opts[inputs.KEY_CAPTURE_ENGINE])
+    radius_server = selectbox_radius_server(opts[inputs.KEY_RADIUS_SERVER])
+    socket_options = expander_socket_options(opts)
     # Create TestConfig object with all the inputs
     config = TestConfig(
         test_name=test_name,
@@ -237,14 +377,26 @@ def build_form(opts):
         server_interface=server_interface,
         local_output_directory=local_output_directory,
         radius_port=int(radius_port),
+        so_sndbuf=socket_options[inputs.KEY_SO_SNDBUF],
+        so_rcvbuf=socket_options[inputs.KEY_SO_RCVBUF],
+        tcp_nodelay=socket_options[inputs.KEY_TCP_NODELAY],
+        tcp_congestion=socket_options[inputs.KEY_TCP_CONGESTION],
+        tcp_maxseg=socket_options[inputs.KEY_TCP_MAXSEG],
+        ip_tos=socket_options[inputs.KEY_IP_TOS],
+        transfer_mode=transfer_mode,
+        payload=payload,
+        buffer_size=int(opts[inputs.KEY_BUFFER_SIZE]),
+        client_interfaces=client_interfaces,
+        capture_engine=capture_engine,
+        radius_server=radius_server,
+        accounting_timeout=float(opts[inputs.KEY_ACCOUNTING_TIMEOUT]),
+        bundle_compression=opts[inputs.KEY_BUNDLE_COMPRESSION],
+        bundle_compression_level=int(opts[inputs.KEY_BUNDLE_COMPRESSION_LEVEL]),
     )
     return config
 
 def main():
 
-    # Set up logger
-    logger = get_logger(__name__)
-
     # Set header and see if a file is uploaded
     st.title("RADIUS Accounting Assurance Test Bed")
     uploaded_file = st.file_uploader("Upload config file", type=["yaml"])
@@ -253,17 +405,14 @@ def main():
     # Get all optional inputs, populate form with either default or uploaded values
     optional_inputs = get_all_optional_inputs(uploaded_file)
     config = build_form(optional_inputs)
+    profile, profile_memory = checkbox_profile()
     update_widget("")
 
-    # Run Tests when button is clicked
+    # Queue a job when button is clicked, it runs in the background and shows up in the jobs panel
+    jobs_dir = files.get_jobs_dir(config.local_output_directory)
     if st.button("Run Tests"):
-        config.write_yaml()
-        handler = StreamlitLogHandler(st.empty().code)
-        logger.addHandler(handler)
-        if config.generate_pcap:
-            ts.generate_pcap(config, logger)
-        if config.generate_report:
-            execute_test_cases(config, logger, config.markers)
+        JobManager(jobs_dir).submit(config.__to_dict__(), profile, profile_memory)
+    show_jobs(jobs_dir)
 
 
 if __name__ == "__main__":
@@ -4,12 +4,16 @@ import argparse
 import os
 import logging
 from typing import Union
-import pytest
 import yaml
 import src.testbed_setup as ts
-from src.metadata import get_metadata
+from src.profiling import Profiler, add_to_bundle
 from src import inputs
 from src import files
+from src.data_transfer import TRANSFER_MODES
+from src.payload import PAYLOAD_MODES
+from src.capture import CAPTURE_ENGINES
+from src.bundle import COMPRESSIONS
+from src.radius_server import RADIUS_SERVERS
 
 
 def get_possible_markers():
@@ -98,6 +102,12 @@ def parse_cliargs():
         default=None,
         help=f"default: {inputs.CLIENT_IFACE}",
     )
+    parser.add_argument(
+        f"--{inputs.KEY_CLIENT_IFACES}",
+        type=str,
+        default=None,
+        help="Comma separated client interfaces for concurrent sessions, default: client_iface only",
+    )
     parser.add_argument(
         f"--{inputs.KEY_SERVER_IFACE}",
         type=str,
@@ -109,6 +119,99 @@ def parse_cliargs():
         type=int,
         help=f"RADIUS server auth port, default: {inputs.RADIUS_PORT}",
     )
+    parser.add_argument(
+        f"--{inputs.KEY_SO_SNDBUF}",
+        type=int,
+        default=None,
+        help="Data socket send buffer size (SO_SNDBUF), default: kernel default",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_SO_RCVBUF}",
+        type=int,
+        default=None,
+        help="Data socket receive buffer size (SO_RCVBUF), default: kernel default",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_TCP_NODELAY}",
+        action="store_true",
+        default=None,
+        help="Disable Nagle's algorithm on data sockets (TCP_NODELAY)",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_TCP_CONGESTION}",
+        type=str,
+        default=None,
+        help="TCP congestion control algorithm for data sockets, e.g. bbr or cubic",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_TCP_MAXSEG}",
+        type=int,
+        default=None,
+        help="TCP maximum segment size for data sockets (TCP_MAXSEG)",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_IP_TOS}",
+        type=lambda value: int(value, 0),
+        default=None,
+        help="IP TOS byte for data sockets, e.g. 0xb8 for DSCP EF",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_TRANSFER_MODE}",
+        type=str,
+        default=None,
+        choices=TRANSFER_MODES,
+        help=f"Run transfer endpoints in threads or worker processes, default: {inputs.TRANSFER_MODE}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_PAYLOAD}",
+        type=str,
+        default=None,
+        choices=PAYLOAD_MODES,
+        help=f"Data sent during transfers, default: {inputs.PAYLOAD}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_BUFFER_SIZE}",
+        type=int,
+        default=None,
+        help=f"I/O buffer size used to send and receive chunks, default: {inputs.BUFFER_SIZE}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_CAPTURE_ENGINE}",
+        type=str,
+        default=None,
+        choices=CAPTURE_ENGINES,
+        help=f"Capture RADIUS with tcpdump or an in-process AF_PACKET ring, default: {inputs.CAPTURE_ENGINE}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_RADIUS_SERVER}",
+        type=str,
+        default=None,
+        choices=RADIUS_SERVERS,
+        help=f"Run FreeRADIUS or the built-in asyncio RADIUS server (no EAP), default: {inputs.RADIUS_SERVER}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_ACCOUNTING_TIMEOUT}",
+        type=float,
+        default=None,
+        help=f"Seconds to wait for Accounting Start, Interim-Update and Stop records in the capture, default: {inputs.ACCOUNTING_TIMEOUT}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_BUNDLE_COMPRESSION}",
+        type=str,
+        default=None,
+        choices=COMPRESSIONS,
+        help=f"Compression of the files in the bundle zip, default: {inputs.BUNDLE_COMPRESSION}",
+    )
+    parser.add_argument(
+        f"--{inputs.KEY_BUNDLE_COMPRESSION_LEVEL}",
+        type=int,
+        default=None,
+        help=f"Compression level of the bundle zip, default: {inputs.BUNDLE_COMPRESSION_LEVEL}",
+    )
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile each phase with cProfile, written to the logs directory and bundle")
+    parser.add_argument("--profile_memory", action="store_true",
+                        help="Also trace memory allocations of each phase with tracemalloc, implies --profile")
     parser.add_argument("--no_pcap", action="store_true",
                         help="Skip PCAP generation")
     parser.add_argument(
@@ -135,19 +238,6 @@ def convert_markers(markers: str) -> list:
     return [marker for marker in spaces_removed if marker]
 
 
-def execute_test_cases(config: ts.TestConfig, logger: logging.Logger):
-    """Run tests against PCAP."""
-    test_name = config.test_name
-    metadata = get_metadata(test_name, config.local_output_directory)
-    logger.info(
-        f'\n\nMetadata for "{test_name}":\n{metadata.pretty_print_format()}\n')
-    markers = " or ".join(config.markers)
-    pytest_args = ["-v", "raatests", "--test_name", test_name]
-    extra_args = ["-m", markers]
-    logger.debug(f"\n\npytest args: {pytest_args + extra_args}\n")
-    pytest.main(pytest_args + extra_args)
-
-
 def change_marker_format(markers: str, delim=",") -> Union[list, None]:
     """Convert markers string to list."""
     possible_delims = [",", ";", " "]
@@ -188,6 +278,8 @@ def fix_cliargs(cliargs: dict) -> dict:
     cliargs[inputs.KEY_GENERATE_REPORT] = not cliargs.pop('no_test')
     if cliargs["markers"] is not None:
         cliargs["markers"] = change_marker_format(cliargs["markers"])
+    if cliargs[inputs.KEY_CLIENT_IFACES] is not None:
+        cliargs[inputs.KEY_CLIENT_IFACES] = convert_markers(cliargs[inputs.KEY_CLIENT_IFACES])
     return cliargs
 
 def main():
@@ -209,13 +301,22 @@ def main():
     files.init_dirs(config.local_output_directory)
     config.write_yaml()
 
+    profiler = Profiler(
+        config.test_name, config.local_output_directory,
+        enabled=cliargs["profile"], memory=cliargs["profile_memory"],
+    )
+
     # Generate PCAP if enabled.
     if config.generate_pcap:
-        ts.generate_pcap(config, logger, cliargs["debug"])
+        with profiler.phase("generate_pcap"):
+            ts.generate_pcap(config, logger, cliargs["debug"])
 
     # Execute tests if enabled.
     if config.generate_report:
-        execute_test_cases(config, logger)
+        with profiler.phase("test_cases"):
+            ts.execute_test_cases(config, logger)
+        if profiler.enabled:
+            add_to_bundle(config.test_name, config.local_output_directory)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""Run a campaign of tests from a YAML matrix, analysing each run while the next one captures.
+
+Example campaign file:
+
+    test_name: fw_matrix
+    data_server_ip: 10.10.10.10
+    data_server_port: 8000
+    sut_software: "1.0"          # any option of an appcli.py config file
+    matrix:
+      chunk_size: [1024, 65536]
+      direction:                 # a list of dicts sets several options per value
+        - {download_chunks: true, upload_chunks: false}
+        - {download_chunks: false, upload_chunks: true}
+
+Runs are named fw_matrix_001, fw_matrix_002, ... and each writes its own config file.
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+import yaml
+import src.testbed_setup as ts
+from src import inputs
+from src import files
+
+KEY_MATRIX = "matrix"
+# Analysis yields the CPU to the capture of the next run
+ANALYSIS_NICENESS = 10
+
+
+def expand_matrix(matrix: dict) -> List[dict]:
+    """Return the options of every combination of the matrix values, first axis varies slowest"""
+    axes = []
+    for key, values in (matrix or {}).items():
+        if not isinstance(values, list):
+            values = [values]
+        axes.append([value if isinstance(value, dict) else {key: value} for value in values])
+    combinations = []
+    for combination in itertools.product(*axes):
+        options = {}
+        for value in combination:
+            options.update(value)
+        combinations.append(options)
+    return combinations
+
+
+def get_run_name(test_name: str, index: int) -> str:
+    """Test name of the index-th run of a campaign, counting from 1"""
+    return f"{test_name}_{index:03d}"
+
+
+def build_configs(campaign: dict) -> List[ts.TestConfig]:
+    """Expand a campaign into one TestConfig per run, matrix values override the base options"""
+    base = {key: value for key, value in campaign.items() if key != KEY_MATRIX}
+    configs = []
+    for index, options in enumerate(expand_matrix(campaign.get(KEY_MATRIX)), start=1):
+        merged = {**base, **options}
+        configs.append(ts.get_testconfig(
+            get_run_name(merged[inputs.KEY_TEST_NAME], index),
+            merged[inputs.KEY_DATA_SERVER_IP],
+            int(merged[inputs.KEY_DATA_SERVER_PORT]),
+            options,
+            base,
+        ))
+    return configs
+
+
+def analyze(config: ts.TestConfig, debug=False) -> int:
+    """Run test cases, report and bundle of one run, called in a worker process"""
+    os.nice(ANALYSIS_NICENESS)
+    ts.setup_logging(debug)
+    return int(ts.execute_test_cases(config, logging.getLogger(__name__)))
+
+
+def run_campaign(configs: List[ts.TestConfig], logger: logging.Logger, debug=False, workers=1) -> dict:
+    """Capture runs back to back while earlier runs are analysed, return pytest's exit code per run"""
+    begin = time.perf_counter()
+    capture_time = 0
+    futures = {}
+    # A fresh process per analysis, pytest can not run twice in one interpreter
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        for config in configs:
+            files.init_dirs(config.local_output_directory)
+            config.write_yaml()
+            if config.generate_pcap:
+                logger.info(f'Capturing "{config.test_name}"')
+                begin_capture = time.perf_counter()
+                ts.generate_pcap(config, logger, debug)
+                capture_time += time.perf_counter() - begin_capture
+            if config.generate_report:
+                futures[config.test_name] = executor.submit(analyze, config, debug)
+        logger.info("All captures done, waiting for %d analyses", len(futures))
+        results = {name: future.result() for name, future in futures.items()}
+    logger.info(
+        f"Campaign of {len(configs)} runs finished in {time.perf_counter() - begin:.1f} s, "
+        f"captures took {capture_time:.1f} s"
+    )
+    for name, exit_code in results.items():
+        logger.info(f"{name}: {'passed' if exit_code == 0 else f'failed (pytest exit code {exit_code})'}")
+    return results
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run a matrix of tests from a YAML campaign file")
+    parser.add_argument("campaign", type=str, help="Campaign file with base options and a matrix")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Runs analysed at the same time, default: 1")
+    parser.add_argument("--list", action="store_true", help="Only list the runs of the campaign")
+    parser.add_argument("--debug", action="store_true")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Main function to run a campaign."""
+    cliargs = parse_cliargs(args)
+    logger = logging.getLogger(__name__)
+    ts.setup_logging(cliargs.debug)
+    with open(cliargs.campaign, "r", encoding="utf-8") as file:
+        campaign = yaml.safe_load(file)
+    configs = build_configs(campaign)
+    if cliargs.list:
+        for config in configs:
+            print(f"{config.test_name}: chunk_size={config.chunk_size} chunks={config.chunks} "
+                  f"upload={config.upload_chunks} download={config.download_chunks} "
+                  f"sut_software={config.sut_software}")
+        return {}
+    return run_campaign(configs, logger, cliargs.debug, cliargs.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,31 @@
 import pytest
 import os
 import sys
-import logging
-from zipfile import ZipFile
 from typing import List
 from scapy.all import Radius
-from fpdf import FPDF, XPos, YPos
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-import src.pcap_extract as pe
 import src.files as files
+import src.tracing as tracing
+import src.checks as checks
+import src.report as report
+import src.bundle as bundle
 from src.metadata import Metadata, get_metadata
-from src.inputs import ROOT_DIR as DEFAULT_ROOT_DIR
+from src.analysis import AnalysisContext, ClientAnalysis
+from src.inputs import ROOT_DIR as DEFAULT_ROOT_DIR, BUNDLE_COMPRESSION, BUNDLE_COMPRESSION_LEVEL
 
 
 ARGNAME_ROOT_DIR = "--root_dir"
 ARGNAME_TEST_NAME = "--test_name"
+ARGNAME_NO_CHECK_CACHE = "--no_check_cache"
+ARGNAME_REPORT_FORMAT = "--report_format"
+ARGNAME_RENDER = "--render"
+ARGNAME_BUNDLE_COMPRESSION = "--bundle_compression"
+ARGNAME_BUNDLE_COMPRESSION_LEVEL = "--bundle_compression_level"
+
+RENDER_BACKGROUND = "background"
+RENDER_INLINE = "inline"
+RENDER_NONE = "none"
 
 
 def pytest_addoption(parser):
@@ -31,267 +41,84 @@ def pytest_addoption(parser):
         required=True,
         help="Name of test",
     )
+    parser.addoption(
+        ARGNAME_NO_CHECK_CACHE,
+        action="store_true",
+        help="Run every check instead of reusing results cached next to the report",
+    )
+    parser.addoption(
+        ARGNAME_REPORT_FORMAT,
+        action="append",
+        choices=report.FORMATS,
+        help="Report format rendered from the results, can be repeated, default: pdf",
+    )
+    parser.addoption(
+        ARGNAME_RENDER,
+        choices=[RENDER_BACKGROUND, RENDER_INLINE, RENDER_NONE],
+        default=RENDER_BACKGROUND,
+        help="Render reports and zip the bundle in a background process, in this process, "
+        "or only zip the bundle, default: background",
+    )
+    parser.addoption(
+        ARGNAME_BUNDLE_COMPRESSION,
+        choices=bundle.COMPRESSIONS,
+        default=BUNDLE_COMPRESSION,
+        help=f"Compression of the bundle zip, default: {BUNDLE_COMPRESSION}",
+    )
+    parser.addoption(
+        ARGNAME_BUNDLE_COMPRESSION_LEVEL,
+        type=int,
+        default=BUNDLE_COMPRESSION_LEVEL,
+        help=f"Compression level of the bundle zip, default: {BUNDLE_COMPRESSION_LEVEL}",
+    )
 
 
-class PDF(FPDF):
-    def __init__(self, test_name: str, metadata: Metadata):
-        super().__init__(orientation="L")
-        self.test_name = test_name
-        self.metadata = metadata
-
-    def header(self):
-        self.set_font("Helvetica", "B", size=14)
-        self.cell(
-            0,
-            18,
-            f'Test Report for "{self.test_name}"',
-            0,
-            align="C",
-            new_x=XPos.LMARGIN,
-            new_y=YPos.NEXT,
-        )
-        # Add logos
-        self.image("media/raa.logo.png", x=240, y=8, w=45, h=15)
-        self.image("media/wba.logo.png", x=5, y=8, w=50, h=15)
-
-    def unset_color(self):
-        self.set_text_color(0, 0, 0)
-
-    def set_color(self, result: str):
-        if result.lower() == "passed":
-            self.set_text_color(0, 128, 0)
-        elif result.lower() == "failed":
-            self.set_text_color(128, 0, 0)
-        else:
-            self.unset_color()
-
-    def testcase_detail(self, title, markers, result, context):
-        """Create a section showing details of each test case."""
-
-        def create_border():
-            """Create a border for the test case details."""
-            self.set_draw_color(0, 0, 0)  # Set border color (black)
-            self.set_line_width(0.25)  # Set border line width
-            self.line(10, self.get_y(), 200, self.get_y())
-            self.ln(2)
-
-        def create_cell(
-            title: str, body: str = "", bold_title=False, size=10, whitespace=" "
-        ):
-            """Basic cell creation function for test case details."""
-
-            if bold_title:
-                self.set_font(style="B", size=size)
-            else:
-                self.set_font(style="", size=size)
-            title_width = self.get_string_width(title + whitespace)
-            self.cell(title_width, 8, title, 0, align="L")
-            self.set_font(style="", size=size)
-            self.set_color(body)
-            self.multi_cell(
-                0,
-                8,
-                body,
-                0,
-                align="L",
-                new_x=XPos.LMARGIN,
-                new_y=YPos.NEXT,
-            )
-            self.unset_color()
-
-        create_border()
-        create_cell(title, bold_title=True, size=11)
-        create_cell("markers :", ", ".join(markers))
-        create_cell("result :", result.upper())
-        create_cell("context :", context)
-        self.ln(5)
-
-
-class CustomPDFReportPlugin:
-    """Custom plugin to generate a PDF report with test results."""
+class ResultsPlugin:
+    """Collect test case results, written as JSON when the session ends and rendered as reports elsewhere."""
 
     def __init__(self):
-        self.test_results = []
+        self.test_results: List[report.TestCaseResult] = []
 
     def pytest_runtest_logreport(self, report):
         if report.when == "call":
             possible_markers = set(pytest.mark._markers)
             test_keywords = set(report.keywords)
             test_markers = list(possible_markers & test_keywords)
-            self.test_results.append(
-                (test_markers, report.nodeid, report.outcome, report.capstdout)
-            )
+            self.test_results.append(self.__get_result(report, test_markers))
+            tracer = tracing.get_tracer()
+            if tracer is not None:
+                tracer.add(report.nodeid, int(report.start * 1e6), int(report.duration * 1e6),
+                           "test", {"outcome": report.outcome})
+
+    @staticmethod
+    def __get_result(test_report, markers: List[str]):
+        check = dict(test_report.user_properties).get("check")
+        return report.TestCaseResult(
+            nodeid=test_report.nodeid,
+            markers=markers,
+            outcome=test_report.outcome,
+            context=test_report.capstdout,
+            duration=test_report.duration,
+            check=check,
+        )
 
     def pytest_sessionfinish(self, session):
-        """After the test is finished, generate a PDF report with test results."""
+        """Write results, then render reports and zip the bundle as asked for."""
         root_dir = session.config.getoption(ARGNAME_ROOT_DIR)
         test_name = session.config.getoption(ARGNAME_TEST_NAME)
-
-        # Raise errors if the files are not found
-        metadata = get_metadata(test_name, root_dir)
-
-        # Create table headers
-        markers_title = "Marker(s)"
-        category_title = "Category"
-        test_case_title = "Test Case"
-        result_title = "Result"
-        test_file_title = "File"
-        context_title = "Context"
-
-        # Get list of all cell values to calculate max width
-        markers_list = [markers_title]
-        category_list = [category_title]
-        test_case_list = [test_case_title]
-        result_list = [result_title]
-        test_file_list = [test_file_title]
-        context_list = [context_title]
-
-        for markers, test, result, context in self.test_results:
-            split_test = test.split("::")
-            markers_str = ", ".join(markers)
-            if len(split_test) == 2:
-                test_file, test_case = split_test
-                category = ""
-            else:
-                assert len(split_test) == 3
-                test_file, category, test_case = split_test
-
-            markers_list.append(markers_str)
-            category_list.append(category)
-            test_case_list.append(test_case)
-            context_list.append(context)
-            test_file_list.append(test_file)
-            result_list.append(result.upper())
-
-        # Create PDF
-        pdf = PDF(test_name=test_name, metadata=metadata)
-        pdf.add_page()
-
-        date_format = "%Y-%m-%d %H:%M:%S"
-        d = metadata
-        start_time = d.start_time.strftime(date_format)
-        end_time = d.end_time.strftime(date_format)
-        passed_count = sum(1 for item in result_list if item.lower() == "passed")
-        failed_count = sum(1 for item in result_list if item.lower() == "failed")
-        pdf.set_font("Helvetica", size=11)
-
-        def cell_template(text: str, align="L"):
-            pdf.cell(0, 7, text, 0, align=align, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-
-        cell_template(
-            f"Passed: {passed_count}, Failed: {failed_count}, Total: {len(self.test_results)}",
-            align="C",
-        )
-        pdf.ln(10)
-
-        pdf.set_font(style="B")
-        cell_template("--- Test Metadata---")
-        pdf.set_font(style="")
-        cell_template(f"Name: {test_name}")
-        cell_template(f"SUT Brand: {d.sut_brand}")
-        cell_template(f"SUT Hardware: {d.sut_hardware}")
-        cell_template(f"SUT Software: {d.sut_software}")
-        cell_template(f"Start Time: {start_time}")
-        cell_template(f"End Time: {end_time}")
-        cell_template(f"Chunks: {d.chunks}")
-        cell_template(f"Chunk Size: {d.chunk_size}")
-        cell_template(f"Uploaded: {d.uploaded}")
-        cell_template(f"Downloaded: {d.downloaded}")
-        cell_template(f"Session Duration (s): {d.session_duration}")
-        cell_template(f"Username: {d.username}")
-        pdf.ln(10)
-
-        pdf.set_font(style="B")
-        cell_template("--- Test Case Summary---")
-        pdf.ln(5)
-        pdf.set_font(style="")
-        # Common setup for all cells
-        pdf.set_font("Helvetica", size=10)
-        cell_height = 10
-        whitespace = 3
-
-        # Get max width for each column
-        def get_max_width(cell):
-            return max([pdf.get_string_width(text) for text in cell])
-
-        width_markers = get_max_width(markers_list)
-        width_category = get_max_width(category_list)
-        width_test_case = get_max_width(test_case_list)
-        width_result = get_max_width(result_list)
-        width_test_file = get_max_width(test_file_list)
-        # width_context = get_max_width(context_list)
-
-        # Write data to table
-        for marker, category, test_case, result, test_file, context in zip(
-            markers_list,
-            category_list,
-            test_case_list,
-            result_list,
-            test_file_list,
-            context_list,
-        ):
-            pdf.cell(width_markers + whitespace, cell_height, marker, border=1)
-            pdf.cell(
-                width_category + whitespace,
-                cell_height,
-                category.replace("Test", ""),
-                border=1,
-            )
-            pdf.cell(
-                width_test_case + whitespace,
-                cell_height,
-                test_case.replace("test_", ""),
-                border=1,
-            )
-
-            # Set color based on result, red=failed, green=passed
-            if result.lower() == "passed":
-                pdf.set_text_color(0, 128, 0)
-            if result.lower() == "failed":
-                pdf.set_text_color(128, 0, 0)
-            pdf.cell(width_result + whitespace, cell_height, result, border=1)
-
-            pdf.set_text_color(0, 0, 0)
-            pdf.cell(width_test_file + whitespace, cell_height, test_file, border=1)
-            # pdf.cell(width_context + whitespace, cell_height, context, border=1)
-            pdf.ln()
-
-        pdf.add_page()
-
-        # Add details for each test
-        pdf.ln(10)
-        pdf.set_font(style="B", size=11)
-        cell_template("--- Test Case Details---")
-        pdf.ln(5)
-        pdf.set_font(style="", size=10)
-
-        for markers, title, result, context in self.test_results:
-            pdf.testcase_detail(
-                title=title, markers=markers, result=result, context=context
-            )
-
-        # Write PDF to file
-        report_fullpath = files.get_report_filename(test_name, root_dir)
-        logging.info(f"Writing report to {report_fullpath}")
-        pdf.output(report_fullpath)
-        logging.info(f"Report written to {report_fullpath}")
-
-
-def create_zip_archive(zip_file_name, root_dir, files_to_zip):
-    """Create a ZIP archive from files matching the given patterns."""
-    with ZipFile(zip_file_name, "w") as zipf:
-        for file_to_zip in files_to_zip:
-            zipf.write(file_to_zip, arcname=file_to_zip.removeprefix(root_dir))
-    logging.info(f"Wrote ZIP archive to {zip_file_name}")
-
-
-def pytest_sessionfinish(session, exitstatus):
-    """Run after the test session and plugins are finished."""
-    test_name = session.config.getoption(ARGNAME_TEST_NAME)
-    root_dir = session.config.getoption(ARGNAME_ROOT_DIR)
-    zip_file_name = files.get_zipped_bundle_filename(test_name, root_dir)
-    files_to_zip = files.get_all_files(test_name, root_dir)
-    create_zip_archive(zip_file_name, root_dir=root_dir, files_to_zip=files_to_zip)
+        formats = session.config.getoption(ARGNAME_REPORT_FORMAT) or [report.PDF]
+        render = session.config.getoption(ARGNAME_RENDER)
+        compression = session.config.getoption(ARGNAME_BUNDLE_COMPRESSION)
+        level = session.config.getoption(ARGNAME_BUNDLE_COMPRESSION_LEVEL)
+        with tracing.span("write results"):
+            report.write_results(test_name, root_dir, self.test_results)
+        # The bundle is zipped before this process stops tracing, write the test case spans for it now
+        tracing.flush_trace()
+        if render == RENDER_BACKGROUND:
+            report.start_render(test_name, root_dir, formats, True, compression, level)
+            return
+        with tracing.span("render reports"):
+            report.render(test_name, root_dir, formats if render == RENDER_INLINE else [], True, compression, level)
 
 
 def pytest_configure(config):
@@ -308,32 +135,92 @@ def pytest_configure(config):
     assert os.path.exists(pcap_file), f"PCAP file not found: {pcap_file}"
     assert os.path.exists(metadata_file), f"Metadata file not found: {metadata_file}"
     # These functions will raise errors if the files are not found
-    config.pluginmanager.register(CustomPDFReportPlugin())
+    config.pluginmanager.register(ResultsPlugin())
 
 
 def pytest_unconfigure(config):
     """Unload plugins."""
-    plugin = config.pluginmanager.get_plugin(CustomPDFReportPlugin)
+    plugin = config.pluginmanager.get_plugin(ResultsPlugin)
     if plugin is not None:
         config.pluginmanager.unregister(plugin)
 
 
+def pytest_generate_tests(metafunc):
+    """Run every test case once per client session when the test had several clients."""
+    if "client_index" not in metafunc.fixturenames:
+        return
+    test_name = metafunc.config.getoption(ARGNAME_TEST_NAME)
+    root_dir = metafunc.config.getoption(ARGNAME_ROOT_DIR)
+    clients = get_metadata(test_name, root_dir).get_all_clients()
+    if len(clients) > 1:
+        metafunc.parametrize(
+            "client_index",
+            range(len(clients)),
+            ids=[client.client_interface or str(i) for i, client in enumerate(clients)],
+        )
+
+
 @pytest.fixture
-def metadata(request) -> Metadata:
-    """Return metadata for a given test name."""
+def client_index() -> int:
+    """Index of the client session under test, parametrized for multi-client tests."""
+    return 0
+
+
+@pytest.fixture(scope="session")
+def analysis(request) -> AnalysisContext:
+    """Parse the PCAP and metadata once for all test cases."""
     test_name = request.config.getoption(ARGNAME_TEST_NAME)
     root_dir = request.config.getoption(ARGNAME_ROOT_DIR)
-    return get_metadata(test_name, root_dir)
+    return AnalysisContext(test_name, root_dir)
+
+
+@pytest.fixture
+def client(analysis, client_index) -> ClientAnalysis:
+    """Return packets and derived views of the client session under test."""
+    return analysis.clients[client_index]
+
+
+@pytest.fixture
+def metadata(client) -> Metadata:
+    """Return metadata of the client session under test."""
+    return client.metadata
 
 
 @pytest.fixture
-def packets(request) -> List[Radius]:
-    """Return relevant packets from PCAP file."""
+def packets(client) -> List[Radius]:
+    """Return packets of the client session under test, shared by all test cases."""
+    return client.packets
+
+
+@pytest.fixture(scope="session")
+def check_cache(request):
+    """Check results of earlier runs over the same capture, saved when the session ends."""
+    if request.config.getoption(ARGNAME_NO_CHECK_CACHE):
+        yield None
+        return
     test_name = request.config.getoption(ARGNAME_TEST_NAME)
     root_dir = request.config.getoption(ARGNAME_ROOT_DIR)
-    metadata = get_metadata(test_name, root_dir)
-    username = metadata.username
-    radius_port = metadata.radius_port
-    pcap_file = files.get_pcap_filename(test_name, root_dir)
-    pcap = pe.get_relevant_packets(pcap_file, username, radius_port)
-    return pcap
+    cache = checks.CheckCache(test_name, root_dir)
+    yield cache
+    cache.save()
+
+
+@pytest.fixture
+def check(request, analysis, client_index, check_cache):
+    """Run a check of src.checks for the client session under test and report it as the test outcome."""
+
+    def run(func) -> checks.CheckResult:
+        registered = checks.CHECKS[func.__name__]
+        if check_cache is None:
+            result = checks.run_check(registered, analysis.clients[client_index], raise_errors=True)
+        else:
+            result = check_cache.run(registered, analysis, client_index, raise_errors=True)
+        print(result.context, end="")
+        request.node.user_properties.append(("check", result.to_dict()))
+        if result.outcome == checks.SKIPPED:
+            pytest.skip(result.message)
+        if result.outcome == checks.FAILED:
+            pytest.fail(result.message, pytrace=False)
+        return result
+
+    return run
@@ -0,0 +1,104 @@
+"""Parse a test's capture and metadata once and derive the views its test cases check."""
+
+from functools import cached_property
+from typing import List, Union
+from scapy.all import Radius
+import src.files as files
+import src.pcap_extract as pe
+import src.tracing as tracing
+from src.metadata import Metadata, get_metadata
+
+ACCESS_REQUEST = 1
+ACCOUNTING_REQUEST = 4
+
+
+class ClientAnalysis:
+    """RADIUS packets of one client session and views derived from them.
+
+    Views are computed on first use and shared by all test cases, treat them as read-only."""
+
+    def __init__(self, metadata: Metadata, packets: List[Radius]):
+        self.metadata = metadata
+        self.packets = packets
+
+    @cached_property
+    def accept_packets(self) -> List[Radius]:
+        return pe.get_accept_packets(self.packets)
+
+    @cached_property
+    def start_packets(self) -> List[Radius]:
+        return pe.get_start_packets(self.packets)
+
+    @cached_property
+    def update_packets(self) -> List[Radius]:
+        return pe.get_update_packets(self.packets)
+
+    @cached_property
+    def stop_packets(self) -> List[Radius]:
+        return pe.get_stop_packets(self.packets)
+
+    @cached_property
+    def accounting_requests(self) -> List[Radius]:
+        return pe.get_packets_by_codes(self.packets, ACCOUNTING_REQUEST)
+
+    @cached_property
+    def session_requests(self) -> List[Radius]:
+        """Access-Requests and Accounting-Requests"""
+        return pe.get_packets_by_codes(self.packets, ACCESS_REQUEST, ACCOUNTING_REQUEST)
+
+    @cached_property
+    def acct_session_ids(self) -> list:
+        """Acct-Session-Id values of all Accounting-Requests"""
+        return [value for packet in self.accounting_requests for value in pe.get_acct_session_id(packet)]
+
+    @cached_property
+    def latest_packet(self) -> Union[Radius, None]:
+        return pe.get_latest_radius_packet(self.packets)
+
+    @cached_property
+    def usage_packets(self) -> List[Radius]:
+        """Interim-Updates followed by Stops, the records carrying usage"""
+        return self.update_packets + self.stop_packets
+
+    @cached_property
+    def input_octets(self) -> List[int]:
+        """Total input octets including gigawords of every usage packet"""
+        return [pe.get_total_input_octets(packet) for packet in self.usage_packets]
+
+    @cached_property
+    def output_octets(self) -> List[int]:
+        """Total output octets including gigawords of every usage packet"""
+        return [pe.get_total_output_octets(packet) for packet in self.usage_packets]
+
+
+class AnalysisContext:
+    """Everything test cases of one test read, the capture is parsed once on first use"""
+
+    def __init__(self, test_name: str, root_dir: str):
+        self.test_name = test_name
+        self.root_dir = root_dir
+        self.metadata = get_metadata(test_name, root_dir)
+        self.pcap_file = files.get_pcap_filename(test_name, root_dir)
+
+    @cached_property
+    def radius_packets(self) -> List[Radius]:
+        with tracing.span("parse pcap for analysis", test_name=self.test_name):
+            return pe.get_radius_packets(self.pcap_file, self.metadata.radius_port)
+
+    @cached_property
+    def clients(self) -> List[ClientAnalysis]:
+        """One analysis per client session, in the order of Metadata.get_all_clients"""
+        with tracing.span("build analysis context", test_name=self.test_name):
+            return [
+                ClientAnalysis(client, pe.get_packets_by_username(self.radius_packets, client.username))
+                for client in self.metadata.get_all_clients()
+            ]
+
+    @property
+    def client_count(self) -> int:
+        """Number of client sessions, known without parsing the capture"""
+        return len(self.metadata.get_all_clients())
+
+    @cached_property
+    def capture_completeness(self) -> dict:
+        return pe.get_capture_completeness(self.radius_packets)
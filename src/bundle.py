@@ -0,0 +1,277 @@
+"""Write a test's bundle zip, compressing members in parallel threads and streaming them in blocks.
+
+Run with: python -m src.bundle test_name --root_dir /path/to/root --compression deflated --level 1
+"""
+
+import argparse
+import bz2
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Union
+import src.files as files
+from src.inputs import ROOT_DIR, BUNDLE_COMPRESSION, BUNDLE_COMPRESSION_LEVEL
+
+STORED = "stored"
+DEFLATED = "deflated"
+BZIP2 = "bzip2"
+# Compression method numbers of the zip format
+METHODS = {STORED: 0, DEFLATED: 8, BZIP2: 12}
+COMPRESSIONS = list(METHODS)
+
+BLOCK_SIZE = 1024 * 1024
+# Sizes, offsets and member counts from these on are stored in zip64 records
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# Values in the classic records telling readers to look in the zip64 records
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+ZIP64_END_RECORD = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+LOCAL_HEADER_SIGNATURE = 0x04034B50
+CENTRAL_HEADER_SIGNATURE = 0x02014B50
+END_RECORD_SIGNATURE = 0x06054B50
+ZIP64_END_RECORD_SIGNATURE = 0x06064B50
+ZIP64_LOCATOR_SIGNATURE = 0x07064B50
+ZIP64_EXTRA_ID = 0x0001
+# Names are UTF-8
+FLAG_UTF8 = 0x800
+# Made by UNIX, zip format 4.6
+MADE_BY = (3 << 8) | 46
+
+
+@dataclass
+class Member:
+    """A file compressed into a temporary file, or to be copied as is when stored"""
+
+    filename: str
+    arcname: str
+    mtime: float
+    mode: int
+    method: int
+    crc: int = 0
+    file_size: int = 0
+    compress_size: int = 0
+    data_file: Union[str, None] = None
+    offset: int = 0
+
+    @property
+    def version_needed(self) -> int:
+        if self.method == METHODS[BZIP2]:
+            return 46
+        if self.zip64:
+            return 45
+        return 20
+
+    @property
+    def zip64(self) -> bool:
+        return self.file_size >= ZIP64_LIMIT or self.compress_size >= ZIP64_LIMIT
+
+    @property
+    def dos_time(self) -> tuple:
+        """Modification time and date as the zip format stores them"""
+        year, month, day, hour, minute, second = time.localtime(max(self.mtime, 315532800))[:6]
+        return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def __get_compressor(compression: str, level: Union[int, None]):
+    if compression == DEFLATED:
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    if compression == BZIP2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    return None
+
+
+def compress_member(filename: str, arcname: str, compression: str, level: Union[int, None], temp_dir: str) -> Member:
+    """Read a file in blocks, computing its CRC and compressing it to a temporary file, run in a worker thread"""
+    stat = os.stat(filename)
+    member = Member(filename, arcname, stat.st_mtime, stat.st_mode, METHODS[compression])
+    compressor = __get_compressor(compression, level)
+    output = None
+    if compressor is not None:
+        handle, member.data_file = tempfile.mkstemp(prefix=".bundle.", dir=temp_dir)
+        output = os.fdopen(handle, "wb")
+    try:
+        with open(filename, "rb") as source:
+            while True:
+                block = source.read(BLOCK_SIZE)
+                if not block:
+                    break
+                member.crc = zlib.crc32(block, member.crc)
+                member.file_size += len(block)
+                if output is not None:
+                    compressed = compressor.compress(block)
+                    output.write(compressed)
+                    member.compress_size += len(compressed)
+        if output is not None:
+            compressed = compressor.flush()
+            output.write(compressed)
+            member.compress_size += len(compressed)
+        else:
+            member.compress_size = member.file_size
+    finally:
+        if output is not None:
+            output.close()
+    return member
+
+
+def __zip64_extra(*values: int) -> bytes:
+    if not values:
+        return b""
+    return struct.pack(f"<HH{len(values)}Q", ZIP64_EXTRA_ID, 8 * len(values), *values)
+
+
+def __write_member(zip_file, member: Member):
+    """Write the local header and the data of a compressed member"""
+    member.offset = zip_file.tell()
+    name = member.arcname.encode("utf-8")
+    dos_time, dos_date = member.dos_time
+    if member.zip64:
+        sizes = (ZIP64_MARKER, ZIP64_MARKER)
+        extra = __zip64_extra(member.file_size, member.compress_size)
+    else:
+        sizes = (member.compress_size, member.file_size)
+        extra = b""
+    zip_file.write(LOCAL_HEADER.pack(
+        LOCAL_HEADER_SIGNATURE, member.version_needed, FLAG_UTF8, member.method, dos_time, dos_date,
+        member.crc, *sizes, len(name), len(extra),
+    ))
+    zip_file.write(name + extra)
+    with open(member.data_file or member.filename, "rb") as data:
+        if member.data_file is None:
+            # Stored, copy no more than was read for the CRC in case the file grew
+            remaining = member.file_size
+            while remaining:
+                block = data.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    raise ValueError(f"{member.filename} shrank while writing the bundle")
+                zip_file.write(block)
+                remaining -= len(block)
+        else:
+            shutil.copyfileobj(data, zip_file, BLOCK_SIZE)
+
+
+def __write_central_directory(zip_file, members: List[Member]):
+    start = zip_file.tell()
+    for member in members:
+        name = member.arcname.encode("utf-8")
+        dos_time, dos_date = member.dos_time
+        sizes = [member.compress_size, member.file_size]
+        zip64_values = []
+        # Zip64 extra holds the values that do not fit, uncompressed size first
+        if member.file_size >= ZIP64_LIMIT:
+            zip64_values.append(member.file_size)
+            sizes[1] = ZIP64_MARKER
+        if member.compress_size >= ZIP64_LIMIT:
+            zip64_values.append(member.compress_size)
+            sizes[0] = ZIP64_MARKER
+        offset = member.offset
+        if offset >= ZIP64_LIMIT:
+            zip64_values.append(offset)
+            offset = ZIP64_MARKER
+        extra = __zip64_extra(*zip64_values)
+        version_needed = max(member.version_needed, 45 if zip64_values else 20)
+        zip_file.write(CENTRAL_HEADER.pack(
+            CENTRAL_HEADER_SIGNATURE, MADE_BY, version_needed, FLAG_UTF8, member.method, dos_time, dos_date,
+            member.crc, *sizes, len(name), len(extra), 0, 0, 0, (member.mode & 0xFFFF) << 16, offset,
+        ))
+        zip_file.write(name + extra)
+    end = zip_file.tell()
+    count, size = len(members), end - start
+    if count >= ZIP64_COUNT_LIMIT or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+        zip_file.write(ZIP64_END_RECORD.pack(
+            ZIP64_END_RECORD_SIGNATURE, ZIP64_END_RECORD.size - 12, MADE_BY, 45, 0, 0, count, count, size, start,
+        ))
+        zip_file.write(ZIP64_LOCATOR.pack(ZIP64_LOCATOR_SIGNATURE, 0, end, 1))
+        count = ZIP64_COUNT_MARKER if count >= ZIP64_COUNT_LIMIT else count
+        size = ZIP64_MARKER if size >= ZIP64_LIMIT else size
+        start = ZIP64_MARKER if start >= ZIP64_LIMIT else start
+    zip_file.write(END_RECORD.pack(END_RECORD_SIGNATURE, 0, 0, count, count, size, start, 0))
+
+
+def write_zip(zip_file_name: str, files_to_zip: List[str], root_dir: str, compression=BUNDLE_COMPRESSION,
+              level=BUNDLE_COMPRESSION_LEVEL, workers: Union[int, None] = None) -> List[Member]:
+    """Zip files with paths relative to root_dir, members are compressed in parallel and written in order"""
+    if compression not in METHODS:
+        raise ValueError(f"Unknown compression {compression}, use one of {', '.join(METHODS)}")
+    temp_dir = os.path.dirname(os.path.abspath(zip_file_name))
+    partial_name = f"{zip_file_name}.partial"
+    members = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(compress_member, filename, filename.removeprefix(root_dir).lstrip("/"),
+                            compression, level, temp_dir)
+            for filename in files_to_zip
+        ]
+        try:
+            with open(partial_name, "wb") as zip_file:
+                for future in futures:
+                    member = future.result()
+                    members.append(member)
+                    __write_member(zip_file, member)
+                    if member.data_file is not None:
+                        os.remove(member.data_file)
+                        member.data_file = None
+                __write_central_directory(zip_file, members)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception() is None and future.result().data_file:
+                    os.remove(future.result().data_file)
+            if os.path.exists(partial_name):
+                os.remove(partial_name)
+            raise
+    # Readers never see a half written bundle
+    os.replace(partial_name, zip_file_name)
+    return members
+
+
+def write_bundle(test_name: str, root_dir: str, compression=BUNDLE_COMPRESSION, level=BUNDLE_COMPRESSION_LEVEL,
+                 workers: Union[int, None] = None) -> str:
+    """Zip the files of a test that exist, including logs and traces, return the zip's filename."""
+    zip_file_name = files.get_zipped_bundle_filename(test_name, root_dir)
+    files_to_zip = [filename for filename in files.get_all_files(test_name, root_dir) if os.path.exists(filename)]
+    begin = time.perf_counter()
+    members = write_zip(zip_file_name, files_to_zip, root_dir, compression, level, workers)
+    file_size = sum(member.file_size for member in members)
+    logging.info(
+        f"Wrote ZIP archive to {zip_file_name}: {len(members)} files, {file_size} bytes "
+        f"compressed to {os.path.getsize(zip_file_name)} ({compression}) in {time.perf_counter() - begin:.1f} s"
+    )
+    return zip_file_name
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Write the bundle zip of a test")
+    parser.add_argument("test_names", nargs="+", help="Names of tests under the root directory")
+    parser.add_argument("--root_dir", default=ROOT_DIR, help=f"Directory of the tests, default: {ROOT_DIR}")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=BUNDLE_COMPRESSION,
+                        help=f"Compression of the members, default: {BUNDLE_COMPRESSION}")
+    parser.add_argument("--level", type=int, default=BUNDLE_COMPRESSION_LEVEL,
+                        help=f"Compression level, default: {BUNDLE_COMPRESSION_LEVEL}")
+    parser.add_argument("--workers", type=int, help="Threads compressing members, default: number of CPUs")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Main function to write bundles."""
+    cliargs = parse_cliargs(args)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    for test_name in cliargs.test_names:
+        write_bundle(test_name, cliargs.root_dir, cliargs.compression, cliargs.level, cliargs.workers)
+
+
+if __name__ == "__main__":
+    main()
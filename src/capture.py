@@ -0,0 +1,314 @@
+"""In-process RADIUS capture using an AF_PACKET socket with a TPACKET_V3 ring buffer."""
+
+import ctypes
+import mmap
+import os
+import select
+import socket
+import struct
+import threading
+import time
+import logging
+import re
+from dataclasses import dataclass, asdict
+from typing import List, Tuple, Union
+import src.pcap_extract as pe
+from src.pcap_file import PcapWriter, SNAPLEN
+
+CAPTURE_ENGINES = ["tcpdump", "afpacket"]
+
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+PACKET_STATISTICS = 6
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+PACKET_OUTGOING = 4
+ARPHRD_LOOPBACK = 772
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# struct tpacket_req3
+TPACKET_REQ3 = struct.Struct("=7I")
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+BLOCK_STATUS_OFFSET = 8
+BLOCK_HEADER = struct.Struct("=II")  # num_pkts, offset_to_first_pkt
+BLOCK_HEADER_OFFSET = 12
+# struct tpacket3_hdr up to tp_net, sockaddr_ll follows at TPACKET_ALIGN(sizeof(tpacket3_hdr))
+TPACKET3_HDR = struct.Struct("=IIIIIIHH")
+SLL_PKTTYPE_OFFSET = 48 + 10
+SOCK_FILTER = struct.Struct("=HBBI")
+# struct tpacket_stats_v3
+TPACKET_STATS_V3 = struct.Struct("=III")
+
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_LD_H_IND = 0x48
+BPF_LDX_B_MSH = 0xB1
+BPF_JEQ_K = 0x15
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+BLOCK_SIZE = 1 << 20
+BLOCK_NR = 32
+FRAME_SIZE = 2048
+RETIRE_TIMEOUT_MS = 50
+POLL_INTERVAL_MS = 100
+
+
+TCPDUMP_STATS_PATTERN = re.compile(
+    r"^(\d+) packets? (captured|received by filter|dropped by kernel|dropped by interface)$",
+    re.MULTILINE,
+)
+
+
+@dataclass
+class CaptureStats:
+    """Packet counters reported by the capture engine when it stops."""
+
+    engine: str
+    packets_captured: int
+    packets_received: Union[int, None] = None
+    packets_dropped_by_kernel: int = 0
+    packets_dropped_by_interface: Union[int, None] = None
+
+    @property
+    def dropped(self) -> int:
+        """Packets the capture never saw"""
+        return self.packets_dropped_by_kernel + (self.packets_dropped_by_interface or 0)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_tcpdump_stats(output: str) -> Union[CaptureStats, None]:
+    """Parse the statistics tcpdump prints on shutdown, None if they are missing."""
+    counters = {name: int(count) for count, name in TCPDUMP_STATS_PATTERN.findall(output)}
+    if "captured" not in counters:
+        return None
+    return CaptureStats(
+        engine="tcpdump",
+        packets_captured=counters["captured"],
+        packets_received=counters.get("received by filter"),
+        packets_dropped_by_kernel=counters.get("dropped by kernel", 0),
+        packets_dropped_by_interface=counters.get("dropped by interface"),
+    )
+
+
+def get_capture_health(stats: Union[CaptureStats, None], pcap_file: str, radius_port=1812) -> dict:
+    """Combine capture engine counters with a completeness analysis of the captured RADIUS packets."""
+    completeness = pe.get_capture_completeness(pe.get_radius_packets(pcap_file, radius_port))
+    dropped = stats.dropped if stats is not None else None
+    return {
+        "stats": stats.to_dict() if stats is not None else None,
+        **completeness,
+        "reliable": dropped == 0 and completeness["complete"],
+    }
+
+
+def assemble(program: list) -> List[Tuple[int, int, int, int]]:
+    """Resolve labels in a classic BPF program.
+
+    Items are either a label string or a (code, jt, jf, k) tuple where jt and jf
+    are a label or 0 to fall through to the next instruction."""
+    labels = {}
+    instructions = []
+    for item in program:
+        if isinstance(item, str):
+            labels[item] = len(instructions)
+        else:
+            instructions.append(item)
+
+    def offset(target, index):
+        if isinstance(target, str):
+            return labels[target] - index - 1
+        return target
+
+    return [
+        (code, offset(jt, i), offset(jf, i), k)
+        for i, (code, jt, jf, k) in enumerate(instructions)
+    ]
+
+
+def udp_ports_filter(ports) -> List[Tuple[int, int, int, int]]:
+    """Classic BPF program accepting IPv4/IPv6 UDP over Ethernet to or from any of the ports."""
+
+    def match_ports(load, last_target):
+        program = [load]
+        for i, port in enumerate(ports):
+            last = i == len(ports) - 1
+            program.append((BPF_JEQ_K, "accept", last_target if last else 0, port))
+        return program
+
+    return assemble(
+        [
+            (BPF_LD_H_ABS, 0, 0, 12),  # EtherType
+            (BPF_JEQ_K, "ipv4", 0, 0x0800),
+            (BPF_JEQ_K, "ipv6", "reject", 0x86DD),
+            "ipv4",
+            (BPF_LD_B_ABS, 0, 0, 23),  # protocol
+            (BPF_JEQ_K, 0, "reject", socket.IPPROTO_UDP),
+            (BPF_LD_H_ABS, 0, 0, 20),  # fragment offset
+            (BPF_JSET_K, "reject", 0, 0x1FFF),
+            (BPF_LDX_B_MSH, 0, 0, 14),  # IPv4 header length
+            *match_ports((BPF_LD_H_IND, 0, 0, 14), "ipv4_dport"),
+            "ipv4_dport",
+            *match_ports((BPF_LD_H_IND, 0, 0, 16), "reject"),
+            "ipv6",
+            (BPF_LD_B_ABS, 0, 0, 20),  # next header
+            (BPF_JEQ_K, 0, "reject", socket.IPPROTO_UDP),
+            *match_ports((BPF_LD_H_ABS, 0, 0, 54), "ipv6_dport"),
+            "ipv6_dport",
+            *match_ports((BPF_LD_H_ABS, 0, 0, 56), "reject"),
+            "accept",
+            (BPF_RET_K, 0, 0, SNAPLEN),
+            "reject",
+            (BPF_RET_K, 0, 0, 0),
+        ]
+    )
+
+
+class RingCapture:
+    """Capture RADIUS traffic to a pcap file from an mmap'ed TPACKET_V3 ring.
+
+    Drop-in replacement for procs.TCPDump. Frames are written to the pcap as they
+    are read from the ring, the kernel filter keeps everything but RADIUS out of it.
+    Nothing is kept in memory, test cases run in other processes and parse the pcap."""
+
+    def __init__(
+        self,
+        pcap_location,
+        log_location,
+        interface="eth0",
+        radius_port=1812,
+        block_size=BLOCK_SIZE,
+        block_nr=BLOCK_NR,
+    ):
+        self.name = "afpacket capture"
+        self.pcap_location = pcap_location
+        self.log_file = log_location
+        self.interface = interface
+        self.radius_port = int(radius_port)
+        self.ports = [self.radius_port, self.radius_port + 1]
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.sock = None
+        self.ring = None
+        self.writer = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.skip_outgoing = False
+        self.filter_buffer = None
+        self.stats = None
+
+        # Create directory for log file if it doesn't exist
+        directory = os.path.dirname(log_location)
+        if not os.path.exists(directory):
+            logging.info("Creating directory %s", directory)
+            os.makedirs(directory)
+
+    def __log(self, message: str):
+        """Append a line to the capture log"""
+        with open(self.log_file, "a", encoding="utf-8") as log:
+            log.write(message + "\n")
+
+    def __open_socket(self):
+        """Create the socket, attach the filter and map the ring before binding to the interface"""
+        # Protocol 0 receives nothing until bind, so no packet from another interface sneaks in
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        program = b"".join(SOCK_FILTER.pack(*instruction) for instruction in udp_ports_filter(self.ports))
+        # struct sock_fprog {unsigned short len; struct sock_filter *filter;}
+        self.filter_buffer = ctypes.create_string_buffer(program)
+        fprog = struct.pack("HL", len(program) // SOCK_FILTER.size, ctypes.addressof(self.filter_buffer))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        frame_nr = self.block_size * self.block_nr // FRAME_SIZE
+        request = TPACKET_REQ3.pack(
+            self.block_size, self.block_nr, FRAME_SIZE, frame_nr, RETIRE_TIMEOUT_MS, 0, 0
+        )
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, request)
+        self.ring = mmap.mmap(self.sock.fileno(), self.block_size * self.block_nr)
+        self.sock.bind((self.interface, ETH_P_ALL))
+        # Loopback sees every packet twice, once outgoing and once incoming
+        self.skip_outgoing = self.sock.getsockname()[3] == ARPHRD_LOOPBACK
+
+    def __read_block(self, block: int) -> bool:
+        """Write out all frames of a block if the kernel handed it over, then return it"""
+        offset = block * self.block_size
+        status = struct.unpack_from("=I", self.ring, offset + BLOCK_STATUS_OFFSET)[0]
+        if not status & TP_STATUS_USER:
+            return False
+        num_pkts, first = BLOCK_HEADER.unpack_from(self.ring, offset + BLOCK_HEADER_OFFSET)
+        packet = offset + first
+        for _ in range(num_pkts):
+            next_offset, sec, nsec, snaplen, wirelen, _, mac, _ = TPACKET3_HDR.unpack_from(
+                self.ring, packet
+            )
+            if not (self.skip_outgoing and self.ring[packet + SLL_PKTTYPE_OFFSET] == PACKET_OUTGOING):
+                frame = self.ring[packet + mac:packet + mac + snaplen]
+                self.writer.write(frame, sec, nsec // 1000, wirelen)
+            packet += next_offset
+        struct.pack_into("=I", self.ring, offset + BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+        # Complete records on disk let RadiusObserver follow the capture
+        self.writer.flush()
+        return True
+
+    def __run(self):
+        """Read blocks in ring order until stopped and the last partial block was retired"""
+        poller = select.poll()
+        poller.register(self.sock, select.POLLIN | select.POLLERR)
+        block = 0
+        drain_until = None
+        while True:
+            if self.__read_block(block):
+                block = (block + 1) % self.block_nr
+                continue
+            if self.stop_event.is_set():
+                # The kernel retires a partially filled block after RETIRE_TIMEOUT_MS
+                if drain_until is None:
+                    drain_until = time.monotonic() + 2 * RETIRE_TIMEOUT_MS / 1000
+                elif time.monotonic() > drain_until:
+                    break
+            poller.poll(POLL_INTERVAL_MS)
+        self.writer.flush()
+
+    def start(self):
+        """Start capturing, returns once the socket is bound and nothing will be missed"""
+        logging.info("Starting %s", self.name)
+        self.stop_event.clear()
+        self.writer = PcapWriter(self.pcap_location)
+        self.__open_socket()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+        self.__log(f"listening on {self.interface}, ports {self.ports}, TPACKET_V3 ring "
+                   f"{self.block_nr} x {self.block_size} bytes")
+
+    def __read_stats(self) -> CaptureStats:
+        """Read PACKET_STATISTICS, the kernel resets the counters on every read"""
+        data = self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, TPACKET_STATS_V3.size)
+        packets, drops, _ = TPACKET_STATS_V3.unpack(data)
+        # tp_packets already includes tp_drops
+        return CaptureStats(
+            engine="afpacket",
+            packets_captured=self.writer.count,
+            packets_received=packets,
+            packets_dropped_by_kernel=drops,
+        )
+
+    def stop(self):
+        """Stop capturing and close the pcap"""
+        if self.thread is None:
+            logging.debug("process %s already stopped...", self.name)
+            return
+        logging.info("Stopping %s", self.name)
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.writer.close()
+        self.stats = self.__read_stats()
+        self.ring.close()
+        self.sock.close()
+        self.__log(f"{self.stats.packets_captured} packets captured")
+        self.__log(f"{self.stats.packets_received} packets received by filter")
+        self.__log(f"{self.stats.packets_dropped_by_kernel} packets dropped by kernel")
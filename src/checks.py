@@ -0,0 +1,569 @@
+"""Checks of a test's RADIUS accounting, runnable without pytest over any number of captures.
+
+Run with: python -m src.checks test_name [test_name ...] --root_dir /path/to/root -m core
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field, asdict
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List, Union
+from scapy.all import Radius
+import src.files as files
+import src.pcap_extract as pe
+from src.analysis import AnalysisContext, ClientAnalysis
+from src.inputs import ROOT_DIR
+
+PASSED = "passed"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+ATTRIBUTES = "TestAttributeChecks"
+ACCURACY = "TestAccuracyChecks"
+OPENROAMING = "TestOpenroamAttributes"
+
+GIGAWORD_OCTETS = 4 * 1024 * 1024 * 1024
+
+# Bump when cached results can not be read anymore
+CACHE_FORMAT = 1
+# Bytes hashed at the start and end of a pcap for its fingerprint
+FINGERPRINT_BYTES = 1024 * 1024
+
+
+class CheckFailed(AssertionError):
+    """A check found the accounting to be wrong"""
+
+
+class CheckSkipped(Exception):
+    """A check does not apply to the test"""
+
+
+@dataclass
+class CheckResult:
+    """Outcome of one check for one client session, values are what the check measured"""
+
+    name: str
+    category: str
+    markers: List[str]
+    client: str = ""
+    outcome: str = PASSED
+    message: str = ""
+    values: dict = field(default_factory=dict)
+    lines: List[str] = field(default_factory=list)
+    # The check raised, its result is not cached
+    error: bool = False
+
+    @property
+    def context(self) -> str:
+        """Text explaining the outcome, what the pytest report shows as context"""
+        return "".join(f"{line}\n" for line in self.lines)
+
+    def note(self, *parts):
+        """Add a line of context, arguments are joined like print does"""
+        self.lines.append(" ".join(str(part) for part in parts))
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result["context"] = self.context
+        return result
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "CheckResult":
+        return cls(**{key: value for key, value in values.items() if key in cls.__dataclass_fields__})
+
+
+@dataclass
+class Check:
+    """A registered check, func raises CheckFailed or CheckSkipped unless the check passed"""
+
+    name: str
+    category: str
+    markers: List[str]
+    func: Callable[[ClientAnalysis, CheckResult], None]
+    version: str = ""
+
+    @property
+    def description(self) -> str:
+        return (self.func.__doc__ or "").strip()
+
+    @cached_property
+    def code_hash(self) -> str:
+        """Hash of the version and the source of the check and the helpers of this module it calls"""
+        digest = hashlib.sha256(self.version.encode())
+        pending, seen = [self.func], set()
+        while pending:
+            func = pending.pop()
+            if func in seen:
+                continue
+            seen.add(func)
+            digest.update(inspect.getsource(func).encode())
+            for name in sorted(func.__code__.co_names):
+                helper = func.__globals__.get(name)
+                if inspect.isfunction(helper) and helper.__module__ == func.__module__:
+                    pending.append(helper)
+        return digest.hexdigest()
+
+
+CHECKS: Dict[str, Check] = {}
+
+
+def check(category: str, *markers: str, version=""):
+    """Register a check under its function name, bump version when code outside this module changes its result"""
+
+    def register(func: Callable[[ClientAnalysis, CheckResult], None]):
+        CHECKS[func.__name__] = Check(func.__name__, category, list(markers), func, version)
+        return func
+
+    return register
+
+
+def require(condition, message: str):
+    """Fail the check with a message unless the condition holds"""
+    if not condition:
+        raise CheckFailed(message)
+
+
+def skip(reason: str):
+    raise CheckSkipped(reason)
+
+
+def get_checks(markers: Union[Iterable[str], None] = None, names: Union[Iterable[str], None] = None) -> List[Check]:
+    """Registered checks having any of the markers and one of the names, all if not given"""
+    markers = set(markers or [])
+    names = set(names or [])
+    unknown = names - set(CHECKS)
+    if unknown:
+        raise ValueError(f"Unknown checks: {', '.join(sorted(unknown))}")
+    return [
+        registered for registered in CHECKS.values()
+        if (not markers or markers & set(registered.markers)) and (not names or registered.name in names)
+    ]
+
+
+def run_check(registered: Union[Check, str], client: ClientAnalysis, raise_errors=False) -> CheckResult:
+    """Run one check for one client session, an error in the check fails it unless raise_errors"""
+    if isinstance(registered, str):
+        registered = CHECKS[registered]
+    result = CheckResult(
+        registered.name, registered.category, list(registered.markers), client.metadata.client_interface or ""
+    )
+    try:
+        registered.func(client, result)
+    except CheckFailed as error:
+        result.outcome = FAILED
+        result.message = str(error)
+    except CheckSkipped as error:
+        result.outcome = SKIPPED
+        result.message = str(error)
+    except Exception as error:
+        if raise_errors:
+            raise
+        logging.debug("Check %s raised", registered.name, exc_info=True)
+        result.outcome = FAILED
+        result.message = f"{type(error).__name__}: {error}"
+        result.error = True
+    return result
+
+
+def get_pcap_fingerprint(pcap_file: str) -> str:
+    """Hash of size, modification time and both ends of a pcap, cheap even for captures of many GB"""
+    stat = os.stat(pcap_file)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(pcap_file, "rb") as file:
+        digest.update(file.read(FINGERPRINT_BYTES))
+        if stat.st_size > 2 * FINGERPRINT_BYTES:
+            file.seek(-FINGERPRINT_BYTES, os.SEEK_END)
+            digest.update(file.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def get_file_hash(filename: str) -> str:
+    with open(filename, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+class CheckCache:
+    """Check results of one test stored next to its report, reused while capture, metadata and check are unchanged.
+
+    A changed pcap or metadata file drops all results, a changed check only its own."""
+
+    def __init__(self, test_name: str, root_dir: str):
+        self.filename = files.get_check_results_filename(test_name, root_dir)
+        self.inputs = {
+            "format": CACHE_FORMAT,
+            "pcap": get_pcap_fingerprint(files.get_pcap_filename(test_name, root_dir)),
+            "metadata": get_file_hash(files.get_metadata_filename(test_name, root_dir)),
+        }
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+        self.__load()
+
+    def __load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+        except ValueError as error:
+            logging.warning("Ignoring unreadable check results %s: %s", self.filename, error)
+            return
+        if cached.get("inputs") != self.inputs:
+            logging.info("Capture or metadata changed, dropping cached check results")
+            return
+        self.results = cached.get("results", {})
+
+    @staticmethod
+    def __key(registered: Check, client_index: int) -> str:
+        return f"{registered.name}/{client_index}"
+
+    def get(self, registered: Check, client_index: int) -> Union[CheckResult, None]:
+        entry = self.results.get(self.__key(registered, client_index))
+        if entry is None or entry["code_hash"] != registered.code_hash:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CheckResult.from_dict(entry["result"])
+
+    def put(self, registered: Check, client_index: int, result: CheckResult):
+        if result.error:
+            return
+        self.results[self.__key(registered, client_index)] = {
+            "code_hash": registered.code_hash, "result": result.to_dict()
+        }
+        self.changed = True
+
+    def run(self, registered: Check, analysis: AnalysisContext, client_index: int, raise_errors=False) -> CheckResult:
+        """Return the cached result or run the check, parsing the capture only then"""
+        result = self.get(registered, client_index)
+        if result is None:
+            result = run_check(registered, analysis.clients[client_index], raise_errors)
+            self.put(registered, client_index, result)
+        return result
+
+    def save(self):
+        if not self.changed:
+            return
+        with open(self.filename, "w", encoding="utf-8") as file:
+            json.dump({"inputs": self.inputs, "results": self.results}, file, indent=2, default=str)
+        self.changed = False
+        logging.info("Wrote check results to %s (%d cached, %d run)", self.filename, self.hits, self.misses)
+
+
+def run_checks(
+    analysis: AnalysisContext,
+    markers: Union[Iterable[str], None] = None,
+    names: Union[Iterable[str], None] = None,
+    cache: Union[CheckCache, None] = None,
+) -> List[CheckResult]:
+    """Run checks for every client session of a test, reusing and updating cached results if given a cache"""
+    selected = get_checks(markers, names)
+    if cache is None:
+        return [run_check(registered, client) for client in analysis.clients for registered in selected]
+    results = [
+        cache.run(registered, analysis, client_index)
+        for client_index in range(analysis.client_count)
+        for registered in selected
+    ]
+    cache.save()
+    return results
+
+
+def summarize(results: List[CheckResult]) -> Dict[str, int]:
+    """Count results per outcome"""
+    counts = {PASSED: 0, FAILED: 0, SKIPPED: 0}
+    for result in results:
+        counts[result.outcome] += 1
+    return counts
+
+
+# Attribute checks
+
+
+@check(ATTRIBUTES, "core")
+def unique_persistent_acct_session_id(client: ClientAnalysis, result: CheckResult):
+    """Unique and persistent Acct-Session-Id in accounting sessions."""
+    acct_session_ids = client.acct_session_ids
+    acct_req_packets = client.accounting_requests
+    result.values["accounting_requests"] = len(acct_req_packets)
+    result.values["acct_session_ids"] = len(acct_session_ids)
+    require(len(acct_req_packets) == len(acct_session_ids),
+            f"Acct-Session-Id in {len(acct_session_ids)} of {len(acct_req_packets)} Accounting-Requests")
+    unique_ids = set(acct_session_ids)
+    result.values["unique_acct_session_ids"] = len(unique_ids)
+    if len(unique_ids) != 1:
+        result.note(f"Unique Acct-Session-Id values: {len(unique_ids)}")
+    require(acct_session_ids, "No Acct-Session-Id found")
+    session_id = acct_session_ids[0]
+    require(len(session_id) > 5, f"Acct-Session-Id {session_id!r} does not look unique")
+
+
+@check(ATTRIBUTES, "core")
+def acct_session_id_auth_acct(client: ClientAnalysis, result: CheckResult):
+    """Acct-Session-Id is persistent in authentication and accounting sessions."""
+    req_packets = client.session_requests
+    acct_session_ids = []
+    for packet in req_packets:
+        acct_session_ids += pe.get_acct_session_id(packet)
+    result.values["requests"] = len(req_packets)
+    result.values["acct_session_ids"] = len(acct_session_ids)
+    if len(req_packets) != len(acct_session_ids):
+        result.note(f"Acct-Session-Id only seen in {len(acct_session_ids)} out of {len(req_packets)} packets.")
+
+
+@check(ATTRIBUTES, "core")
+def start_update_stop_present(client: ClientAnalysis, result: CheckResult):
+    """Start, Update, and Stop records are present in accounting session."""
+    start_packets = client.start_packets
+    update_packets = client.update_packets
+    stop_packets = client.stop_packets
+    result.values.update(start=len(start_packets), update=len(update_packets), stop=len(stop_packets))
+    require(len(stop_packets) == 1, f"Expected 1 Stop, found {len(stop_packets)}")
+    require(len(start_packets) == 1, f"Expected 1 Start, found {len(start_packets)}")
+    result.note(
+        f"Packet Count: Start: {len(start_packets)}, Update: {len(update_packets)}, Stop: {len(stop_packets)}"
+    )
+
+
+@check(ATTRIBUTES, "core")
+def stop_record_last_message(client: ClientAnalysis, result: CheckResult):
+    """Stop record is last message in accounting session."""
+    latest_packet = client.latest_packet
+    require(latest_packet is not None, "No RADIUS packets found")
+    acct_status_types = pe.get_values_for_attribute(latest_packet, 40)
+    result.values["acct_status_types"] = acct_status_types
+    require(len(acct_status_types) == 1, f"Expected 1 Acct-Status-Type, found {len(acct_status_types)}")
+    require(acct_status_types[0] == 2, f"Last message has Acct-Status-Type {acct_status_types[0]}, not Stop (2)")
+
+
+@check(ATTRIBUTES, "core")
+def stop_record_highest_usage(client: ClientAnalysis, result: CheckResult):
+    """Stop record contains highest usage fields."""
+    stop_packets = client.stop_packets
+    require(len(stop_packets) == 1, f"Expected 1 Stop, found {len(stop_packets)}")
+    stop_packet = stop_packets[0]
+    stop_input, stop_output = pe.get_total_input_octets(stop_packet), pe.get_total_output_octets(stop_packet)
+    result.values.update(
+        max_input_octets=max(client.input_octets), max_output_octets=max(client.output_octets),
+        stop_input_octets=stop_input, stop_output_octets=stop_output,
+    )
+    require(max(client.input_octets) == stop_input, "Stop does not carry the highest input octets")
+    require(max(client.output_octets) == stop_output, "Stop does not carry the highest output octets")
+
+
+@check(ATTRIBUTES, "core")
+def at_least_three_class_echoed(client: ClientAnalysis, result: CheckResult):
+    """At least 3 Class attributes are echoed."""
+    accept_packets = client.accept_packets
+    require(len(accept_packets) == 1, f"Expected 1 Access-Accept, found {len(accept_packets)}")
+    classes_accept_packet = pe.get_values_for_attribute(accept_packets[0], 25)
+    result.values["accept_classes"] = len(classes_accept_packet)
+    for acct_packet in client.accounting_requests:
+        classes_acct_packet = pe.get_values_for_attribute(acct_packet, 25)
+        class_count = sum(1 for _class in classes_accept_packet if _class in classes_acct_packet)
+        require(class_count >= 3, f"Only {class_count} Class attributes echoed in an Accounting-Request")
+
+
+@check(ATTRIBUTES, "core")
+def cui_echoed(client: ClientAnalysis, result: CheckResult):
+    """Persistent CUI is echoed."""
+    accept_packets = client.accept_packets
+    require(len(accept_packets) == 1, f"Expected 1 Access-Accept, found {len(accept_packets)}")
+    cui_accept_packet = pe.get_values_for_attribute(accept_packets[0], 89)
+    require(len(cui_accept_packet) == 1, f"Expected 1 CUI in Access-Accept, found {len(cui_accept_packet)}")
+    cui_to_look_for = cui_accept_packet[0]
+    for acct_packet in client.accounting_requests:
+        require(cui_to_look_for in pe.get_values_for_attribute(acct_packet, 89),
+                "CUI not echoed in an Accounting-Request")
+
+
+def __verify_usage_increasing(totals: List[int]):
+    """Total usage must never decrease, it would when gigawords do not roll over"""
+    for previous, usage in zip([0] + totals, totals):
+        require(usage >= previous, f"Usage decreased from {previous} to {usage}")
+
+
+@check(ATTRIBUTES, "core_upload")
+def in_gigaword_rolls_over(client: ClientAnalysis, result: CheckResult):
+    """Acct-Input-Gigaword rolls over."""
+    metadata = client.metadata
+    if int(metadata.chunk_size) * int(metadata.chunks) <= GIGAWORD_OCTETS:
+        skip("Upload octets under 4 GB, Acct-Input-Gigaword not used.")
+    result.values["output_octets"] = client.output_octets
+    __verify_usage_increasing(client.output_octets)
+
+
+@check(ATTRIBUTES, "core_download")
+def out_gigaword_rolls_over(client: ClientAnalysis, result: CheckResult):
+    """Acct-Output-Gigaword rolls over."""
+    metadata = client.metadata
+    if int(metadata.chunk_size) * int(metadata.chunks) <= GIGAWORD_OCTETS:
+        skip("Download octets under 4 GB, Acct-Output-Gigaword not used.")
+    result.values["input_octets"] = client.input_octets
+    __verify_usage_increasing(client.input_octets)
+
+
+# Accuracy checks
+
+
+def __get_stop_or_update_packet(client: ClientAnalysis) -> Radius:
+    """Return Stop packet or latest Interim-Update+error."""
+    if client.stop_packets:
+        return client.stop_packets[0]
+    logging.error("No Stop packet found, using latest Interim-Update.")
+    require(client.update_packets, "No Stop or Interim-Update found")
+    return client.update_packets[-1]
+
+
+def __calculate_accuracy(result: CheckResult, expected_octets: int, actual_octets: int, octet_type: str,
+                         tolerance=0.03):
+    """Rules for pass/fail for tonnage accuracy checks"""
+    expected_octets_low = int(expected_octets * (1 - tolerance))
+    expected_octets_high = int(expected_octets * (1 + tolerance))
+    result.values.update(expected_octets=expected_octets, actual_octets=actual_octets, tolerance=tolerance)
+    if actual_octets:
+        percentage_off = round(100 * ((expected_octets / actual_octets) - 1), 2)
+        result.values["percentage_off"] = percentage_off
+    else:
+        percentage_off = None
+    result.note(f"{octet_type} Octets reported by RADIUS: ", actual_octets)
+    result.note(f"{octet_type} Octets reported by network interface statistics: ", expected_octets)
+    result.note(f"Difference: {percentage_off}%")
+    result.note(f"Acceptable Range: {expected_octets_low} - {expected_octets_high}")
+    result.note(f"Tolerance: {100 * tolerance}%")
+    require(expected_octets_low <= actual_octets <= expected_octets_high,
+            f"{octet_type} octets {actual_octets} outside {expected_octets_low} - {expected_octets_high}")
+
+
+@check(ACCURACY, "core_upload")
+def input_tonnage_accuracy(client: ClientAnalysis, result: CheckResult):
+    """Input tonnage is accurate."""
+    metadata = client.metadata
+    if not metadata.uploaded:
+        skip("No upload data")
+    # Expected octets from network interface packet counters
+    bytes_sent = metadata.usage_upload.bytes_sent
+    if metadata.downloaded:
+        bytes_sent += metadata.usage_download.bytes_sent
+    total_octets = pe.get_total_input_octets(__get_stop_or_update_packet(client))
+    __calculate_accuracy(result, expected_octets=bytes_sent, actual_octets=total_octets, octet_type="Input")
+
+
+@check(ACCURACY, "core_download")
+def output_tonnage_accuracy(client: ClientAnalysis, result: CheckResult):
+    """Output tonnage is accurate."""
+    metadata = client.metadata
+    if not metadata.downloaded:
+        skip("No download data")
+    # Expected octets from network interface packet counters
+    bytes_recv = metadata.usage_download.bytes_recv
+    if metadata.uploaded:
+        bytes_recv += metadata.usage_upload.bytes_recv
+    total_octets = pe.get_total_output_octets(__get_stop_or_update_packet(client))
+    __calculate_accuracy(result, expected_octets=bytes_recv, actual_octets=total_octets, octet_type="Output")
+
+
+@check(ACCURACY, "core")
+def session_duration_accuracy(client: ClientAnalysis, result: CheckResult):
+    """Session duration is accurate."""
+    tolerance = 0.05
+    session_duration = client.metadata.session_duration
+    lower_bound = round((session_duration * (1 - tolerance)) - 10, 2)
+    upper_bound = round((session_duration * (1 + tolerance)) + 10, 2)
+    acct_session_times = pe.get_acct_session_time(__get_stop_or_update_packet(client))
+    result.values.update(acct_session_times=acct_session_times, lower_bound=lower_bound, upper_bound=upper_bound)
+    require(len(acct_session_times) == 1, f"Expected 1 Acct-Session-Time, found {len(acct_session_times)}")
+    acct_session_time = acct_session_times[0]
+    require(lower_bound <= acct_session_time <= upper_bound,
+            f"Acct-Session-Time {acct_session_time} outside {lower_bound} - {upper_bound}")
+    result.note("Session Time: ", acct_session_time)
+    result.note(f"Valid Range: {lower_bound} - {upper_bound}")
+
+
+def __packet_count(result: CheckResult, packet_attributes: list):
+    """General packet count check."""
+    require(len(packet_attributes) == 1, f"Expected 1 packet count attribute, found {len(packet_attributes)}")
+    packets = packet_attributes[0]
+    result.values["packets"] = packets
+    if packets <= 0:
+        result.note(f"Expected packets > 0, got {packets}")
+
+
+@check(ACCURACY, "core")
+def input_packet_count_nonzero(client: ClientAnalysis, result: CheckResult):
+    """Input Packet count is non-zero."""
+    __packet_count(result, pe.get_acct_input_packets(__get_stop_or_update_packet(client)))
+
+
+@check(ACCURACY, "core")
+def output_packet_count_nonzero(client: ClientAnalysis, result: CheckResult):
+    """Output Packet count is non-zero."""
+    __packet_count(result, pe.get_acct_output_packets(__get_stop_or_update_packet(client)))
+
+
+# OpenRoaming checks (Proof of Concept)
+
+
+@check(OPENROAMING, "openroaming")
+def operator_name_format(client: ClientAnalysis, result: CheckResult):
+    """Go through each packet and check if Operator-Name is present"""
+    # https://datatracker.ietf.org/doc/draft-tomas-openroaming/ section 8.1
+    not_present_counter = 0
+    for packet in client.packets:
+        operator_names = pe.get_values_for_attribute(packet, 126)
+        if len(operator_names) != 1:
+            not_present_counter += 1
+            continue
+        require(re.match(r"4.+:[A-Z]{2}", operator_names[0]),
+                f"Operator-Name {operator_names[0]!r} not in the expected format")
+    result.values["packets_without_operator_name"] = not_present_counter
+    if not_present_counter:
+        result.note(f"Operator-Name not in {not_present_counter} of {len(client.packets)} packets.")
+        require(False, "Operator-Name not present in all packets.")
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run checks over stored tests without pytest")
+    parser.add_argument("test_names", nargs="+", help="Names of tests under the root directory")
+    parser.add_argument("--root_dir", default=ROOT_DIR, help=f"Directory of the tests, default: {ROOT_DIR}")
+    parser.add_argument("-m", "--marker", action="append", dest="markers",
+                        help="Only run checks with this marker, can be repeated")
+    parser.add_argument("--check", action="append", dest="checks", help="Only run this check, can be repeated")
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Run every check instead of reusing results cached next to the report")
+    parser.add_argument("--list", action="store_true", help="Only list the registered checks")
+    return parser.parse_args(args)
+
+
+def main(args=None) -> dict:
+    """Run checks of every test and print a line per test, return results per test name"""
+    cliargs = parse_cliargs(args)
+    if cliargs.list:
+        for registered in get_checks(cliargs.markers, cliargs.checks):
+            print(f"{registered.name} [{', '.join(registered.markers)}]: {registered.description}")
+        return {}
+    results = {}
+    for test_name in cliargs.test_names:
+        cache = None if cliargs.no_cache else CheckCache(test_name, cliargs.root_dir)
+        results[test_name] = run_checks(
+            AnalysisContext(test_name, cliargs.root_dir), cliargs.markers, cliargs.checks, cache
+        )
+        counts = summarize(results[test_name])
+        print(f"{test_name}: " + ", ".join(f"{outcome} {count}" for outcome, count in counts.items()))
+    if cliargs.output:
+        with open(cliargs.output, "w", encoding="utf-8") as file:
+            json.dump({name: [result.to_dict() for result in test_results]
+                       for name, test_results in results.items()}, file, indent=2, default=str)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,48 @@
 """Contains imports for data transfer between two hosts."""
 
+import fcntl
 import socket
+import struct
+import termios
 import logging
 import threading
+import multiprocessing
 import time
 from dataclasses import dataclass
+from typing import Union
 import netifaces
 import psutil
+from src.payload import PayloadSource, BUFFER_SIZE
+import src.tracing as tracing
+
+# Layout of the Linux struct tcp_info up to tcpi_bytes_retrans (see linux/tcp.h).
+TCP_INFO_FORMAT = "=8B24I4Q6IQ3Q2I2Q"
+TCP_INFO_FIELDS = {
+    "snd_mss": 10,
+    "unacked": 12,
+    "rtt": 23,
+    "rttvar": 24,
+    "snd_cwnd": 26,
+    "total_retrans": 31,
+    "bytes_acked": 34,
+    "bytes_received": 35,
+    "delivery_rate": 42,
+    "bytes_sent": 48,
+    "bytes_retrans": 49,
+}
+TCP_INFO_POLL_INTERVAL = 1.0
+# Seconds a sender waits for the peer to ACK the tail of a transfer
+DRAIN_TIMEOUT = 10
+DRAIN_POLL_INTERVAL = 0.01
+# tcpi_state of a closed or reset connection
+TCP_STATE_CLOSE = 7
+# Seconds start() waits for the server to listen, longer than the server's retry of a busy port
+READY_TIMEOUT = 180
+READY_POLL_INTERVAL = 0.1
+TRANSFER_MODES = ["thread", "process"]
+# Worker processes are started from a single-threaded server process, forking the
+# test bed itself could copy locks held by its observer, sampler or logging threads
+PROCESS_START_METHOD = "forkserver"
 
 
 @dataclass
@@ -43,6 +79,209 @@ class UsageCounter:
         return f"packets sent: {self.packets_sent}\npackets recv: {self.packets_recv}\nbytes sent: {self.bytes_sent}\nbytes recv: {self.bytes_recv}\ninterface: {self.interface}"
 
 
+@dataclass
+class TCPInfo:
+    """Store kernel TCP_INFO statistics for one end of a data connection."""
+
+    rtt: int
+    rttvar: int
+    snd_cwnd: int
+    snd_mss: int
+    total_retrans: int
+    bytes_acked: int
+    bytes_received: int
+    bytes_sent: int
+    bytes_retrans: int
+    delivery_rate: int
+    unacked: int = 0
+    max_rtt: int = 0
+    samples: int = 0
+
+    def to_dict(self):
+        """Convert the TCPInfo object to a dictionary for easier interpretation."""
+        return {
+            "rtt": self.rtt,
+            "rttvar": self.rttvar,
+            "snd_cwnd": self.snd_cwnd,
+            "snd_mss": self.snd_mss,
+            "total_retrans": self.total_retrans,
+            "bytes_acked": self.bytes_acked,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "bytes_retrans": self.bytes_retrans,
+            "delivery_rate": self.delivery_rate,
+            "unacked": self.unacked,
+            "max_rtt": self.max_rtt,
+            "samples": self.samples,
+        }
+
+    def __str__(self):
+        return (
+            f"rtt: {self.rtt} us (max {self.max_rtt} us), rttvar: {self.rttvar} us, "
+            f"cwnd: {self.snd_cwnd}, retransmits: {self.total_retrans}, "
+            f"bytes acked: {self.bytes_acked}, bytes retrans: {self.bytes_retrans}, "
+            f"delivery rate: {self.delivery_rate} B/s"
+        )
+
+
+def get_tcp_info(sock) -> Union[TCPInfo, None]:
+    """Read TCP_INFO from a connected socket, None if not available."""
+    size = struct.calcsize(TCP_INFO_FORMAT)
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, size)
+    except (OSError, AttributeError) as e:
+        logging.debug("TCP_INFO not available: %s", e)
+        return None
+    # Older kernels return a shorter struct, missing fields are reported as 0.
+    values = struct.unpack(TCP_INFO_FORMAT, raw.ljust(size, b"\x00"))
+    return TCPInfo(**{name: values[index] for name, index in TCP_INFO_FIELDS.items()})
+
+
+def get_outq(sock) -> Union[int, None]:
+    """Bytes written to a socket that the peer has not ACKed yet, sent or not (SIOCOUTQ)."""
+    try:
+        return struct.unpack("i", fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, bytes(4)))[0]
+    except OSError as e:
+        logging.debug("SIOCOUTQ not available: %s", e)
+        return None
+
+
+def drain_socket(sock, timeout=DRAIN_TIMEOUT) -> bool:
+    """Close the sending side and wait until the peer ACKed all data, return whether it did in time.
+
+    TCP_INFO sampled afterwards counts the tail of a transfer in bytes_acked. tcpi_unacked is
+    not enough, it only counts segments in flight, not data still queued."""
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError as e:
+        logging.debug("Shutdown before drain failed: %s", e)
+        return False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        outq = get_outq(sock)
+        if outq is None:
+            return False
+        if outq == 0:
+            return True
+        if sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 1)[0] == TCP_STATE_CLOSE:
+            # Reset by the peer, the rest will never be ACKed
+            return False
+        time.sleep(DRAIN_POLL_INTERVAL)
+    logging.warning("Peer did not ACK the end of the transfer within %s seconds", timeout)
+    return False
+
+
+class TCPInfoPoller:
+    """Poll TCP_INFO of a socket in the background while data is transferred."""
+
+    def __init__(self, sock, interval=TCP_INFO_POLL_INTERVAL):
+        self.sock = sock
+        self.interval = interval
+        self.latest = None
+        self.max_rtt = 0
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__poll, daemon=True)
+
+    def sample(self):
+        """Take one TCP_INFO sample and keep track of the highest RTT."""
+        info = get_tcp_info(self.sock)
+        if info is not None:
+            self.latest = info
+            self.samples += 1
+            self.max_rtt = max(self.max_rtt, info.rtt)
+
+    def __poll(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """Start polling."""
+        self.sample()
+        self.thread.start()
+
+    def stop(self) -> Union[TCPInfo, None]:
+        """Stop polling, take a final sample and return it."""
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        if self.latest is None:
+            return None
+        self.latest.max_rtt = self.max_rtt
+        self.latest.samples = self.samples
+        return self.latest
+
+
+@dataclass
+class SocketOptions:
+    """Socket tuning options for data connections, None keeps the kernel default."""
+
+    sndbuf: Union[int, None] = None
+    rcvbuf: Union[int, None] = None
+    nodelay: Union[bool, None] = None
+    congestion: Union[str, None] = None
+    maxseg: Union[int, None] = None
+    tos: Union[int, None] = None
+
+    def apply(self, sock):
+        """Apply options to a socket, must be called before connect/listen."""
+        if self.sndbuf is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(self.sndbuf))
+        if self.rcvbuf is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(self.rcvbuf))
+        if self.nodelay is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+        if self.congestion is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, self.congestion.encode())
+        if self.maxseg is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG, int(self.maxseg))
+        if self.tos is not None:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, int(self.tos))
+
+    def validate(self):
+        """Raise ValueError if the kernel rejects an option, checked on a throwaway socket."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                self.apply(sock)
+            except (OSError, OverflowError) as e:
+                raise ValueError(f"Invalid socket options {self}: {e}") from e
+
+
+def get_socket_options(sock) -> dict:
+    """Return the socket options the kernel actually applied to a socket."""
+    congestion = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, 16)
+    return {
+        "sndbuf": sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+        "rcvbuf": sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        "nodelay": bool(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)),
+        "congestion": congestion.split(b"\x00", 1)[0].decode(),
+        "maxseg": sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG),
+        "tos": sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS),
+    }
+
+
+class PipeLogger:
+    """Logger stand-in for transfer worker processes, forwards records over a pipe."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def log(self, level, msg, *args):
+        self.conn.send(("log", level, msg % args if args else msg))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+
 def get_interface_ip(interface_name):
     """Get the IP address of a network interface."""
     try:
@@ -71,6 +310,10 @@ class TCPServer:
         chunk_size,
         chunks,
         client_iface=None,
+        socket_options=None,
+        transfer_mode="thread",
+        payload="random",
+        buffer_size=BUFFER_SIZE,
     ):
         self.listen_port = listen_port
         self.dst_host = dst_host
@@ -78,112 +321,251 @@ class TCPServer:
         self.client_iface = client_iface
         self.chunk_size = chunk_size
         self.chunks = chunks
+        self.payload = payload
+        self.buffer_size = buffer_size
+        self.socket_options = socket_options or SocketOptions()
+        if transfer_mode not in TRANSFER_MODES:
+            raise ValueError(f"Unknown transfer mode: {transfer_mode}")
+        self.transfer_mode = transfer_mode
         self.server_thread = None
+        self.server_reader = None
+        self.server_error = None
+        self.client_error = None
+        self.mp_context = None
+        if transfer_mode == "process":
+            self.mp_context = multiprocessing.get_context(PROCESS_START_METHOD)
+            self.mp_context.set_forkserver_preload([__name__])
+        # In process mode the server worker reports over its pipe that it listens
         self.ready_for_conns = threading.Event()
+        self.server_done = threading.Event()
         self.download = None
+        self.tcp_info = {}
+        self.applied_socket_options = {}
 
-    def __tcp_server(self, download=True):
+    def __tcp_server(self, download=True, logger=logging):
         """Server that listens for incoming connections and sends or receives 
         random data to clients."""
         mode = "download" if download else "upload"
-        logging.info("Starting TCP data server (mode=%s)...", mode)
+        logger.info("Starting TCP data server (mode=%s)...", mode)
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
             server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Accepted sockets inherit buffer sizes and MSS from the listening socket.
+            self.socket_options.apply(server)
             try:
                 server.bind(("0.0.0.0", self.listen_port))
             except OSError as e:
-                logging.debug(
+                logger.debug(
                     "Not ready to bind: %s, sleeping for 120 seconds and retrying", e
                 )
                 time.sleep(120)
                 server.bind(("0.0.0.0", self.listen_port))
 
             server.listen()
-            self.ready_for_conns.set()
+            self.__signal_ready(logger)
 
             client_sock, client_addr = server.accept()
-            logging.debug("Client connected from %s", client_addr)
+            logger.debug("Client connected from %s", client_addr)
 
             with client_sock:
+                self.socket_options.apply(client_sock)
+                self.applied_socket_options["server"] = get_socket_options(client_sock)
+                poller = TCPInfoPoller(client_sock)
+                poller.start()
                 if download:
-                    logging.debug("Download mode selected")
-                    self.__tx_data_chunks(logging, client_sock)
+                    logger.debug("Download mode selected")
+                    self.__tx_data_chunks(logger, client_sock)
                 else:
-                    logging.info("Upload mode selected")
-                    self.__rx_data_chunks(logging, client_sock, "Server received")
+                    logger.info("Upload mode selected")
+                    self.__rx_data_chunks(logger, client_sock, "Server received")
+                self.tcp_info["server"] = poller.stop()
+                self.__publish_result("server", logger)
             time.sleep(3)
-            logging.info("Client connection closed")
-        logging.info("Server closed")
+            logger.info("Client connection closed")
+        logger.info("Server closed")
         self.ready_for_conns.clear()
 
+    def __serve(self, download=True):
+        """Run the server in a thread, an error is kept for start() to raise."""
+        try:
+            self.__tcp_server(download=download)
+        except Exception as e:
+            self.server_error = e
+            # start() must not wait for a server that will never listen
+            self.ready_for_conns.set()
+
     def tcp_server_upload(self):
         """Start the TCP server in upload mode."""
-        self.__tcp_server(download=False)
+        self.__serve(download=False)
 
     def tcp_server_download(self):
         """Start the TCP server in download mode."""
-        self.__tcp_server(download=True)
+        self.__serve(download=True)
+
+    def __getstate__(self):
+        """State sent to transfer worker processes, without the parent's threads, events and processes."""
+        state = self.__dict__.copy()
+        for name in ("server_thread", "server_reader", "ready_for_conns", "server_done", "mp_context"):
+            del state[name]
+        state["server_error"] = state["client_error"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.server_thread = self.server_reader = self.mp_context = None
+        self.ready_for_conns = threading.Event()
+        self.server_done = threading.Event()
+
+    def run_endpoint(self, endpoint, download, logger=logging):
+        """Run the server or the client end of a transfer, entry point of transfer worker processes."""
+        if endpoint == "server":
+            self.__tcp_server(download=download, logger=logger)
+        elif download:
+            self.__download_data_chunks(logger)
+        else:
+            self.__upload_data_chunks(logger)
+
+    def __signal_ready(self, logger):
+        """Tell start() the server listens, over the pipe from worker processes."""
+        if isinstance(logger, PipeLogger):
+            logger.conn.send(("ready",))
+        else:
+            self.ready_for_conns.set()
+
+    def __publish_result(self, endpoint, logger):
+        """Make results of an endpoint available, sent to the parent from worker processes."""
+        if isinstance(logger, PipeLogger):
+            info = self.tcp_info.get(endpoint)
+            logger.conn.send((
+                "result",
+                endpoint,
+                info.to_dict() if info else None,
+                self.applied_socket_options.get(endpoint),
+            ))
+        elif endpoint == "server":
+            self.server_done.set()
+
+    def __read_worker_pipe(self, conn, logger):
+        """Log progress from a transfer worker process and collect its results."""
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message[0] == "log":
+                _, level, msg = message
+                logger.log(level, msg)
+            elif message[0] == "ready":
+                self.ready_for_conns.set()
+            elif message[0] == "error":
+                _, endpoint, error = message
+                if endpoint == "server":
+                    self.server_error = error
+                    self.ready_for_conns.set()
+                else:
+                    self.client_error = error
+            elif message[0] == "result":
+                _, endpoint, info, options = message
+                self.tcp_info[endpoint] = TCPInfo(**info) if info else None
+                if options is not None:
+                    self.applied_socket_options[endpoint] = options
+                if endpoint == "server":
+                    self.server_done.set()
+        conn.close()
+
+    def __start_worker(self, endpoint, download, logger=logging):
+        """Run one transfer endpoint in its own process, return process and pipe reader."""
+        recv_conn, send_conn = self.mp_context.Pipe(duplex=False)
+        process = self.mp_context.Process(
+            target=run_transfer_worker,
+            args=(self, send_conn, endpoint, download),
+            daemon=True,
+        )
+        process.start()
+        send_conn.close()
+        reader = threading.Thread(target=self.__read_worker_pipe, args=(recv_conn, logger))
+        reader.start()
+        return process, reader
 
     def start(self, download=True):
         """Start the TCP server in upload or download mode."""
-        if download:
-            #Download mode
-            self.download = True
-            thread = threading.Thread(target=self.tcp_server_download)
+        # Previous server must release the listening port before binding again.
+        if self.server_thread is not None:
+            self.server_thread.join()
+        # Rejected options would otherwise stop the server before it listens
+        self.socket_options.validate()
+        self.tcp_info = {}
+        self.applied_socket_options = {}
+        self.server_error = None
+        self.server_done.clear()
+        self.ready_for_conns.clear()
+        self.download = download
+        if self.transfer_mode == "process":
+            self.server_thread, self.server_reader = self.__start_worker("server", download)
         else:
-            #Upload mode
-            self.download = False
-            thread = threading.Thread(target=self.tcp_server_upload)
-        thread.start()
-        while not self.ready_for_conns.is_set():
-            pass
-        logging.info("TCP data server started")
-
-    def __connect_socket_with_interface(self):
+            target = self.tcp_server_download if download else self.tcp_server_upload
+            self.server_thread = threading.Thread(target=target)
+            self.server_thread.start()
+        deadline = time.monotonic() + READY_TIMEOUT
+        while not self.ready_for_conns.wait(READY_POLL_INTERVAL):
+            if not self.server_thread.is_alive():
+                # A worker's last messages may still be read from its pipe
+                if self.server_reader is not None:
+                    self.server_reader.join()
+                if self.ready_for_conns.is_set():
+                    break
+                raise RuntimeError("TCP data server stopped before accepting connections, see the log")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"TCP data server not listening after {READY_TIMEOUT} seconds")
+        if self.server_error is not None:
+            raise self.server_error
+        logging.info("TCP data server started (%s)", self.transfer_mode)
+
+    def __connect_socket_with_interface(self, logger=logging):
         """Connect to server and return socket binded to interface."""
         client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         iface = self.client_iface
         if iface:
             source_ip = get_interface_ip(iface)
-            logging.debug("Binding to interface %s with IP %s", iface, source_ip)
+            logger.debug("Binding to interface %s with IP %s", iface, source_ip)
             client_socket.setsockopt(socket.SOL_SOCKET, 25, iface.encode())
             client_socket.bind((source_ip, 0))
+        self.socket_options.apply(client_socket)
         try:
             client_socket.connect((self.dst_host, self.dst_port))
         except socket.gaierror as e:
-            logging.error("Error: %s", e)
+            logger.error("Error: %s", e)
+        self.applied_socket_options["client"] = get_socket_options(client_socket)
         return client_socket
 
     def __tx_data_chunks(self, logger, sock, verb=None):
-        """Behavior for one side to send data chunks to other side."""
-        file_path = "/dev/random"
-        with open(file_path, "rb") as file:
-            data = file.read(self.chunk_size)
+        """Behavior for one side to send data chunks to other side, waits until the other side ACKed them."""
+        payload = PayloadSource(self.payload, min(self.chunk_size, self.buffer_size))
         usage_start = get_usage_data(self.client_iface)
-        count = 0
         expected_bytes = self.chunks * self.chunk_size
-        while True:
-            count += 1
+        for count in range(1, self.chunks + 1):
             try:
-                sock.sendall(data)
+                for data in payload.chunk(self.chunk_size):
+                    sock.sendall(data)
             except BrokenPipeError:
-                break
+                return
             except ConnectionResetError:
-                break
-            cur_usage = get_usage_data(self.client_iface) - usage_start
+                return
             if verb and (print_progress_bool(expected_bytes, count)):
+                cur_usage = get_usage_data(self.client_iface) - usage_start
                 logger.info(f"Iface {cur_usage.interface}: {cur_usage.bytes_sent}")
-                logger.info(f"{verb} data chunk {count + 1}")
+                logger.info(f"{verb} data chunk {count}")
+        drain_socket(sock)
 
     def __rx_data_chunks(self, logger, sock, verb=None):
         """Behavior for one side to receive data chunks from other side."""
         expected_bytes = self.chunks * self.chunk_size
+        buffer = memoryview(bytearray(min(self.chunk_size, self.buffer_size)))
         count = 0
         byte_count = 0
         while True:
             try:
-                bytes_to_pull = min(expected_bytes - byte_count, self.chunk_size)
-                actual_len = len(sock.recv(bytes_to_pull))
+                bytes_to_pull = min(expected_bytes - byte_count, len(buffer))
+                actual_len = sock.recv_into(buffer, bytes_to_pull)
             except BrokenPipeError:
                 break
             except ConnectionResetError:
@@ -200,17 +582,25 @@ class TCPServer:
             else:
                 break
 
-    def __download_data_chunks(self, logger):
+    def __download_data_chunks(self, logger=logging):
         """Client that connects to this server and receives data from it."""
-        client = self.__connect_socket_with_interface()
+        client = self.__connect_socket_with_interface(logger)
         with client:
+            poller = TCPInfoPoller(client)
+            poller.start()
             self.__rx_data_chunks(logger, client, verb="Client downloaded")
+            self.tcp_info["client"] = poller.stop()
+        self.__publish_result("client", logger)
 
-    def __upload_data_chunks(self, logger):
+    def __upload_data_chunks(self, logger=logging):
         """Client that connects to this server and sends data to it."""
-        client = self.__connect_socket_with_interface()
+        client = self.__connect_socket_with_interface(logger)
         with client:
+            poller = TCPInfoPoller(client)
+            poller.start()
             self.__tx_data_chunks(logger, client)
+            self.tcp_info["client"] = poller.stop()
+        self.__publish_result("client", logger)
 
     def transfer_data(self, logger=None) -> UsageCounter:
         """Decide whether to download or upload data chunks based on self.download flag."""
@@ -222,12 +612,42 @@ class TCPServer:
         else:
             network_interface = self.client_iface
         usage_before = get_usage_data(network_interface)
-        if self.download:
-            self.__download_data_chunks(logger)
-        else:
-            self.__upload_data_chunks(logger)
+        direction = "download" if self.download else "upload"
+        with tracing.span(f"transfer_data {direction}", interface=network_interface, chunks=self.chunks):
+            if self.transfer_mode == "process":
+                self.client_error = None
+                process, reader = self.__start_worker("client", self.download, logger=logger)
+                process.join()
+                reader.join()
+                if self.client_error is not None:
+                    raise self.client_error
+            else:
+                self.run_endpoint("client", self.download, logger)
         time.sleep(1)
-        return get_usage_data(network_interface) - usage_before
+        usage = get_usage_data(network_interface) - usage_before
+        if not self.server_done.wait(timeout=5):
+            logger.warning("Server side TCP_INFO not collected")
+        for endpoint, info in self.tcp_info.items():
+            logger.debug(f"TCP_INFO ({endpoint}): {info}")
+        for endpoint, options in self.applied_socket_options.items():
+            logger.debug(f"Socket options ({endpoint}): {options}")
+        return usage
+
+
+def run_transfer_worker(server: TCPServer, conn, endpoint: str, download: bool):
+    """Entry point of a transfer worker process, output and errors are sent back over conn."""
+    logger = PipeLogger(conn)
+    try:
+        server.run_endpoint(endpoint, download, logger)
+    except Exception as e:
+        logger.error("Transfer %s failed: %s", endpoint, e)
+        try:
+            conn.send(("error", endpoint, e))
+        except Exception:
+            # The exception itself could not be pickled
+            conn.send(("error", endpoint, RuntimeError(repr(e))))
+    finally:
+        conn.close()
 
 
 def get_usage_data(client_iface):
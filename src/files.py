@@ -1,5 +1,6 @@
 """Contains filenames and directories used in the project."""
 
+import glob
 import os
 import configparser
 
@@ -64,6 +65,11 @@ def get_logs_dir(root_dir: str) -> str:
     return os.path.join(root_dir, SUBDIRS["logs"])
 
 
+def get_jobs_dir(root_dir: str) -> str:
+    """Return directory of background job states and logs."""
+    return os.path.join(root_dir, "jobs")
+
+
 def get_metadata_filename(test_name, root_dir) -> str:
     """Return full path of metadata file path for a given test name."""
     metadata_dir = get_metadata_dir(root_dir)
@@ -82,6 +88,18 @@ def get_report_filename(test_name, root_dir) -> str:
     return os.path.join(report_dir, f"{test_name}.pdf")
 
 
+def get_html_report_filename(test_name, root_dir) -> str:
+    """Return full path of the HTML report for a given test name."""
+    report_dir = get_reports_dir(root_dir)
+    return os.path.join(report_dir, f"{test_name}.html")
+
+
+def get_results_filename(test_name, root_dir) -> str:
+    """Return full path of the test case results a report is rendered from for a given test name."""
+    report_dir = get_reports_dir(root_dir)
+    return os.path.join(report_dir, f"{test_name}.results.json")
+
+
 def get_config_filename(test_name, root_dir) -> str:
     """Return full path of config file path for a given test name."""
     report_dir = get_config_dir(root_dir)
@@ -94,9 +112,11 @@ def get_freeradius_log_filename(test_name, root_dir) -> str:
     return os.path.join(logs_dir, f"{test_name}.freeradius.log")
 
 
-def get_wpasupplicant_log_filename(test_name, root_dir) -> str:
-    """Return full path of wpa_supplicant log file path for a given test name."""
+def get_wpasupplicant_log_filename(test_name, root_dir, interface=None) -> str:
+    """Return full path of wpa_supplicant log file path for a given test name and optional client interface."""
     logs_dir = get_logs_dir(root_dir)
+    if interface:
+        return os.path.join(logs_dir, f"{test_name}.{interface}.wpasupplicant.log")
     return os.path.join(logs_dir, f"{test_name}.wpasupplicant.log")
 
 
@@ -106,16 +126,67 @@ def get_tcpdump_log_filename(test_name, root_dir) -> str:
     return os.path.join(logs_dir, f"{test_name}.tcpdump.log")
 
 
+def get_trace_filename(test_name, root_dir) -> str:
+    """Return full path of Chrome trace file path for a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    return os.path.join(logs_dir, f"{test_name}.trace.json")
+
+
+def get_live_samples_filename(test_name, root_dir) -> str:
+    """Return full path of the live throughput and accounting samples for a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    return os.path.join(logs_dir, f"{test_name}.live.jsonl")
+
+
+def get_profile_filename(test_name, root_dir, phase) -> str:
+    """Return full path of cProfile output for a phase of a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    return os.path.join(logs_dir, f"{test_name}.{phase}.prof")
+
+
+def get_profile_summary_filename(test_name, root_dir, phase) -> str:
+    """Return full path of the profile summary for a phase of a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    return os.path.join(logs_dir, f"{test_name}.{phase}.profile.txt")
+
+
+def get_profile_files(test_name, root_dir) -> list:
+    """Return profiles and their summaries written for a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    patterns = [f"{glob.escape(test_name)}.*.prof", f"{glob.escape(test_name)}.*.profile.txt"]
+    return sorted(
+        filename for pattern in patterns for filename in glob.glob(os.path.join(logs_dir, pattern))
+    )
+
+
+def get_check_results_filename(test_name, root_dir) -> str:
+    """Return full path of the cached check results for a given test name."""
+    report_dir = get_reports_dir(root_dir)
+    return os.path.join(report_dir, f"{test_name}.checks.json")
+
+
+def get_log_files(test_name, root_dir) -> list:
+    """Return logs, traces and profiles written for a given test name."""
+    logs_dir = get_logs_dir(root_dir)
+    return sorted(glob.glob(os.path.join(logs_dir, f"{glob.escape(test_name)}.*")))
+
+
 def get_zipped_bundle_filename(test_name, root_dir) -> str:
     """Return full path of config file path for a given test name."""
     return os.path.join(root_dir, f"{test_name}.bundle.zip")
 
 
 def get_all_files(test_name, root_dir) -> list:
-    """Return all files for a given test name."""
+    """Return all files for a given test name, reports only in the formats that were rendered."""
+    reports = [
+        filename
+        for filename in [get_report_filename(test_name, root_dir), get_html_report_filename(test_name, root_dir)]
+        if os.path.exists(filename)
+    ]
     return [
         get_metadata_filename(test_name, root_dir),
         get_pcap_filename(test_name, root_dir),
-        get_report_filename(test_name, root_dir),
+        get_results_filename(test_name, root_dir),
+    ] + reports + [
         get_config_filename(test_name, root_dir),
-    ]
+    ] + get_log_files(test_name, root_dir)
@@ -5,6 +5,7 @@ from collections import ChainMap
 
 KEY_ROOT_DIR = "local_output_dir"
 KEY_CLIENT_IFACE = "client_iface"
+KEY_CLIENT_IFACES = "client_ifaces"
 KEY_SERVER_IFACE = "server_iface"
 KEY_CHUNK_SIZE = "chunk_size"
 KEY_SSID = "ssid"
@@ -20,6 +21,20 @@ KEY_BRAND = "sut_brand"
 KEY_HARDWARE = "sut_hardware"
 KEY_SOFTWARE = "sut_software"
 KEY_RADIUS_PORT = "radius_port"
+KEY_SO_SNDBUF = "so_sndbuf"
+KEY_SO_RCVBUF = "so_rcvbuf"
+KEY_TCP_NODELAY = "tcp_nodelay"
+KEY_TCP_CONGESTION = "tcp_congestion"
+KEY_TCP_MAXSEG = "tcp_maxseg"
+KEY_IP_TOS = "ip_tos"
+KEY_TRANSFER_MODE = "transfer_mode"
+KEY_PAYLOAD = "payload"
+KEY_BUFFER_SIZE = "buffer_size"
+KEY_CAPTURE_ENGINE = "capture_engine"
+KEY_RADIUS_SERVER = "radius_server"
+KEY_ACCOUNTING_TIMEOUT = "accounting_timeout"
+KEY_BUNDLE_COMPRESSION = "bundle_compression"
+KEY_BUNDLE_COMPRESSION_LEVEL = "bundle_compression_level"
 
 KEY_DATA_SERVER_IP = "data_server_ip"
 KEY_DATA_SERVER_PORT = "data_server_port"
@@ -27,6 +42,8 @@ KEY_TEST_NAME = "test_name"
 
 ROOT_DIR = "/usr/local/raa"
 CLIENT_IFACE = "wlan0"
+# Empty means one client on CLIENT_IFACE.
+CLIENT_IFACES = []
 SERVER_IFACE = "eth0"
 CHUNK_SIZE = 1024
 SSID = "raatest"
@@ -45,6 +62,23 @@ MARKERS = ["core"]
 BRAND = "Not Specified"
 HARDWARE = "Not Specified"
 SOFTWARE = "Not Specified"
+# Socket tuning, None keeps the kernel default.
+SO_SNDBUF = None
+SO_RCVBUF = None
+TCP_NODELAY = None
+TCP_CONGESTION = None
+TCP_MAXSEG = None
+IP_TOS = None
+TRANSFER_MODE = "thread"
+PAYLOAD = "random"
+BUFFER_SIZE = 1024 * 1024
+CAPTURE_ENGINE = "tcpdump"
+RADIUS_SERVER = "freeradius"
+# Seconds to wait for an accounting record to show up in the capture.
+ACCOUNTING_TIMEOUT = 30
+# Fast deflate, pcaps and debug logs shrink a lot even at level 1.
+BUNDLE_COMPRESSION = "deflated"
+BUNDLE_COMPRESSION_LEVEL = 1
 
 def get_required_args() -> list:
     """Only these are the required arguments."""
@@ -55,6 +89,7 @@ def get_defaults() -> dict:
     defaults = {
       KEY_ROOT_DIR: ROOT_DIR,
       KEY_CLIENT_IFACE: CLIENT_IFACE,
+      KEY_CLIENT_IFACES: CLIENT_IFACES,
       KEY_SERVER_IFACE: SERVER_IFACE,
       KEY_CHUNK_SIZE: CHUNK_SIZE,
       KEY_SSID: SSID,
@@ -70,6 +105,20 @@ def get_defaults() -> dict:
       KEY_HARDWARE: HARDWARE,
       KEY_SOFTWARE: SOFTWARE,
       KEY_RADIUS_PORT: RADIUS_PORT,
+      KEY_SO_SNDBUF: SO_SNDBUF,
+      KEY_SO_RCVBUF: SO_RCVBUF,
+      KEY_TCP_NODELAY: TCP_NODELAY,
+      KEY_TCP_CONGESTION: TCP_CONGESTION,
+      KEY_TCP_MAXSEG: TCP_MAXSEG,
+      KEY_IP_TOS: IP_TOS,
+      KEY_TRANSFER_MODE: TRANSFER_MODE,
+      KEY_PAYLOAD: PAYLOAD,
+      KEY_BUFFER_SIZE: BUFFER_SIZE,
+      KEY_CAPTURE_ENGINE: CAPTURE_ENGINE,
+      KEY_RADIUS_SERVER: RADIUS_SERVER,
+      KEY_ACCOUNTING_TIMEOUT: ACCOUNTING_TIMEOUT,
+      KEY_BUNDLE_COMPRESSION: BUNDLE_COMPRESSION,
+      KEY_BUNDLE_COMPRESSION_LEVEL: BUNDLE_COMPRESSION_LEVEL,
     }
     return defaults
 
@@ -0,0 +1,311 @@
+"""Run tests as background jobs, one at a time, with their state and log kept in a jobs directory.
+
+The UI only submits, polls and cancels jobs. A worker process started on demand runs queued jobs in
+order, each in its own process group so cancelling stops the test bed processes it started too.
+
+Run with: python -m src.jobs list --jobs_dir /usr/local/raa/jobs
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import List, Tuple, Union
+import src.files as files
+import src.inputs as inputs
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+DONE_STATES = [FINISHED, FAILED, CANCELLED]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_LOCK = "worker.lock"
+# Held while a job's state is loaded, changed and saved, the UI, the worker and the job all change states
+STATE_LOCK = "state.lock"
+# Seconds the worker waits between checks of a running job
+POLL_INTERVAL = 0.5
+# Seconds a cancelled job gets to stop its processes before it is killed
+CANCEL_GRACE = 30
+
+
+@dataclass
+class Job:
+    """A queued, running or done test run, persisted as JSON in the jobs directory"""
+
+    id: str
+    test_name: str
+    config: dict
+    profile: bool = False
+    profile_memory: bool = False
+    state: str = QUEUED
+    phase: str = ""
+    created: float = field(default_factory=time.time)
+    started: Union[float, None] = None
+    finished: Union[float, None] = None
+    pid: Union[int, None] = None
+    exit_code: Union[int, None] = None
+    cancel_requested: bool = False
+    error: str = ""
+
+    @property
+    def done(self) -> bool:
+        return self.state in DONE_STATES
+
+    @property
+    def root_dir(self) -> str:
+        return self.config["local_output_directory"]
+
+    @property
+    def duration(self) -> Union[float, None]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobManager:
+    """Submit, list and cancel jobs kept in a directory, safe to use from many Streamlit sessions"""
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    @staticmethod
+    def __pid_alive(pid: Union[int, None]) -> bool:
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def get_state_filename(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def get_log_filename(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.log")
+
+    def save(self, job: Job):
+        """Write the state atomically, readers see the old or the new state"""
+        filename = self.get_state_filename(job.id)
+        with open(f"{filename}.tmp", "w", encoding="utf-8") as file:
+            json.dump(job.to_dict(), file, indent=2)
+        os.replace(f"{filename}.tmp", filename)
+
+    def load(self, job_id: str) -> Job:
+        with open(self.get_state_filename(job_id), "r", encoding="utf-8") as file:
+            return Job(**json.load(file))
+
+    @contextmanager
+    def __state_lock(self):
+        with open(os.path.join(self.jobs_dir, STATE_LOCK), "w", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def update(self, job_id: str, if_states: Union[List[str], None] = None, **changes) -> Job:
+        """Change a job's state unless it left if_states meanwhile, return the job as saved"""
+        with self.__state_lock():
+            job = self.load(job_id)
+            if if_states is not None and job.state not in if_states:
+                return job
+            for key, value in changes.items():
+                setattr(job, key, value)
+            self.save(job)
+        return job
+
+    def list_jobs(self) -> List[Job]:
+        """All jobs, oldest first, running jobs whose process died are marked failed"""
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                job = self.load(name.removesuffix(".json"))
+            except (ValueError, TypeError, FileNotFoundError) as error:
+                logging.warning("Skipping unreadable job %s: %s", name, error)
+                continue
+            if job.state == RUNNING and not self.__pid_alive(job.pid):
+                job = self.update(job.id, [RUNNING], state=FAILED, finished=time.time(), error="Job process died")
+            jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created)
+
+    def submit(self, config: dict, profile=False, profile_memory=False) -> Job:
+        """Queue a test run of a TestConfig dict and make sure a worker runs it"""
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        job = Job(job_id, config["test_name"], config, profile, profile_memory)
+        self.save(job)
+        logging.info("Queued job %s for %s", job.id, job.test_name)
+        self.start_worker()
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Drop a queued job, or stop a running one and its test bed processes"""
+        job = self.update(job_id, [QUEUED], state=CANCELLED, finished=time.time())
+        if job.state == RUNNING:
+            job = self.update(job_id, [RUNNING], cancel_requested=True)
+            if self.__pid_alive(job.pid):
+                os.killpg(job.pid, signal.SIGTERM)
+        return job
+
+    def read_log(self, job_id: str, offset=0) -> Tuple[str, int]:
+        """Return log text written since offset and the offset to continue from"""
+        try:
+            with open(self.get_log_filename(job_id), "rb") as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return "", offset
+        # Do not split a line still being written
+        end = data.rfind(b"\n") + 1
+        return data[:end].decode("utf-8", "replace"), offset + end
+
+    def start_worker(self):
+        """Start a worker process unless one is running, it exits once the queue is empty"""
+        subprocess.Popen(
+            [sys.executable, "-m", "src.jobs", "worker", "--jobs_dir", self.jobs_dir],
+            cwd=REPO_DIR, start_new_session=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def __next_queued(self) -> Union[Job, None]:
+        queued = [job for job in self.list_jobs() if job.state == QUEUED]
+        return queued[0] if queued else None
+
+    def __run(self, job: Job):
+        """Run a job in its own process group and wait for it, escalating a cancel to SIGKILL"""
+        if self.load(job.id).state != QUEUED:
+            # Cancelled since it was picked
+            return
+        with open(self.get_log_filename(job.id), "ab") as log:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "src.jobs", "run", job.id, "--jobs_dir", self.jobs_dir],
+                cwd=REPO_DIR, start_new_session=True, stdout=log, stderr=subprocess.STDOUT,
+                # The UI tails the log while the job runs
+                env={**os.environ, "PYTHONUNBUFFERED": "1"},
+            )
+        if self.update(job.id, [QUEUED], state=RUNNING, started=time.time(), pid=process.pid).state != RUNNING:
+            # Cancelled while the process started
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            return
+        cancelled_at = None
+        while process.poll() is None:
+            if cancelled_at is None and self.load(job.id).cancel_requested:
+                cancelled_at = time.monotonic()
+            elif cancelled_at is not None and time.monotonic() - cancelled_at > CANCEL_GRACE:
+                os.killpg(process.pid, signal.SIGKILL)
+            time.sleep(POLL_INTERVAL)
+        job = self.load(job.id)
+        if job.cancel_requested:
+            state = CANCELLED
+        else:
+            state = FINISHED if process.returncode == 0 else FAILED
+        # list_jobs may have marked the job failed once its process was reaped
+        self.update(job.id, state=state, finished=time.time(), exit_code=process.returncode, error="")
+        logging.info("Job %s %s with exit code %s", job.id, state, process.returncode)
+
+    def work(self):
+        """Run queued jobs one after another, return when none is left or another worker runs"""
+        with open(os.path.join(self.jobs_dir, WORKER_LOCK), "w", encoding="utf-8") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            while True:
+                job = self.__next_queued()
+                if job is None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                    # A job queued while this worker held the lock has no other worker to run it
+                    if self.__next_queued() is None:
+                        return
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return
+                    continue
+                self.__run(job)
+
+
+def run_job(manager: JobManager, job_id: str) -> int:
+    """Run the test of a job in this process, what appcli.py does for one test"""
+    # Imported here, the UI and the worker do not need the test bed
+    import src.testbed_setup as ts
+    from src.profiling import Profiler, add_to_bundle
+
+    def stop(*_):
+        # Unwinds through the finally blocks that stop the test bed processes
+        raise SystemExit(128 + signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    ts.setup_logging(False)
+    logger = logging.getLogger(__name__)
+    job = manager.load(job_id)
+    config = ts.TestConfig(**job.config)
+    files.init_dirs(config.local_output_directory)
+    config.write_yaml()
+    profiler = Profiler(config.test_name, config.local_output_directory,
+                        enabled=job.profile, memory=job.profile_memory)
+    exit_code = 0
+    if config.generate_pcap:
+        manager.update(job_id, phase="generate_pcap")
+        with profiler.phase("generate_pcap"):
+            ts.generate_pcap(config, logger)
+    if config.generate_report:
+        manager.update(job_id, phase="test_cases")
+        with profiler.phase("test_cases"):
+            exit_code = int(ts.execute_test_cases(config, logger))
+        if profiler.enabled:
+            add_to_bundle(config.test_name, config.local_output_directory)
+    manager.update(job_id, phase="done")
+    logger.info(f"Job finished, results written to {config.local_output_directory}")
+    # Failing test cases are a result, not a failed job
+    return 0 if exit_code in (0, 1) else exit_code
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Manage background test jobs")
+    parser.add_argument("command", choices=["list", "cancel", "worker", "run"])
+    parser.add_argument("job_id", nargs="?", help="Job to cancel or run")
+    parser.add_argument("--jobs_dir", default=files.get_jobs_dir(inputs.ROOT_DIR),
+                        help=f"Directory of job states and logs, default: {files.get_jobs_dir(inputs.ROOT_DIR)}")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Main function to manage jobs."""
+    cliargs = parse_cliargs(args)
+    manager = JobManager(cliargs.jobs_dir)
+    if cliargs.command == "run":
+        sys.exit(run_job(manager, cliargs.job_id))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if cliargs.command == "worker":
+        manager.work()
+    elif cliargs.command == "cancel":
+        manager.cancel(cliargs.job_id)
+    else:
+        for job in manager.list_jobs():
+            print(f"{job.id} {job.test_name}: {job.state} {job.phase}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Sample interface counters and the usage reported in accounting during a run, for live charts.
+
+The sampler appends JSON lines to a file in the logs directory, readers tail that file, so the UI
+refreshes on its own timer and never waits on the run. Times are seconds since the epoch, the
+clock of the capture timestamps, so both sources share one time axis.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Tuple, Union
+import psutil
+import src.radius as radius
+from src.observer import RadiusObserver
+
+# Seconds between interface counter samples
+SAMPLE_INTERVAL = 1.0
+# Seconds of chart points kept at full resolution, older points are merged per HISTORY_RESOLUTION seconds
+RECENT_WINDOW = 600
+HISTORY_RESOLUTION = 30
+COUNTERS = "counters"
+ACCOUNTING = "accounting"
+STATUS_NAMES = {
+    radius.ACCT_STATUS_START: "start",
+    radius.ACCT_STATUS_INTERIM: "interim",
+    radius.ACCT_STATUS_STOP: "stop",
+}
+
+
+class LiveSampler:
+    """Append byte counters of the client interfaces and every Accounting-Request carrying usage to a file.
+
+    Counters are relative to when the sampler started. Accounting records are written at
+    the capture time of the request, usage includes gigawords."""
+
+    name = "live sampler"
+
+    def __init__(self, filename: str, usernames: Dict[str, str], observer: Union[RadiusObserver, None] = None,
+                 interval=SAMPLE_INTERVAL):
+        self.filename = filename
+        self.usernames = usernames
+        self.interfaces = {username: interface for interface, username in usernames.items()}
+        self.observer = observer
+        self.interval = interval
+        self.baselines = {}
+        self.event_index = 0
+        self.file = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __counter_records(self, now: float) -> List[dict]:
+        counters = psutil.net_io_counters(pernic=True)
+        records = []
+        for interface in self.usernames:
+            if interface not in counters:
+                continue
+            counter = counters[interface]
+            baseline = self.baselines.setdefault(interface, counter)
+            records.append({
+                "kind": COUNTERS,
+                "time": now,
+                "interface": interface,
+                "bytes_sent": counter.bytes_sent - baseline.bytes_sent,
+                "bytes_recv": counter.bytes_recv - baseline.bytes_recv,
+            })
+        return records
+
+    def __accounting_records(self) -> List[dict]:
+        if self.observer is None:
+            return []
+        with self.observer.condition:
+            events = self.observer.events[self.event_index:]
+            self.event_index = len(self.observer.events)
+        return [
+            {
+                "kind": ACCOUNTING,
+                "time": event.timestamp,
+                "interface": self.interfaces.get(event.username),
+                "username": event.username,
+                "status": STATUS_NAMES.get(event.status_type),
+                "input_octets": event.input_octets,
+                "output_octets": event.output_octets,
+            }
+            for event in events
+            if event.code == radius.ACCOUNTING_REQUEST and event.input_octets is not None
+        ]
+
+    def sample(self):
+        """Write one counter sample per interface and the accounting usage seen since the last sample"""
+        records = self.__counter_records(time.time()) + self.__accounting_records()
+        self.file.write("".join(json.dumps(record) + "\n" for record in records))
+        self.file.flush()
+
+    def __run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except OSError as error:
+                logging.warning("Live sample failed: %s", error)
+
+    def start(self):
+        """Start sampling, call after the observer started"""
+        self.file = open(self.filename, "w", encoding="utf-8")
+        self.stopped.clear()
+        self.sample()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling after a last sample, call after the observer stopped"""
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        self.sample()
+        self.file.close()
+
+
+def read_samples(filename: str, offset=0) -> Tuple[List[dict], int]:
+    """Return records written since offset and the offset to continue from"""
+    try:
+        with open(filename, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+    except FileNotFoundError:
+        return [], offset
+    # Do not parse a line still being written
+    end = data.rfind(b"\n") + 1
+    return [json.loads(line) for line in data[:end].splitlines() if line], offset + end
+
+
+class ChartColumns:
+    """Long form chart points, the last window seconds at full resolution and one point per series and
+    resolution seconds before that, so a run of any length keeps a bounded number of points per hour.
+
+    Older points are merged into the mean of their values when mean is set, rates such as throughput,
+    else into their last value, for cumulative counters."""
+
+    def __init__(self, mean=False, window=RECENT_WINDOW, resolution=HISTORY_RESOLUTION):
+        self.mean = mean
+        self.window = window
+        self.resolution = resolution
+        self.recent = deque()
+        self.history = {"elapsed": [], "series": [], "value": []}
+        # Per series, the history bucket being merged: [bucket, elapsed, value sum, count]
+        self.pending = {}
+
+    def __add_history(self, series: str, pending: list):
+        _, elapsed, total, count = pending
+        self.history["elapsed"].append(elapsed)
+        self.history["series"].append(series)
+        self.history["value"].append(total / count if self.mean else total)
+
+    def __merge(self, elapsed: float, series: str, value: float):
+        bucket = int(elapsed // self.resolution)
+        pending = self.pending.get(series)
+        if pending is not None and pending[0] != bucket:
+            self.__add_history(series, pending)
+            pending = None
+        if pending is None:
+            self.pending[series] = [bucket, elapsed, value, 1]
+        elif self.mean:
+            pending[1:] = [elapsed, pending[2] + value, pending[3] + 1]
+        else:
+            pending[1:] = [elapsed, value, 1]
+
+    def append(self, elapsed: float, series: str, value: float):
+        """Add a point, merging points that left the recent window into the history"""
+        self.recent.append((elapsed, series, value))
+        while self.recent[0][0] < elapsed - self.window:
+            self.__merge(*self.recent.popleft())
+
+    def __len__(self) -> int:
+        return len(self.history["elapsed"]) + len(self.pending) + len(self.recent)
+
+    def to_dict(self) -> dict:
+        """Columns elapsed, series and value, history first"""
+        columns = {key: list(values) for key, values in self.history.items()}
+        points = [(pending[1], series, pending[2] / pending[3] if self.mean else pending[2])
+                  for series, pending in self.pending.items()]
+        for elapsed, series, value in points + list(self.recent):
+            columns["elapsed"].append(elapsed)
+            columns["series"].append(series)
+            columns["value"].append(value)
+        return columns
+
+
+class LiveSeries:
+    """Chart data of a live samples file, extended by the records written since the last refresh.
+
+    Series are in long form, columns elapsed (seconds since the first sample), series and value, see
+    ChartColumns for how long runs are downsampled. Upload pairs the interface's sent bytes with Acct-Input-Octets, download pairs received
+    bytes with Acct-Output-Octets."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.offset = 0
+        self.start = None
+        self.latest = None
+        self.throughput_columns = ChartColumns(mean=True)
+        self.octets_columns = ChartColumns()
+        self.counters = {}
+        self.reports = {}
+
+    @property
+    def throughput(self) -> dict:
+        return self.throughput_columns.to_dict()
+
+    @property
+    def octets(self) -> dict:
+        return self.octets_columns.to_dict()
+
+    def __add_counters(self, record: dict, elapsed: float):
+        interface = record["interface"]
+        previous = self.counters.get(interface)
+        self.counters[interface] = record
+        self.octets_columns.append(elapsed, f"{interface} upload (interface)", record["bytes_sent"])
+        self.octets_columns.append(elapsed, f"{interface} download (interface)", record["bytes_recv"])
+        if previous is None or record["time"] <= previous["time"]:
+            return
+        seconds = record["time"] - previous["time"]
+        for direction, key in (("upload", "bytes_sent"), ("download", "bytes_recv")):
+            mbps = (record[key] - previous[key]) * 8 / seconds / 1e6
+            self.throughput_columns.append(elapsed, f"{interface} {direction}", mbps)
+
+    def __add_accounting(self, record: dict, elapsed: float):
+        name = record["interface"] or record["username"]
+        self.reports[name] = record
+        self.octets_columns.append(elapsed, f"{name} upload (reported)", record["input_octets"])
+        self.octets_columns.append(elapsed, f"{name} download (reported)", record["output_octets"] or 0)
+
+    def refresh(self) -> int:
+        """Read the records written since the last refresh, return how many there were"""
+        records, self.offset = read_samples(self.filename, self.offset)
+        for record in records:
+            if self.start is None:
+                self.start = record["time"]
+            self.latest = max(self.latest or record["time"], record["time"])
+            elapsed = record["time"] - self.start
+            if record["kind"] == COUNTERS:
+                self.__add_counters(record, elapsed)
+            elif record["kind"] == ACCOUNTING:
+                self.__add_accounting(record, elapsed)
+        return len(records)
+
+    def get_lag(self) -> Dict[str, dict]:
+        """Per interface, seconds since usage was last reported and bytes not reported yet.
+
+        Interface counters include headers and other traffic, expect the unreported bytes to stay positive."""
+        lag = {}
+        for interface, counters in self.counters.items():
+            report = self.reports.get(interface)
+            lag[interface] = {
+                "report_age": self.latest - report["time"] if report else None,
+                "unreported_upload": counters["bytes_sent"] - (report["input_octets"] if report else 0),
+                "unreported_download": counters["bytes_recv"] - ((report["output_octets"] or 0) if report else 0),
+            }
+        return lag
@@ -0,0 +1,349 @@
+"""Synthetic RADIUS accounting load generator acting as one or more NAS clients.
+
+Run with: python -m src.loadgen --sessions 1000 --interim_interval 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Union
+import src.radius as radius
+from src.inputs import RADIUS_PORT
+from src.radius_server import RadiusServer, SECRET
+
+TERMINATE_CAUSE_USER_REQUEST = 1
+LATENCY_PERCENTILES = [50, 95, 99]
+
+
+@dataclass
+class LoadConfig:
+    """Load generator settings, octet rates are per session and direction."""
+
+    server: str = "127.0.0.1"
+    radius_port: int = RADIUS_PORT
+    secret: str = SECRET
+    sessions: int = 100
+    clients: int = 1
+    interim_interval: float = 10
+    session_duration: float = 60
+    ramp: Union[float, None] = None
+    rate: Union[float, None] = None
+    input_rate: int = 1_000_000
+    output_rate: int = 10_000_000
+    initial_octets: int = 0
+    timeout: float = 3
+    retries: int = 2
+    skip_auth: bool = False
+    username: str = "raauser"
+    password: str = "secret"
+
+
+@dataclass
+class LoadResult:
+    """Counters and response latencies collected during a run."""
+
+    duration: float = 0
+    sent: int = 0
+    retransmissions: int = 0
+    timeouts: int = 0
+    invalid_responses: int = 0
+    accepts: int = 0
+    rejects: int = 0
+    completed_sessions: int = 0
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+
+    @property
+    def responses(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        """Responses per second"""
+        return self.responses / self.duration if self.duration else 0
+
+    def get_latency_summary(self) -> dict:
+        """Latency percentiles in milliseconds per request type"""
+        summary = {}
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            if not values:
+                continue
+            summary[name] = {
+                f"p{percentile}": values[min(len(values) - 1, len(values) * percentile // 100)] * 1000
+                for percentile in LATENCY_PERCENTILES
+            }
+            summary[name]["max"] = values[-1] * 1000
+            summary[name]["count"] = len(values)
+        return summary
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result.pop("latencies")
+        result["responses"] = self.responses
+        result["throughput"] = self.throughput
+        result["latency_ms"] = self.get_latency_summary()
+        return result
+
+    def __str__(self):
+        lines = [
+            f"{self.completed_sessions} sessions completed in {self.duration:.1f} s",
+            f"{self.sent} requests sent, {self.responses} responses "
+            f"({self.throughput:.0f}/s), {self.retransmissions} retransmissions, "
+            f"{self.timeouts} timeouts, {self.invalid_responses} invalid responses",
+            f"{self.accepts} Access-Accepts, {self.rejects} Access-Rejects",
+        ]
+        for name, latency in self.get_latency_summary().items():
+            lines.append(
+                f"{name}: " + ", ".join(f"{key} {value:.2f} ms" for key, value in latency.items() if key != "count")
+            )
+        return "\n".join(lines)
+
+
+def split_octets(total: int) -> tuple:
+    """Split a 64-bit octet counter into Acct-*-Octets and Acct-*-Gigawords."""
+    return total % 2**32, total // 2**32
+
+
+class RateLimiter:
+    """Token bucket shared by all sessions, None means unlimited."""
+
+    def __init__(self, rate: Union[float, None]):
+        self.rate = rate
+        self.next_time = time.monotonic()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.next_time = max(self.next_time, now)
+        wait = self.next_time - now
+        self.next_time += 1 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class NasClient(asyncio.DatagramProtocol):
+    """One NAS with its own UDP socket and 256 request identifiers."""
+
+    def __init__(self, config: LoadConfig, result: LoadResult, limiter: RateLimiter):
+        self.config = config
+        self.secret = config.secret.encode("utf-8")
+        self.result = result
+        self.limiter = limiter
+        self.transport = None
+        self.pending = {}
+        self.identifiers = asyncio.Queue()
+        for identifier in range(256):
+            self.identifiers.put_nowait(identifier)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < radius.HEADER.size:
+            self.result.invalid_responses += 1
+            return
+        future = self.pending.get(data[1])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    async def request(self, name: str, packet: radius.RadiusPacket, port: int) -> Union[radius.RadiusPacket, None]:
+        """Send a request with retransmissions, return the response or None on timeout"""
+        packet.identifier = await self.identifiers.get()
+        try:
+            if packet.code == radius.ACCOUNTING_REQUEST:
+                data = radius.encode_accounting_request(packet, self.secret)
+            else:
+                data = radius.encode_access_request(packet, self.secret)
+            await self.limiter.acquire()
+            begin = time.perf_counter()
+            for attempt in range(self.config.retries + 1):
+                future = asyncio.get_running_loop().create_future()
+                self.pending[packet.identifier] = future
+                self.transport.sendto(data, (self.config.server, port))
+                self.result.sent += 1
+                if attempt:
+                    self.result.retransmissions += 1
+                try:
+                    response = await asyncio.wait_for(future, self.config.timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if not radius.verify_response(response, packet.authenticator, self.secret):
+                    self.result.invalid_responses += 1
+                    return None
+                self.result.latencies.setdefault(name, []).append(time.perf_counter() - begin)
+                return radius.RadiusPacket.decode(response)
+            self.result.timeouts += 1
+            return None
+        finally:
+            self.pending.pop(packet.identifier, None)
+            self.identifiers.put_nowait(packet.identifier)
+
+
+class Session:
+    """Simulated subscriber session: authentication, Start, Interim-Updates and Stop."""
+
+    def __init__(self, index: int, nas: NasClient, nas_index: int):
+        self.index = index
+        self.nas = nas
+        self.config = nas.config
+        self.session_id = f"raa-loadgen-{index:08x}"
+        self.nas_identifier = f"raa-loadgen-{nas_index}"
+        # Locally administered MAC address derived from the session index
+        mac = (0x020000000000 + index).to_bytes(6, "big")
+        self.calling_station_id = "-".join(f"{octet:02X}" for octet in mac)
+        self.reply_attributes = []
+        self.begin = None
+
+    def __accounting_request(self, status_type: int) -> radius.RadiusPacket:
+        packet = radius.RadiusPacket(radius.ACCOUNTING_REQUEST, 0)
+        packet.add(radius.ACCT_STATUS_TYPE, status_type)
+        packet.add(radius.USER_NAME, self.config.username)
+        packet.add(radius.NAS_IDENTIFIER, self.nas_identifier)
+        packet.add(radius.ACCT_SESSION_ID, self.session_id)
+        packet.add(radius.CALLING_STATION_ID, self.calling_station_id)
+        # Class and Chargeable-User-Identity from the Access-Accept are echoed
+        packet.attributes.extend(self.reply_attributes)
+        if status_type != radius.ACCT_STATUS_START:
+            elapsed = time.monotonic() - self.begin
+            for rate, octets_type, gigawords_type in [
+                (self.config.input_rate, radius.ACCT_INPUT_OCTETS, radius.ACCT_INPUT_GIGAWORDS),
+                (self.config.output_rate, radius.ACCT_OUTPUT_OCTETS, radius.ACCT_OUTPUT_GIGAWORDS),
+            ]:
+                octets, gigawords = split_octets(self.config.initial_octets + int(rate * elapsed))
+                packet.add(octets_type, octets)
+                packet.add(gigawords_type, gigawords)
+            packet.add(radius.ACCT_SESSION_TIME, int(elapsed))
+        if status_type == radius.ACCT_STATUS_STOP:
+            packet.add(radius.ACCT_TERMINATE_CAUSE, TERMINATE_CAUSE_USER_REQUEST)
+        return packet
+
+    async def run(self, delay: float):
+        """Run the whole session after delay seconds"""
+        await asyncio.sleep(delay)
+        auth_port, acct_port = self.config.radius_port, self.config.radius_port + 1
+        if not self.config.skip_auth:
+            request = radius.RadiusPacket(radius.ACCESS_REQUEST, 0, radius.new_authenticator())
+            request.add(radius.USER_NAME, self.config.username)
+            request.add(radius.USER_PASSWORD, radius.encrypt_password(
+                self.config.password.encode("utf-8"), request.authenticator, self.nas.secret
+            ))
+            request.add(radius.CALLING_STATION_ID, self.calling_station_id)
+            request.add(radius.NAS_IDENTIFIER, self.nas_identifier)
+            response = await self.nas.request("access", request, auth_port)
+            if response is None:
+                return
+            if response.code != radius.ACCESS_ACCEPT:
+                self.nas.result.rejects += 1
+                return
+            self.nas.result.accepts += 1
+            self.reply_attributes = [
+                attr for attr in response.attributes
+                if attr[0] in (radius.CLASS, radius.CHARGEABLE_USER_IDENTITY)
+            ]
+        self.begin = time.monotonic()
+        await self.nas.request("start", self.__accounting_request(radius.ACCT_STATUS_START), acct_port)
+        end = self.begin + self.config.session_duration
+        while time.monotonic() + self.config.interim_interval < end:
+            await asyncio.sleep(self.config.interim_interval)
+            await self.nas.request("interim", self.__accounting_request(radius.ACCT_STATUS_INTERIM), acct_port)
+        await asyncio.sleep(max(0, end - time.monotonic()))
+        if await self.nas.request("stop", self.__accounting_request(radius.ACCT_STATUS_STOP), acct_port):
+            self.nas.result.completed_sessions += 1
+
+
+async def run_load(config: LoadConfig) -> LoadResult:
+    """Run all sessions spread over the NAS clients, return when every session ended"""
+    result = LoadResult()
+    limiter = RateLimiter(config.rate)
+    loop = asyncio.get_running_loop()
+    clients = []
+    for _ in range(config.clients):
+        _, nas = await loop.create_datagram_endpoint(
+            lambda: NasClient(config, result, limiter), local_addr=("0.0.0.0", 0),
+        )
+        clients.append(nas)
+    # Spread session starts so interim updates do not all arrive at once
+    ramp = config.interim_interval if config.ramp is None else config.ramp
+    begin = time.perf_counter()
+    sessions = [
+        Session(i, clients[i % len(clients)], i % len(clients)).run(ramp * i / config.sessions)
+        for i in range(config.sessions)
+    ]
+    try:
+        await asyncio.gather(*sessions)
+    finally:
+        result.duration = time.perf_counter() - begin
+        for nas in clients:
+            nas.transport.close()
+    return result
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(description="Emit synthetic RADIUS authentication and accounting load")
+    parser.add_argument("--server", type=str, default=defaults.server, help=f"default: {defaults.server}")
+    parser.add_argument("--radius_port", type=int, default=defaults.radius_port,
+                        help=f"Auth port, accounting uses the next one, default: {defaults.radius_port}")
+    parser.add_argument("--secret", type=str, default=defaults.secret, help="Shared secret")
+    parser.add_argument("--sessions", type=int, default=defaults.sessions,
+                        help=f"Concurrent sessions, default: {defaults.sessions}")
+    parser.add_argument("--clients", type=int, default=defaults.clients,
+                        help=f"NAS clients, each with its own socket, default: {defaults.clients}")
+    parser.add_argument("--interim_interval", type=float, default=defaults.interim_interval,
+                        help=f"Seconds between Interim-Updates, default: {defaults.interim_interval}")
+    parser.add_argument("--session_duration", type=float, default=defaults.session_duration,
+                        help=f"Seconds from Start to Stop, default: {defaults.session_duration}")
+    parser.add_argument("--ramp", type=float, default=None,
+                        help="Seconds over which session starts are spread, default: interim interval")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Maximum requests per second, default: unlimited")
+    parser.add_argument("--input_rate", type=int, default=defaults.input_rate,
+                        help=f"Input octets per second per session, default: {defaults.input_rate}")
+    parser.add_argument("--output_rate", type=int, default=defaults.output_rate,
+                        help=f"Output octets per second per session, default: {defaults.output_rate}")
+    parser.add_argument("--initial_octets", type=int, default=defaults.initial_octets,
+                        help="Octet counter offset, e.g. 4294000000 to roll over into gigawords")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout,
+                        help=f"Seconds before a request is retransmitted, default: {defaults.timeout}")
+    parser.add_argument("--retries", type=int, default=defaults.retries,
+                        help=f"Retransmissions before giving up, default: {defaults.retries}")
+    parser.add_argument("--skip_auth", action="store_true",
+                        help="Only send accounting, e.g. against FreeRADIUS which requires EAP")
+    parser.add_argument("--builtin", action="store_true",
+                        help="Start the built-in RADIUS server on --server/--radius_port")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Main function to run the load generator."""
+    cliargs = vars(parse_cliargs(args))
+    builtin = cliargs.pop("builtin")
+    output = cliargs.pop("output")
+    config = LoadConfig(**cliargs)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    server = None
+    if builtin:
+        server = RadiusServer("/tmp/raa-loadgen/radius.log", port=config.radius_port,
+                              secret=config.secret, host=config.server)
+        server.start()
+    try:
+        result = asyncio.run(run_load(config))
+    finally:
+        if server is not None:
+            server.stop()
+    print(result)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"config": asdict(config), "result": result.to_dict()}, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,10 @@
 
 import json
 from datetime import datetime
-from dataclasses import dataclass
-from typing import Union
+from dataclasses import dataclass, field
+from typing import Dict, List, Union
 from src.files import get_metadata_filename
-from src.data_transfer import UsageCounter
+from src.data_transfer import UsageCounter, TCPInfo
 
 @dataclass
 class Metadata:
@@ -25,6 +25,13 @@ class Metadata:
     radius_port: int
     usage_upload: Union[UsageCounter, None] = None
     usage_download: Union[UsageCounter, None] = None
+    tcp_info_upload: Union[Dict[str, TCPInfo], None] = None
+    tcp_info_download: Union[Dict[str, TCPInfo], None] = None
+    socket_options: Union[Dict[str, dict], None] = None
+    auth_events: Union[dict, None] = None
+    capture_health: Union[dict, None] = None
+    client_interface: str = ""
+    clients: List["Metadata"] = field(default_factory=list)
     _date_format: str = "%Y-%m-%d %H:%M:%S"
 
     def __post_init__(self):
@@ -34,6 +41,10 @@ class Metadata:
         if isinstance(self.end_time, str):
             self.end_time = datetime.strptime(self.end_time, self._date_format)
 
+    def get_all_clients(self) -> List["Metadata"]:
+        """Get metadata of every client session, starting with this one."""
+        return [self] + list(self.clients)
+
     def get_upload_packets(self):
         """Get the number of packets sent."""
         return self.usage_upload.packets_sent if self.usage_upload else None
@@ -61,17 +72,36 @@ class Metadata:
             "start_time": self.start_time.strftime(self._date_format),
             "end_time": self.end_time.strftime(self._date_format),
             "radius_port": self.radius_port,
+            "tcp_info_upload": tcp_info_to_dict(self.tcp_info_upload),
+            "tcp_info_download": tcp_info_to_dict(self.tcp_info_download),
+            "socket_options": self.socket_options,
+            "auth_events": self.auth_events,
+            "capture_health": self.capture_health,
+            "client_interface": self.client_interface,
+            "clients": [client.get_dict() for client in self.clients],
         }
 
     def pretty_print_format(self):
         return json.dumps(self.get_dict(), indent=4)
 
 
-def get_metadata(test_name, root_dir) -> Metadata:
-    """Convert metadata JSON file to Metadata object."""
-    metadata_file = get_metadata_filename(test_name, root_dir)
-    with open(metadata_file, encoding='utf-8') as f:
-        metadata_dict = json.load(f)
+def tcp_info_to_dict(tcp_info: Union[Dict[str, TCPInfo], None]) -> Union[dict, None]:
+    """Convert TCP_INFO per endpoint (client/server) to a dictionary."""
+    if not tcp_info:
+        return None
+    return {endpoint: info.to_dict() if info else None for endpoint, info in tcp_info.items()}
+
+
+def tcp_info_from_dict(tcp_info: Union[dict, None]) -> Union[Dict[str, TCPInfo], None]:
+    """Convert TCP_INFO dictionary per endpoint (client/server) to TCPInfo objects."""
+    if not tcp_info:
+        return None
+    return {endpoint: TCPInfo(**info) if info else None for endpoint, info in tcp_info.items()}
+
+
+def metadata_from_dict(metadata_dict: dict) -> Metadata:
+    """Convert metadata dictionary to Metadata object."""
+    metadata_dict = dict(metadata_dict)
     metadata_dict["usage_upload"] = (
         UsageCounter(**metadata_dict["usage_upload"])
         if metadata_dict["usage_upload"]
@@ -82,4 +112,18 @@ def get_metadata(test_name, root_dir) -> Metadata:
         if metadata_dict["usage_download"]
         else None
     )
+    # Older metadata files do not contain TCP_INFO statistics.
+    metadata_dict["tcp_info_upload"] = tcp_info_from_dict(metadata_dict.get("tcp_info_upload"))
+    metadata_dict["tcp_info_download"] = tcp_info_from_dict(metadata_dict.get("tcp_info_download"))
+    metadata_dict["clients"] = [
+        metadata_from_dict(client) for client in metadata_dict.get("clients", [])
+    ]
     return Metadata(**metadata_dict)
+
+
+def get_metadata(test_name, root_dir) -> Metadata:
+    """Convert metadata JSON file to Metadata object."""
+    metadata_file = get_metadata_filename(test_name, root_dir)
+    with open(metadata_file, encoding='utf-8') as f:
+        metadata_dict = json.load(f)
+    return metadata_from_dict(metadata_dict)
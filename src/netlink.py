@@ -0,0 +1,139 @@
+"""Wait for network interface addresses using rtnetlink, without forking ip(8)."""
+
+import socket
+import struct
+import time
+import logging
+from typing import Iterator, Tuple, Union
+import netifaces
+
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWLINK = 16
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+IFA_FLAGS = 8
+IFA_F_DADFAILED = 0x08
+IFA_F_TENTATIVE = 0x40
+RT_SCOPE_UNIVERSE = 0
+
+NLMSGHDR = struct.Struct("=LHHLL")
+IFADDRMSG = struct.Struct("=BBBBi")
+IFINFOMSG = struct.Struct("=BxHiII")
+RTATTR = struct.Struct("=HH")
+POLL_INTERVAL = 0.05
+
+
+def interface_exists(interface: str) -> bool:
+    """Check if a network interface exists."""
+    try:
+        socket.if_nametoindex(interface)
+    except OSError:
+        return False
+    return True
+
+
+def __align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def parse_messages(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """Split a netlink datagram into (message type, payload) pairs."""
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + NLMSGHDR.size:offset + length]
+        offset += __align(length)
+
+
+def parse_attributes(data: bytes) -> dict:
+    """Parse rtattr TLVs into a dictionary of attribute type to value."""
+    attributes = {}
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attributes[attr_type] = data[offset + RTATTR.size:offset + length]
+        offset += __align(length)
+    return attributes
+
+
+def is_usable_address(payload: bytes, ifindex: int, families) -> bool:
+    """Check if a RTM_NEWADDR payload is a usable address on the given interface."""
+    family, _, flags, scope, index = IFADDRMSG.unpack_from(payload)
+    if index != ifindex or family not in families:
+        return False
+    attributes = parse_attributes(payload[IFADDRMSG.size:])
+    if IFA_FLAGS in attributes:
+        flags = struct.unpack("=I", attributes[IFA_FLAGS][:4])[0]
+    if flags & (IFA_F_TENTATIVE | IFA_F_DADFAILED):
+        return False
+    # Link-local IPv6 addresses are always present and can not reach the data server.
+    if family == socket.AF_INET6 and scope != RT_SCOPE_UNIVERSE:
+        return False
+    return True
+
+
+def wait_for_address_netlink(interface: str, timeout=None, families=(socket.AF_INET,)) -> float:
+    """Block until interface has an address, return time.perf_counter() when it was seen."""
+    ifindex = socket.if_nametoindex(interface)
+    groups = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+        sock.bind((0, groups))
+        # Dump current addresses after subscribing so an address can not be missed.
+        request = IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        header = NLMSGHDR.pack(
+            NLMSGHDR.size + len(request), RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0
+        )
+        sock.send(header + request)
+        while True:
+            if deadline is not None:
+                sock.settimeout(max(deadline - time.perf_counter(), 0))
+            try:
+                data = sock.recv(65536)
+            except socket.timeout as e:
+                raise TimeoutError(f"No address on {interface} within {timeout} seconds") from e
+            received = time.perf_counter()
+            for msg_type, payload in parse_messages(data):
+                if msg_type == RTM_NEWADDR and is_usable_address(payload, ifindex, families):
+                    return received
+                if msg_type == RTM_NEWLINK:
+                    _, _, index, link_flags, _ = IFINFOMSG.unpack_from(payload)
+                    if index == ifindex:
+                        logging.debug("Link change on %s, flags: %#x", interface, link_flags)
+
+
+def wait_for_address_polling(interface: str, timeout=None, families=(socket.AF_INET,)) -> float:
+    """Poll interface addresses until one is present, return time.perf_counter() when seen."""
+    netifaces_families = {socket.AF_INET: netifaces.AF_INET, socket.AF_INET6: netifaces.AF_INET6}
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+        addresses = netifaces.ifaddresses(interface)
+        for family in families:
+            for address in addresses.get(netifaces_families[family], []):
+                if not address.get("addr", "").startswith("fe80"):
+                    return time.perf_counter()
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError(f"No address on {interface} within {timeout} seconds")
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_address(interface: str, timeout=None, families=(socket.AF_INET,)) -> float:
+    """Block until interface has an address, fall back to polling if netlink is unavailable."""
+    try:
+        return wait_for_address_netlink(interface, timeout, families)
+    except (AttributeError, PermissionError, OSError) as e:
+        if isinstance(e, TimeoutError) or not interface_exists(interface):
+            raise
+        logging.warning("Netlink unavailable (%s), polling for address on %s", e, interface)
+    return wait_for_address_polling(interface, timeout, families)
@@ -0,0 +1,202 @@
+"""Follow a RADIUS capture while it is written, so tests wait for accounting events instead of sleeping."""
+
+import logging
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Union
+import src.radius as radius
+from src.pcap_file import PCAP_HEADER, PCAP_MAGIC, PCAP_MAGIC_NSEC, get_udp_payload
+
+POLL_INTERVAL = 0.05
+
+def get_total_octets(packet: radius.RadiusPacket, octets_type: int, gigawords_type: int) -> Union[int, None]:
+    """Octets of one direction including gigawords, None if the packet carries no usage"""
+    octets = packet.get_int(octets_type)
+    if octets is None:
+        return None
+    return ((packet.get_int(gigawords_type) or 0) << 32) + octets
+
+
+STATUS_TYPES = {
+    "start": radius.ACCT_STATUS_START,
+    "interim": radius.ACCT_STATUS_INTERIM,
+    "stop": radius.ACCT_STATUS_STOP,
+}
+
+
+@dataclass
+class RadiusEvent:
+    """A RADIUS request seen in the capture, answered once its response is seen too"""
+
+    timestamp: float
+    code: int
+    identifier: int
+    nas: tuple
+    username: Union[str, None] = None
+    status_type: Union[int, None] = None
+    # Usage reported in Accounting-Requests, gigawords included
+    input_octets: Union[int, None] = None
+    output_octets: Union[int, None] = None
+    response_code: Union[int, None] = None
+    response_timestamp: Union[float, None] = None
+
+    @property
+    def answered(self) -> bool:
+        return self.response_code is not None
+
+
+class RadiusObserver:
+    """Tail the pcap a capture engine is writing and collect RADIUS requests and responses.
+
+    Works with tcpdump (-U) and the afpacket capture alike, both write complete
+    records as packets arrive. Timestamps are capture times, seconds since the epoch."""
+
+    def __init__(self, pcap_location: str, radius_port=1812, poll_interval=POLL_INTERVAL):
+        self.pcap_location = pcap_location
+        self.ports = (int(radius_port), int(radius_port) + 1)
+        self.poll_interval = poll_interval
+        self.events: List[RadiusEvent] = []
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.offset = 0
+        self.record_header = None
+        self.divisor = 1e6
+        self.linktype = None
+
+    def __read_header(self, file) -> bool:
+        """Read the global header once the capture engine has written it"""
+        header = file.read(PCAP_HEADER.size)
+        if len(header) < PCAP_HEADER.size:
+            return False
+        for byte_order in ("<", ">"):
+            magic = struct.unpack(f"{byte_order}I", header[:4])[0]
+            if magic in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError(f"{self.pcap_location} is not a pcap file")
+        self.linktype = struct.unpack(f"{byte_order}IHHiIII", header)[6] & 0xFFFF
+        self.divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+        self.record_header = struct.Struct(f"{byte_order}IIII")
+        self.offset = PCAP_HEADER.size
+        return True
+
+    def __read_records(self) -> bool:
+        """Process records appended since the last call, return whether any were new"""
+        try:
+            file = open(self.pcap_location, "rb")
+        except FileNotFoundError:
+            return False
+        new = False
+        with file:
+            if self.record_header is None and not self.__read_header(file):
+                return False
+            file.seek(self.offset)
+            while True:
+                record = file.read(self.record_header.size)
+                if len(record) < self.record_header.size:
+                    break
+                sec, fraction, caplen, _ = self.record_header.unpack(record)
+                frame = file.read(caplen)
+                if len(frame) < caplen:
+                    # Record is still being written, read it again next time
+                    break
+                self.offset += self.record_header.size + caplen
+                self.__process(sec + fraction / self.divisor, frame)
+                new = True
+        return new
+
+    def __process(self, timestamp: float, frame: bytes):
+        """Track requests and match responses to them by NAS endpoint and identifier"""
+        udp = get_udp_payload(self.linktype, frame)
+        if udp is None:
+            return
+        src, sport, dst, dport, payload = udp
+        try:
+            packet = radius.RadiusPacket.decode(payload)
+        except radius.RadiusError:
+            return
+        if dport in self.ports and packet.code in (radius.ACCESS_REQUEST, radius.ACCOUNTING_REQUEST):
+            username = packet.get_first(radius.USER_NAME)
+            event = RadiusEvent(
+                timestamp=timestamp,
+                code=packet.code,
+                identifier=packet.identifier,
+                nas=(src, sport),
+                username=username.decode("utf-8", "replace") if username is not None else None,
+                status_type=packet.get_int(radius.ACCT_STATUS_TYPE),
+                input_octets=get_total_octets(packet, radius.ACCT_INPUT_OCTETS, radius.ACCT_INPUT_GIGAWORDS),
+                output_octets=get_total_octets(packet, radius.ACCT_OUTPUT_OCTETS, radius.ACCT_OUTPUT_GIGAWORDS),
+            )
+            key = (event.nas, dport, packet.identifier)
+            if key in self.pending and not self.pending[key].answered:
+                # Retransmission, the first copy is answered
+                return
+            self.pending[key] = event
+            with self.condition:
+                self.events.append(event)
+        elif sport in self.ports:
+            event = self.pending.get(((dst, dport), sport, packet.identifier))
+            if event is None or event.answered:
+                return
+            with self.condition:
+                event.response_code = packet.code
+                event.response_timestamp = timestamp
+
+    def __run(self):
+        while not self.stop_event.is_set():
+            if self.__read_records():
+                with self.condition:
+                    self.condition.notify_all()
+            self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        """Start following the capture, call after the capture engine started"""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop following the capture after reading what was written so far"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.__read_records()
+
+    def wait_for(self, predicate: Callable[[RadiusEvent], bool], timeout: float) -> Union[RadiusEvent, None]:
+        """Block until an event matches, return it or None after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for event in self.events:
+                    if predicate(event):
+                        return event
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.thread is None:
+                    return None
+                self.condition.wait(remaining)
+
+    def wait_for_accounting(
+        self, username: str, status: str, after: float = 0, timeout: float = 30
+    ) -> Union[RadiusEvent, None]:
+        """Wait for an answered Accounting-Request of a status (start, interim, stop) sent after a time"""
+        status_type = STATUS_TYPES[status]
+        event = self.wait_for(
+            lambda event: event.code == radius.ACCOUNTING_REQUEST
+            and event.status_type == status_type
+            and event.username == username
+            and event.timestamp >= after
+            and event.answered,
+            timeout,
+        )
+        if event is None:
+            logging.warning("No answered Accounting %s for %s within %s seconds", status, username, timeout)
+        else:
+            logging.info("Accounting %s for %s answered after %.3f s", status, username,
+                         event.response_timestamp - event.timestamp)
+        return event
@@ -0,0 +1,57 @@
+"""Payload sources for data transfers, memory use is bounded for any chunk size."""
+
+import os
+from typing import Iterator
+
+PAYLOAD_MODES = ["random", "prng", "zeros"]
+BUFFER_SIZE = 1024 * 1024
+# Bytes the start of the prng slice moves per send, prime so offsets rarely align with block sizes
+PRNG_STRIDE = 4099
+
+
+class PayloadSource:
+    """Reusable fixed-size buffer that is sent repeatedly to make up logical chunks.
+
+    Modes:
+        random: incompressible buffer generated once and reused for every chunk.
+        prng: slice of a random buffer twice the size, moved and stamped with a send
+            counter before every send, so no two sends are equal. Costs next to nothing,
+            generating fresh random bytes per send would limit throughput on a Pi.
+        zeros: buffer of zeros, highly compressible.
+    """
+
+    def __init__(self, mode="random", buffer_size=BUFFER_SIZE):
+        if mode not in PAYLOAD_MODES:
+            raise ValueError(f"Unknown payload mode: {mode}")
+        if buffer_size <= 0:
+            raise ValueError("Buffer size must be positive")
+        self.mode = mode
+        self.buffer_size = buffer_size
+        if mode == "random":
+            self.buffer = bytearray(os.urandom(buffer_size))
+        elif mode == "prng":
+            self.buffer = bytearray(os.urandom(2 * buffer_size))
+        else:
+            self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.offset = 0
+        self.sends = 0
+
+    def __slice(self, size) -> memoryview:
+        """Return size bytes to send, a different slice for every send in prng mode."""
+        if self.mode != "prng":
+            return self.view[:size]
+        self.offset = (self.offset + PRNG_STRIDE) % self.buffer_size
+        self.sends += 1
+        view = self.view[self.offset:self.offset + size]
+        stamp = min(8, size)
+        view[:stamp] = self.sends.to_bytes(8, "little")[:stamp]
+        return view
+
+    def chunk(self, chunk_size) -> Iterator[memoryview]:
+        """Yield buffer slices that add up to chunk_size bytes."""
+        remaining = chunk_size
+        while remaining > 0:
+            size = min(remaining, self.buffer_size)
+            yield self.__slice(size)
+            remaining -= size
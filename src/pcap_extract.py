@@ -4,6 +4,7 @@ from typing import List, Union
 from scapy.all import rdpcap, Radius
 from scapy.layers.inet import UDP
 from scapy.packet import bind_layers
+import src.tracing as tracing
 
 def bind_layers_all(radius_port: int):
     """Bind possibly non-standard port to RADIUS."""
@@ -16,12 +17,13 @@ def get_radius_packets(pcap_file: str, radius_port=1812) -> List[Radius]:
     """Find RADIUS packets in a PCAP file and return just the RADIUS layers."""
     bind_layers_all(radius_port)
     radius_packets = []
-    # Iterate through the packets to find RADIUS packets with the specified username
-    packets = rdpcap(pcap_file)
-    for packet in packets:
-        # Look for RADIUS packets.
-        if packet.haslayer(Radius):
-            radius_packets.append(packet[Radius])
+    with tracing.span("parse pcap", pcap_file=pcap_file):
+        # Iterate through the packets to find RADIUS packets with the specified username
+        packets = rdpcap(pcap_file)
+        for packet in packets:
+            # Look for RADIUS packets.
+            if packet.haslayer(Radius):
+                radius_packets.append(packet[Radius])
     return radius_packets
 
 
@@ -190,3 +192,75 @@ def get_acct_session_time(packet: Radius) -> list:
 def calculate_total_octets(octets: int, gigawords: int) -> int:
     """Calculate total Acct-*-Octets and Acct-*-Gigawords."""
     return octets + (gigawords * 2**32)
+
+
+# Request code to the codes that answer it
+RESPONSE_CODES = {1: (2, 3, 11), 4: (5,), 12: (2, 3, 5)}
+
+
+def __get_endpoints(packet: Radius) -> tuple:
+    """Return (source IP, source port, destination IP, destination port) of a RADIUS packet."""
+    udp = packet.underlayer
+    if udp is None or udp.underlayer is None:
+        return None, None, None, None
+    ip = udp.underlayer
+    return ip.src, udp.sport, ip.dst, udp.dport
+
+
+def get_missing_identifiers(requests: List[Radius]) -> List[int]:
+    """Find request identifiers skipped by a client.
+
+    Identifiers are assumed to increase by one per request on each client socket.
+    Some clients share one counter across their sockets, so an identifier only
+    counts as missing if no other socket of the same client used it."""
+    streams = {}
+    seen_per_client = {}
+    for packet in requests:
+        src, sport, _, _ = __get_endpoints(packet)
+        ids = streams.setdefault((src, sport), [])
+        # Retransmissions reuse the identifier
+        if not ids or ids[-1] != packet.id:
+            ids.append(packet.id)
+        seen_per_client.setdefault(src, set()).add(packet.id)
+    missing = set()
+    for (src, _), ids in streams.items():
+        for previous, current in zip(ids, ids[1:]):
+            gap = (current - previous) % 256
+            for step in range(1, gap):
+                identifier = (previous + step) % 256
+                if identifier not in seen_per_client[src]:
+                    missing.add(identifier)
+    return sorted(missing)
+
+
+def get_capture_completeness(packets: List[Radius]) -> dict:
+    """Check that every request in a capture was answered and no identifiers were skipped."""
+    requests = get_packets_by_codes(packets, *RESPONSE_CODES.keys())
+    responses = [packet for packet in packets if packet.code not in RESPONSE_CODES]
+    pending = {}
+    retransmissions = 0
+    for packet in requests:
+        src, sport, dst, dport = __get_endpoints(packet)
+        key = (src, sport, dst, dport, packet.id)
+        if key in pending and pending[key].authenticator == packet.authenticator:
+            retransmissions += 1
+        pending[key] = packet
+    unmatched_responses = 0
+    for packet in responses:
+        src, sport, dst, dport = __get_endpoints(packet)
+        request = pending.get((dst, dport, src, sport, packet.id))
+        if request is not None and packet.code in RESPONSE_CODES[request.code]:
+            del pending[(dst, dport, src, sport, packet.id)]
+        else:
+            unmatched_responses += 1
+    unanswered = [f"code {packet.code} id {packet.id}" for packet in pending.values()]
+    missing_identifiers = get_missing_identifiers(requests)
+    return {
+        "requests": len(requests),
+        "responses": len(responses),
+        "retransmissions": retransmissions,
+        "unanswered_requests": unanswered,
+        "unmatched_responses": unmatched_responses,
+        "missing_identifiers": missing_identifiers,
+        "complete": not (unanswered or unmatched_responses or missing_identifiers),
+    }
@@ -0,0 +1,105 @@
+"""Read and write classic libpcap files without going through Scapy packet objects."""
+
+import socket
+import struct
+from typing import Iterator, Tuple, Union
+
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+SNAPLEN = 262144
+
+PCAP_HEADER = struct.Struct("=IHHiIII")
+RECORD_HEADER = struct.Struct("=IIII")
+
+
+class PcapWriter:
+    """Append raw link-layer frames to a pcap file with microsecond timestamps"""
+
+    def __init__(self, filename: str, linktype=LINKTYPE_ETHERNET, snaplen=SNAPLEN):
+        self.filename = filename
+        self.count = 0
+        self.file = open(filename, "wb")
+        self.file.write(PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, snaplen, linktype))
+
+    def write(self, frame: bytes, sec: int, usec: int, wirelen=None):
+        """Write one frame, wirelen is the original length if the frame was truncated"""
+        wirelen = len(frame) if wirelen is None else wirelen
+        self.file.write(RECORD_HEADER.pack(sec, usec, len(frame), wirelen))
+        self.file.write(frame)
+        self.count += 1
+
+    def flush(self):
+        """Flush buffered records to disk"""
+        self.file.flush()
+
+    def close(self):
+        """Close pcap file"""
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_pcap(filename: str) -> Iterator[Tuple[float, int, bytes]]:
+    """Yield (timestamp, linktype, frame) for every record of a classic pcap file"""
+    with open(filename, "rb") as file:
+        header = file.read(PCAP_HEADER.size)
+        if len(header) < PCAP_HEADER.size:
+            raise ValueError(f"{filename} is not a pcap file")
+        for byte_order in ("<", ">"):
+            magic = struct.unpack(f"{byte_order}I", header[:4])[0]
+            if magic in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError(f"{filename} is not a pcap file (pcapng is not supported)")
+        linktype = struct.unpack(f"{byte_order}IHHiIII", header)[6] & 0xFFFF
+        divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+        record_header = struct.Struct(f"{byte_order}IIII")
+        while True:
+            record = file.read(record_header.size)
+            if len(record) < record_header.size:
+                return
+            sec, fraction, caplen, _ = record_header.unpack(record)
+            yield sec + fraction / divisor, linktype, file.read(caplen)
+
+
+def get_udp_payload(linktype: int, frame: bytes) -> Union[Tuple[str, int, str, int, bytes], None]:
+    """Return (source IP, source port, destination IP, destination port, payload) of a UDP frame"""
+    if len(frame) < 16:
+        return None
+    if linktype == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, struct.unpack_from("!H", frame, 12)[0]
+    elif linktype == LINKTYPE_LINUX_SLL:
+        offset, ethertype = 16, struct.unpack_from("!H", frame, 14)[0]
+    else:
+        return None
+    # 802.1Q tags
+    while ethertype == 0x8100 and len(frame) >= offset + 4:
+        ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+        offset += 4
+    if ethertype == 0x0800 and len(frame) >= offset + 20:
+        header_length = (frame[offset] & 0x0F) * 4
+        fragment = struct.unpack_from("!H", frame, offset + 6)[0] & 0x1FFF
+        if frame[offset + 9] != socket.IPPROTO_UDP or fragment:
+            return None
+        src = socket.inet_ntop(socket.AF_INET, frame[offset + 12:offset + 16])
+        dst = socket.inet_ntop(socket.AF_INET, frame[offset + 16:offset + 20])
+        offset += header_length
+    elif ethertype == 0x86DD and len(frame) >= offset + 40:
+        if frame[offset + 6] != socket.IPPROTO_UDP:
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, frame[offset + 8:offset + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, frame[offset + 24:offset + 40])
+        offset += 40
+    else:
+        return None
+    if len(frame) < offset + 8:
+        return None
+    sport, dport, length, _ = struct.unpack_from("!HHHH", frame, offset)
+    return src, sport, dst, dport, frame[offset + 8:offset + length]
@@ -0,0 +1,334 @@
+"""Generate large synthetic RADIUS pcaps with a JSON ground truth for scale testing pcap_extract.
+
+Run with: python -m src.pcapgen synthetic.pcap --size 100M
+"""
+
+import argparse
+import json
+import random
+import socket
+import struct
+from dataclasses import dataclass, asdict
+from typing import Union
+import src.radius as radius
+from src.inputs import RADIUS_PORT
+from src.pcap_file import PcapWriter, RECORD_HEADER
+from src.radius_server import SECRET, CLASSES, CUI, ACCT_INTERIM_INTERVAL
+
+SERVER_IP = "10.0.0.1"
+NAS_PORT_BASE = 40000
+ETHER_HEADER = struct.Struct("!6s6sH")
+IP_HEADER = struct.Struct("!BBHHHBBH4s4s")
+UDP_HEADER = struct.Struct("!HHHH")
+SIZE_SUFFIXES = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+# Ports Scapy decodes as RADIUS in either direction: authentication, accounting and dynamic authorization
+SCAPY_RADIUS_PORTS = (1812, 1813, 3799)
+
+
+@dataclass
+class PcapGenConfig:
+    """Synthetic capture settings. Generation stops at size bytes or after sessions sessions."""
+
+    size: Union[int, None] = None
+    sessions: Union[int, None] = 1000
+    users: int = 100
+    nas: int = 4
+    concurrency: int = 1000
+    min_interims: int = 1
+    max_interims: int = 10
+    interim_interval: int = ACCT_INTERIM_INTERVAL
+    max_octets_per_interval: int = 2**31
+    noise_ratio: float = 0.2
+    retransmission_ratio: float = 0.01
+    out_of_order_ratio: float = 0.01
+    radius_port: int = RADIUS_PORT
+    secret: str = SECRET
+    seed: int = 0
+    start_time: float = 1_700_000_000.0
+
+
+def parse_size(size: str) -> int:
+    """Parse a size such as 1048576, 500K, 10M or 20G"""
+    size = size.strip().upper().removesuffix("B")
+    if size and size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def ip_checksum(header: bytes) -> int:
+    """Internet checksum of an IPv4 header"""
+    total = sum(struct.unpack(f"!{len(header) // 2}H", header))
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def udp_frame(src_ip: bytes, dst_ip: bytes, sport: int, dport: int, payload: bytes, ident=0) -> bytes:
+    """Ethernet/IPv4/UDP frame, the UDP checksum is left at zero (allowed for IPv4)"""
+    total_length = IP_HEADER.size + UDP_HEADER.size + len(payload)
+    header = IP_HEADER.pack(0x45, 0, total_length, ident & 0xFFFF, 0, 64, socket.IPPROTO_UDP, 0, src_ip, dst_ip)
+    header = header[:10] + struct.pack("!H", ip_checksum(header)) + header[12:]
+    ether = ETHER_HEADER.pack(b"\x02\x00\x00\x00\x00\x01", b"\x02\x00" + src_ip, 0x0800)
+    return ether + header + UDP_HEADER.pack(sport, dport, UDP_HEADER.size + len(payload), 0) + payload
+
+
+class GroundTruth:
+    """Expected counts and totals for everything written to the capture"""
+
+    def __init__(self):
+        self.frames = 0
+        self.radius_packets = 0
+        self.noise_packets = 0
+        self.retransmissions = 0
+        self.out_of_order = 0
+        self.codes = {}
+        self.status_types = {"start": 0, "interim": 0, "stop": 0}
+        self.users = {}
+
+    def user(self, username: str) -> dict:
+        if username not in self.users:
+            self.users[username] = {
+                "packets": 0, "sessions": 0, "start": 0, "interim": 0, "stop": 0,
+                "input_octets": 0, "output_octets": 0,
+            }
+        return self.users[username]
+
+    def to_dict(self) -> dict:
+        return {
+            "frames": self.frames,
+            "radius_packets": self.radius_packets,
+            "noise_packets": self.noise_packets,
+            "retransmissions": self.retransmissions,
+            "out_of_order": self.out_of_order,
+            "codes": {str(code): count for code, count in sorted(self.codes.items())},
+            "status_types": self.status_types,
+            "users": self.users,
+        }
+
+
+class SyntheticCapture:
+    """Writes interleaved sessions of many users from several NAS to a pcap"""
+
+    def __init__(self, writer: PcapWriter, config: PcapGenConfig):
+        self.writer = writer
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.secret = config.secret.encode("utf-8")
+        self.server_ip = socket.inet_aton(SERVER_IP)
+        self.nas_ips = [socket.inet_aton(f"10.0.{1 + n // 250}.{2 + n % 250}") for n in range(config.nas)]
+        self.identifiers = [0] * config.nas
+        self.clock = config.start_time
+        self.last_written = 0
+        self.bytes_written = 0
+        self.truth = GroundTruth()
+
+    def __write(self, frame: bytes, timestamp: float):
+        if self.rng.random() < self.config.out_of_order_ratio:
+            # Captured late, e.g. by another CPU's ring
+            timestamp -= self.rng.uniform(0.001, 0.05)
+        if timestamp < self.last_written:
+            self.truth.out_of_order += 1
+        self.last_written = timestamp
+        sec = int(timestamp)
+        self.writer.write(frame, sec, int((timestamp - sec) * 1_000_000))
+        self.bytes_written += RECORD_HEADER.size + len(frame)
+        self.truth.frames += 1
+
+    def __tick(self, seconds=0.0005) -> float:
+        self.clock += seconds
+        return self.clock
+
+    def __noise_port(self) -> int:
+        """Random high port that is never decoded as RADIUS"""
+        radius_ports = SCAPY_RADIUS_PORTS + (self.config.radius_port, self.config.radius_port + 1)
+        while True:
+            port = self.rng.randint(1024, 65535)
+            if port not in radius_ports:
+                return port
+
+    def __noise(self):
+        """Non-RADIUS traffic: DNS and random high ports"""
+        while self.rng.random() < self.config.noise_ratio:
+            dport = self.rng.choice([53, 123, 5353, self.__noise_port()])
+            payload = self.rng.randbytes(self.rng.randint(20, 200))
+            frame = udp_frame(self.nas_ips[0], self.server_ip, self.__noise_port(), dport, payload)
+            self.__write(frame, self.__tick())
+            self.truth.noise_packets += 1
+
+    def __exchange(self, nas: int, request: radius.RadiusPacket, username: str):
+        """Write a request, maybe a retransmission of it, and the response"""
+        port = self.config.radius_port
+        request.identifier = self.identifiers[nas]
+        self.identifiers[nas] = (self.identifiers[nas] + 1) % 256
+        if request.code == radius.ACCOUNTING_REQUEST:
+            port += 1
+            data = radius.encode_accounting_request(request, self.secret)
+            response = radius.RadiusPacket(radius.ACCOUNTING_RESPONSE, request.identifier)
+        else:
+            data = radius.encode_access_request(request, self.secret)
+            response = radius.RadiusPacket(radius.ACCESS_ACCEPT, request.identifier)
+            for value in CLASSES:
+                response.add(radius.CLASS, value)
+            response.add(radius.CHARGEABLE_USER_IDENTITY, CUI)
+            response.add(radius.ACCT_INTERIM_INTERVAL, self.config.interim_interval)
+        sport = NAS_PORT_BASE + (port - self.config.radius_port)
+        frame = udp_frame(self.nas_ips[nas], self.server_ip, sport, port, data, request.identifier)
+        copies = 2 if self.rng.random() < self.config.retransmission_ratio else 1
+        for copy in range(copies):
+            self.__write(frame, self.__tick(3 if copy else 0.0005))
+        response_data = radius.encode_response(response, request.authenticator, self.secret)
+        self.__write(udp_frame(self.server_ip, self.nas_ips[nas], port, sport, response_data), self.__tick())
+
+        self.truth.radius_packets += copies + 1
+        self.truth.retransmissions += copies - 1
+        self.truth.codes[request.code] = self.truth.codes.get(request.code, 0) + copies
+        self.truth.codes[response.code] = self.truth.codes.get(response.code, 0) + 1
+        self.truth.user(username)["packets"] += copies
+        self.__noise()
+
+    def __accounting_request(self, session: dict, status_type: int) -> radius.RadiusPacket:
+        packet = radius.RadiusPacket(radius.ACCOUNTING_REQUEST, 0)
+        packet.add(radius.USER_NAME, session["username"])
+        packet.add(radius.ACCT_STATUS_TYPE, status_type)
+        packet.add(radius.ACCT_SESSION_ID, session["session_id"])
+        packet.add(radius.CALLING_STATION_ID, session["calling_station_id"])
+        for value in CLASSES:
+            packet.add(radius.CLASS, value)
+        packet.add(radius.CHARGEABLE_USER_IDENTITY, CUI)
+        if status_type != radius.ACCT_STATUS_START:
+            for direction, octets_type, gigawords_type in [
+                ("input", radius.ACCT_INPUT_OCTETS, radius.ACCT_INPUT_GIGAWORDS),
+                ("output", radius.ACCT_OUTPUT_OCTETS, radius.ACCT_OUTPUT_GIGAWORDS),
+            ]:
+                total = session[direction]
+                packet.add(octets_type, total % 2**32)
+                packet.add(gigawords_type, total // 2**32)
+            packet.add(radius.ACCT_SESSION_TIME, int(self.clock - session["begin"]))
+        return packet
+
+    def __run_batch(self, first: int, count: int):
+        """Authenticate and account count sessions side by side"""
+        sessions = []
+        for index in range(first, first + count):
+            mac = (0x020000000000 + index).to_bytes(6, "big")
+            session = {
+                "username": f"user{index % self.config.users:06d}@example.com",
+                "session_id": f"{index:016X}",
+                "calling_station_id": "-".join(f"{octet:02X}" for octet in mac),
+                "nas": index % self.config.nas,
+                "interims": self.rng.randint(self.config.min_interims, self.config.max_interims),
+                "input": 0,
+                "output": 0,
+            }
+            request = radius.RadiusPacket(radius.ACCESS_REQUEST, 0)
+            request.add(radius.USER_NAME, session["username"])
+            request.add(radius.CALLING_STATION_ID, session["calling_station_id"])
+            self.__exchange(session["nas"], request, session["username"])
+            session["begin"] = self.clock
+            self.__exchange(session["nas"], self.__accounting_request(session, radius.ACCT_STATUS_START),
+                            session["username"])
+            sessions.append(session)
+            truth = self.truth.user(session["username"])
+            truth["sessions"] += 1
+            truth["start"] += 1
+            self.truth.status_types["start"] += 1
+
+        for interim in range(max(session["interims"] for session in sessions) + 1):
+            self.clock += self.config.interim_interval
+            for session in sessions:
+                if interim > session["interims"]:
+                    continue
+                session["input"] += self.rng.randint(0, self.config.max_octets_per_interval)
+                session["output"] += self.rng.randint(0, self.config.max_octets_per_interval)
+                truth = self.truth.user(session["username"])
+                # The last round ends the session
+                if interim == session["interims"]:
+                    status_type, name = radius.ACCT_STATUS_STOP, "stop"
+                    truth["input_octets"] += session["input"]
+                    truth["output_octets"] += session["output"]
+                else:
+                    status_type, name = radius.ACCT_STATUS_INTERIM, "interim"
+                self.__exchange(session["nas"], self.__accounting_request(session, status_type),
+                                session["username"])
+                truth[name] += 1
+                self.truth.status_types[name] += 1
+
+    def __done(self, sessions_written: int) -> bool:
+        if self.config.size is not None and self.bytes_written >= self.config.size:
+            return True
+        return self.config.sessions is not None and sessions_written >= self.config.sessions
+
+    def run(self) -> GroundTruth:
+        """Write batches of sessions until the size or session limit is reached"""
+        if self.config.size is None and self.config.sessions is None:
+            raise ValueError("Either size or sessions is needed to limit the capture")
+        written = 0
+        while not self.__done(written):
+            count = self.config.concurrency
+            if self.config.sessions is not None:
+                count = min(count, self.config.sessions - written)
+            self.__run_batch(written, count)
+            written += count
+        return self.truth
+
+
+def generate(pcap_file: str, ground_truth_file: Union[str, None], config: PcapGenConfig) -> dict:
+    """Write a synthetic capture and its ground truth, return the ground truth"""
+    with PcapWriter(pcap_file) as writer:
+        truth = SyntheticCapture(writer, config).run().to_dict()
+    truth["config"] = asdict(config)
+    if ground_truth_file is not None:
+        with open(ground_truth_file, "w", encoding="utf-8") as f:
+            json.dump(truth, f, indent=1)
+    return truth
+
+
+def get_ground_truth_filename(pcap_file: str) -> str:
+    """Ground truth is stored next to the capture"""
+    return f"{pcap_file.removesuffix('.pcap')}.truth.json"
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    defaults = PcapGenConfig()
+    parser = argparse.ArgumentParser(description="Generate a synthetic RADIUS pcap and its ground truth")
+    parser.add_argument("pcap_file", type=str, help="Capture to write")
+    parser.add_argument("--ground_truth", type=str, default=None,
+                        help="Ground truth JSON, default: <pcap_file>.truth.json")
+    parser.add_argument("--size", type=parse_size, default=None,
+                        help="Stop once the capture reaches this size, e.g. 1M or 20G")
+    parser.add_argument("--sessions", type=int, default=None,
+                        help=f"Stop after this many sessions, default without --size: {defaults.sessions}")
+    parser.add_argument("--users", type=int, default=defaults.users, help=f"default: {defaults.users}")
+    parser.add_argument("--nas", type=int, default=defaults.nas, help=f"default: {defaults.nas}")
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency,
+                        help=f"Sessions interleaved with each other, default: {defaults.concurrency}")
+    parser.add_argument("--max_interims", type=int, default=defaults.max_interims,
+                        help=f"default: {defaults.max_interims}")
+    parser.add_argument("--noise_ratio", type=float, default=defaults.noise_ratio,
+                        help=f"Non-RADIUS packets per RADIUS exchange, default: {defaults.noise_ratio}")
+    parser.add_argument("--retransmission_ratio", type=float, default=defaults.retransmission_ratio,
+                        help=f"default: {defaults.retransmission_ratio}")
+    parser.add_argument("--out_of_order_ratio", type=float, default=defaults.out_of_order_ratio,
+                        help=f"default: {defaults.out_of_order_ratio}")
+    parser.add_argument("--radius_port", type=int, default=defaults.radius_port,
+                        help=f"default: {defaults.radius_port}")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help=f"default: {defaults.seed}")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Main function to run the generator."""
+    cliargs = vars(parse_cliargs(args))
+    pcap_file = cliargs.pop("pcap_file")
+    ground_truth_file = cliargs.pop("ground_truth") or get_ground_truth_filename(pcap_file)
+    if cliargs["sessions"] is None and cliargs["size"] is None:
+        cliargs["sessions"] = PcapGenConfig.sessions
+    config = PcapGenConfig(**cliargs)
+    truth = generate(pcap_file, ground_truth_file, config)
+    print(f"Wrote {truth['frames']} frames ({truth['radius_packets']} RADIUS) to {pcap_file}, "
+          f"ground truth in {ground_truth_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 
 from string import Template
 from uuid import uuid4
+import re
 import subprocess
 import time
 import signal
@@ -9,18 +10,32 @@ import os
 import threading
 import logging
 from src.inputs import SSID as DEFAULT_SSID
+from src.wpa_ctrl import WpaCtrlClient, CTRL_DIR, EVENT_CONNECTED
+from src.capture import parse_tcpdump_stats
 
 
 class Command:
     """Base class for running commands in background and writing to log file"""
 
-    def __init__(self, name: str, command: list, log_file, wait_time=None, env=None):
+    def __init__(
+        self,
+        name: str,
+        command: list,
+        log_file,
+        wait_time=None,
+        env=None,
+        ready_pattern=None,
+        ready_timeout=30,
+    ):
         self.command = command
         self.name = name
         self.log_file = log_file
         self.wait_time = wait_time
+        self.ready_pattern = ready_pattern
+        self.ready_timeout = ready_timeout
         self.process = None
         self.thread = None
+        self.log_offset = 0
         if env is not None:
             base_env = os.environ.copy()
             self.env = {**base_env, **env}
@@ -42,14 +57,46 @@ class Command:
                 self.process = subprocess.Popen(self.command, stdout=log, stderr=log)
             self.process.wait()
 
+    def wait_until_ready(self, log_offset=0):
+        """Block until ready_pattern shows up in the log file written after log_offset"""
+        pattern = re.compile(self.ready_pattern)
+        begin = time.perf_counter()
+        output = ""
+        while True:
+            # Check liveness before reading so output written right before exiting is seen
+            alive = self.thread.is_alive()
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "r", encoding="utf-8", errors="replace") as log:
+                    log.seek(log_offset)
+                    output = log.read()
+            if pattern.search(output):
+                elapsed = time.perf_counter() - begin
+                logging.info("%s ready after %.2f seconds", self.name, elapsed)
+                return elapsed
+            if not alive:
+                return_code = self.process.returncode if self.process else None
+                raise RuntimeError(
+                    f"{self.name} ended with return code {return_code} before it was ready, see {self.log_file}"
+                )
+            if time.perf_counter() - begin > self.ready_timeout:
+                self.stop()
+                raise RuntimeError(
+                    f'{self.name} not ready within {self.ready_timeout} seconds: "{self.ready_pattern}" not found in {self.log_file}'
+                )
+            time.sleep(0.05)
+
     def start(self):
         """Run command in background, return process object"""
         logging.info("Starting %s", self.name)
+        self.log_offset = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
         self.thread = threading.Thread(target=self.run_subprocess)
         self.thread.start()
 
+        # Block until the command reports it is ready, if we know what to look for
+        if self.ready_pattern is not None:
+            self.wait_until_ready(self.log_offset)
         # We will know if there was a problem if the process ends after <wait_time> seconds
-        if self.wait_time is not None:
+        elif self.wait_time is not None:
             time.sleep(self.wait_time)
             assert self.process is not None
             if not self.thread.is_alive():
@@ -80,22 +127,74 @@ class WpaSupplicant(Command):
         ssid=DEFAULT_SSID,
         wait_time=5,
         config_location="/tmp/wpa_supplicant.conf",
+        ready_timeout=60,
+        ctrl_dir=CTRL_DIR,
     ):
         self.interface = interface
         self.log_location = log_location
         self.ssid = ssid
         self.config_location = config_location
         self.wait_time = wait_time
+        self.ctrl_dir = ctrl_dir
+        self.ctrl = None
         self.username = None
         self.write_wpa_supplicant_conf()
+        # stdbuf makes wpa_supplicant line buffer stdout so events reach the log right away
         cmd = [
+            "stdbuf",
+            "-oL",
             "wpa_supplicant",
             "-c",
             self.config_location,
             "-i",
             self.interface,
         ]
-        super().__init__("wpa_supplicant", cmd, self.log_location, self.wait_time)
+        super().__init__(
+            "wpa_supplicant",
+            cmd,
+            self.log_location,
+            self.wait_time,
+            ready_timeout=ready_timeout,
+        )
+
+    def start(self):
+        """Start wpa_supplicant, enable the network once attached and wait until connected"""
+        logging.info("Starting %s", self.name)
+        self.thread = threading.Thread(target=self.run_subprocess)
+        self.thread.start()
+        # The network starts disabled so no authentication event is missed before attaching
+        self.ctrl = WpaCtrlClient(self.interface, self.ctrl_dir)
+        try:
+            self.ctrl.connect(timeout=self.ready_timeout, is_alive=self.thread.is_alive)
+            self.ctrl.attach()
+            begin = time.perf_counter()
+            self.ctrl.request("ENABLE_NETWORK all")
+            if self.ctrl.wait_for_event(EVENT_CONNECTED, timeout=self.ready_timeout) is None:
+                raise RuntimeError(
+                    f"{self.name} not connected to {self.ssid} within {self.ready_timeout} seconds, see {self.log_file}"
+                )
+        except RuntimeError:
+            self.stop()
+            raise
+        logging.info("%s connected after %.2f seconds", self.name, time.perf_counter() - begin)
+
+    def stop(self):
+        """Stop wpa_supplicant and detach from its control socket after it exits"""
+        thread = self.thread
+        # The disconnect wpa_supplicant reports while exiting is not one of the session
+        if self.ctrl is not None:
+            self.ctrl.mark_teardown()
+        super().stop()
+        if thread is not None:
+            thread.join(timeout=5)
+        if self.ctrl is not None:
+            self.ctrl.close()
+
+    def get_auth_summary(self):
+        """Return authentication event timing, None if no events were recorded"""
+        if self.ctrl is None:
+            return None
+        return self.ctrl.get_summary()
 
     def get_username(self) -> str:
         if self.username is None:
@@ -116,6 +215,7 @@ class WpaSupplicant(Command):
         # Create example config file template
         template = Template(
             """
+                ctrl_interface=$ctrl_dir
                 network={
                     ssid="$ssid"
                     proto=RSN
@@ -125,6 +225,7 @@ class WpaSupplicant(Command):
                     anonymous_identity="$anonymous_identity"
                     password="$password"
                     phase2="eapauth=MSCHAPV2"
+                    disabled=1
                 }
             """
         )
@@ -135,6 +236,7 @@ class WpaSupplicant(Command):
             identity=identity,
             password=password,
             ssid=ssid,
+            ctrl_dir=self.ctrl_dir,
         ).replace(" ", "")
 
     def write_wpa_supplicant_conf(self):
@@ -159,6 +261,7 @@ class FreeRADIUS(Command):
         wait_time=5,
         debug=False,
         port:int =1812,
+        ready_timeout=30,
     ):
         env = {}
         env['AUTH_PORT'] = str(port)
@@ -169,9 +272,18 @@ class FreeRADIUS(Command):
             cmd = ["freeradius", "-f", "-l", "stdout", "-xx"]
         else:
             cmd = ["freeradius", "-f", "-l", "stdout"]
-        subprocess.Popen(["systemctl", "stop", "freeradius.service"])
+        # Wait for the system service to release the RADIUS ports
+        subprocess.run(["systemctl", "stop", "freeradius.service"], check=False)
 
-        super().__init__("FreeRADIUS", cmd, self.log_location, self.wait_time, env=env)
+        super().__init__(
+            "FreeRADIUS",
+            cmd,
+            self.log_location,
+            self.wait_time,
+            env=env,
+            ready_pattern="Ready to process requests",
+            ready_timeout=ready_timeout,
+        )
 
 
 class TCPDump(Command):
@@ -184,6 +296,29 @@ class TCPDump(Command):
         interface="eth0",
         wait_time=2,
         _filter="port 1812 or port 1813",
+        ready_timeout=10,
     ):
-        cmd = ["tcpdump", "-i", interface, "-w", pcap_location, _filter]
-        super().__init__("tcpdump", cmd, log_location, wait_time)
+        # -U writes every packet as it arrives, so the capture can be followed live
+        cmd = ["tcpdump", "-U", "-i", interface, "-w", pcap_location, _filter]
+        super().__init__(
+            "tcpdump",
+            cmd,
+            log_location,
+            wait_time,
+            ready_pattern="listening on",
+            ready_timeout=ready_timeout,
+        )
+        self.stats = None
+
+    def stop(self, timeout=10):
+        """Stop tcpdump and read the packet statistics it prints on exit"""
+        thread = self.thread
+        super().stop()
+        if thread is None:
+            return
+        thread.join(timeout)
+        with open(self.log_file, "r", encoding="utf-8", errors="replace") as log:
+            log.seek(self.log_offset)
+            self.stats = parse_tcpdump_stats(log.read())
+        if self.stats is None:
+            logging.warning("No packet statistics from tcpdump in %s", self.log_file)
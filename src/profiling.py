@@ -0,0 +1,124 @@
+"""Profile phases of a run with cProfile and optionally tracemalloc, written next to the run's logs."""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from zipfile import ZipFile
+import src.files as files
+
+TOP = 30
+SORT_KEY = pstats.SortKey.CUMULATIVE
+# From Python 3.12 cProfile uses sys.monitoring, which allows only one active profiler per process,
+# a profiler enabled in a thread started during a phase would kill that thread
+PROFILE_THREADS = sys.version_info < (3, 12)
+
+
+class Profiler:
+    """Write a .prof file and a top-N summary per phase, does nothing unless enabled.
+
+    Before Python 3.12, threads started during a phase, e.g. the client data
+    transfers, are profiled too and merged into the phase once they finished.
+    Transfers in worker processes (transfer_mode process) are not profiled."""
+
+    def __init__(self, test_name: str, root_dir: str, enabled=True, memory=False, top=TOP):
+        self.test_name = test_name
+        self.root_dir = root_dir
+        self.enabled = enabled or memory
+        self.memory = memory
+        self.top = top
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+
+    def __profile_thread(self, *_):
+        """Installed with threading.setprofile, enables a profiler in every new thread"""
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append((threading.current_thread(), profile))
+        profile.enable()
+
+    def __get_stats(self, profile: cProfile.Profile) -> pstats.Stats:
+        """Stats of the phase's thread plus those of threads it started that have finished"""
+        stats = pstats.Stats(profile)
+        with self.lock:
+            thread_profiles, self.thread_profiles = self.thread_profiles, []
+        running = 0
+        for thread, thread_profile in thread_profiles:
+            if thread.is_alive():
+                running += 1
+                continue
+            thread_profile.create_stats()
+            stats.add(thread_profile)
+        if running:
+            logging.info("Not profiling %d threads still running after the phase", running)
+        return stats
+
+    def __write_summary(self, phase: str, stats: pstats.Stats, elapsed: float, memory: str):
+        summary = io.StringIO()
+        summary.write(f"Phase {phase} of {self.test_name}: {elapsed:.3f} s wall time\n\n")
+        stats.stream = summary
+        stats.sort_stats(SORT_KEY).print_stats(self.top)
+        if memory:
+            summary.write(memory)
+        filename = files.get_profile_summary_filename(self.test_name, self.root_dir, phase)
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(summary.getvalue())
+        logging.info("Wrote profile summary of %s to %s", phase, filename)
+
+    def __memory_summary(self, snapshot: tracemalloc.Snapshot, peak: int) -> str:
+        lines = [f"\nMemory: peak {peak / 2**20:.1f} MiB traced, top {self.top} allocation sites\n"]
+        for statistic in snapshot.statistics("lineno")[:self.top]:
+            lines.append(f"{statistic}\n")
+        return "".join(lines)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Profile the enclosed code as one phase"""
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            tracemalloc.start()
+        profile = cProfile.Profile()
+        if PROFILE_THREADS:
+            threading.setprofile(self.__profile_thread)
+        else:
+            logging.info("Python %d.%d allows one profiler at a time, threads of phase %s are not profiled",
+                         *sys.version_info[:2], name)
+        begin = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - begin
+            if PROFILE_THREADS:
+                threading.setprofile(None)
+            memory = ""
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                memory = self.__memory_summary(snapshot, peak)
+            stats = self.__get_stats(profile)
+            stats.dump_stats(files.get_profile_filename(self.test_name, self.root_dir, phase=name))
+            self.__write_summary(name, stats, elapsed, memory)
+
+
+def add_to_bundle(test_name: str, root_dir: str):
+    """Add profiles written after the bundle was zipped, e.g. the test case phase"""
+    zip_file_name = files.get_zipped_bundle_filename(test_name, root_dir)
+    if not os.path.exists(zip_file_name):
+        return
+    with ZipFile(zip_file_name, "a") as zipf:
+        names = set(zipf.namelist())
+        for profile_file in files.get_profile_files(test_name, root_dir):
+            arcname = profile_file.removeprefix(root_dir)
+            if arcname.lstrip("/") not in names:
+                zipf.write(profile_file, arcname=arcname)
@@ -0,0 +1,222 @@
+"""Minimal RADIUS packet codec (RFC 2865/2866) for the built-in server and tools."""
+
+import hashlib
+import hmac
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import List, Tuple, Union
+
+ACCESS_REQUEST = 1
+ACCESS_ACCEPT = 2
+ACCESS_REJECT = 3
+ACCOUNTING_REQUEST = 4
+ACCOUNTING_RESPONSE = 5
+ACCESS_CHALLENGE = 11
+
+USER_NAME = 1
+USER_PASSWORD = 2
+NAS_IP_ADDRESS = 4
+NAS_PORT = 5
+FRAMED_IP_ADDRESS = 8
+CLASS = 25
+SESSION_TIMEOUT = 27
+CALLED_STATION_ID = 30
+CALLING_STATION_ID = 31
+NAS_IDENTIFIER = 32
+ACCT_STATUS_TYPE = 40
+ACCT_DELAY_TIME = 41
+ACCT_INPUT_OCTETS = 42
+ACCT_OUTPUT_OCTETS = 43
+ACCT_SESSION_ID = 44
+ACCT_SESSION_TIME = 46
+ACCT_INPUT_PACKETS = 47
+ACCT_OUTPUT_PACKETS = 48
+ACCT_TERMINATE_CAUSE = 49
+ACCT_INPUT_GIGAWORDS = 52
+ACCT_OUTPUT_GIGAWORDS = 53
+EVENT_TIMESTAMP = 55
+EAP_MESSAGE = 79
+MESSAGE_AUTHENTICATOR = 80
+ACCT_INTERIM_INTERVAL = 85
+CHARGEABLE_USER_IDENTITY = 89
+
+ACCT_STATUS_START = 1
+ACCT_STATUS_STOP = 2
+ACCT_STATUS_INTERIM = 3
+
+HEADER = struct.Struct("!BBH16s")
+MAX_PACKET_SIZE = 4096
+ZERO_AUTHENTICATOR = bytes(16)
+
+
+class RadiusError(ValueError):
+    """Malformed RADIUS packet"""
+
+
+@dataclass
+class RadiusPacket:
+    """RADIUS packet with attributes as (type, raw value) pairs in wire order."""
+
+    code: int
+    identifier: int
+    authenticator: bytes = ZERO_AUTHENTICATOR
+    attributes: List[Tuple[int, bytes]] = field(default_factory=list)
+
+    def add(self, attr_type: int, value: Union[bytes, str, int]):
+        """Append an attribute, integers are encoded as 32-bit values"""
+        if isinstance(value, int):
+            value = struct.pack("!I", value)
+        elif isinstance(value, str):
+            value = value.encode("utf-8")
+        if len(value) > 253:
+            raise RadiusError(f"Attribute {attr_type} value too long: {len(value)} octets")
+        self.attributes.append((attr_type, value))
+
+    def get(self, attr_type: int) -> List[bytes]:
+        """Return all values of an attribute"""
+        return [value for _type, value in self.attributes if _type == attr_type]
+
+    def get_first(self, attr_type: int) -> Union[bytes, None]:
+        """Return the first value of an attribute, None if absent"""
+        values = self.get(attr_type)
+        return values[0] if values else None
+
+    def get_int(self, attr_type: int) -> Union[int, None]:
+        """Return the first value of an integer attribute, None if absent"""
+        value = self.get_first(attr_type)
+        return struct.unpack("!I", value)[0] if value is not None else None
+
+    def encode_attributes(self) -> bytes:
+        return b"".join(
+            struct.pack("!BB", attr_type, len(value) + 2) + value
+            for attr_type, value in self.attributes
+        )
+
+    def encode(self) -> bytes:
+        """Encode packet with its current authenticator"""
+        attributes = self.encode_attributes()
+        length = HEADER.size + len(attributes)
+        if length > MAX_PACKET_SIZE:
+            raise RadiusError(f"Packet too long: {length} octets")
+        return HEADER.pack(self.code, self.identifier, length, self.authenticator) + attributes
+
+    @classmethod
+    def decode(cls, data: bytes) -> "RadiusPacket":
+        """Decode a packet, raise RadiusError if it is malformed"""
+        if len(data) < HEADER.size:
+            raise RadiusError(f"Packet too short: {len(data)} octets")
+        code, identifier, length, authenticator = HEADER.unpack_from(data)
+        if length < HEADER.size or length > len(data):
+            raise RadiusError(f"Invalid length {length} for {len(data)} octets")
+        attributes = []
+        offset = HEADER.size
+        while offset < length:
+            if offset + 2 > length:
+                raise RadiusError("Truncated attribute header")
+            attr_type, attr_length = data[offset], data[offset + 1]
+            if attr_length < 2 or offset + attr_length > length:
+                raise RadiusError(f"Invalid length {attr_length} for attribute {attr_type}")
+            attributes.append((attr_type, bytes(data[offset + 2:offset + attr_length])))
+            offset += attr_length
+        return cls(code, identifier, authenticator, attributes)
+
+
+def new_authenticator() -> bytes:
+    """Random Request Authenticator"""
+    return os.urandom(16)
+
+
+def __md5_authenticator(data: bytes, authenticator: bytes, secret: bytes) -> bytes:
+    """MD5(Code + Identifier + Length + authenticator + Attributes + Secret)"""
+    return hashlib.md5(data[:4] + authenticator + data[HEADER.size:] + secret).digest()
+
+
+def __set_message_authenticator(packet: RadiusPacket, authenticator: bytes, secret: bytes):
+    """Fill in Message-Authenticator (RFC 3579) computed over the packet with the given authenticator"""
+    packet.attributes = [attr for attr in packet.attributes if attr[0] != MESSAGE_AUTHENTICATOR]
+    packet.attributes.append((MESSAGE_AUTHENTICATOR, bytes(16)))
+    original, packet.authenticator = packet.authenticator, authenticator
+    digest = hmac.new(secret, packet.encode(), hashlib.md5).digest()
+    packet.authenticator = original
+    packet.attributes[-1] = (MESSAGE_AUTHENTICATOR, digest)
+
+
+def verify_message_authenticator(data: bytes, secret: bytes, request_authenticator=None) -> bool:
+    """Check Message-Authenticator of an encoded packet, True if it has none"""
+    packet = RadiusPacket.decode(data)
+    received = packet.get_first(MESSAGE_AUTHENTICATOR)
+    if received is None:
+        return True
+    if request_authenticator is not None:
+        packet.authenticator = request_authenticator
+    packet.attributes = [
+        (attr_type, bytes(16) if attr_type == MESSAGE_AUTHENTICATOR else value)
+        for attr_type, value in packet.attributes
+    ]
+    expected = hmac.new(secret, packet.encode(), hashlib.md5).digest()
+    return hmac.compare_digest(received, expected)
+
+
+def encode_access_request(packet: RadiusPacket, secret: bytes, message_authenticator=True) -> bytes:
+    """Encode an Access-Request, a fresh Request Authenticator is used unless one is set"""
+    if packet.authenticator == ZERO_AUTHENTICATOR:
+        packet.authenticator = new_authenticator()
+    if message_authenticator:
+        __set_message_authenticator(packet, packet.authenticator, secret)
+    return packet.encode()
+
+
+def encode_accounting_request(packet: RadiusPacket, secret: bytes) -> bytes:
+    """Encode an Accounting-Request, its authenticator is computed over the packet (RFC 2866)"""
+    packet.authenticator = ZERO_AUTHENTICATOR
+    data = packet.encode()
+    packet.authenticator = __md5_authenticator(data, ZERO_AUTHENTICATOR, secret)
+    return data[:4] + packet.authenticator + data[HEADER.size:]
+
+
+def verify_accounting_request(data: bytes, secret: bytes) -> bool:
+    """Check the Request Authenticator of an encoded Accounting-Request"""
+    expected = __md5_authenticator(data, ZERO_AUTHENTICATOR, secret)
+    return hmac.compare_digest(data[4:HEADER.size], expected)
+
+
+def encode_response(
+    packet: RadiusPacket, request_authenticator: bytes, secret: bytes, message_authenticator=False
+) -> bytes:
+    """Encode a response with its Response Authenticator"""
+    if message_authenticator:
+        __set_message_authenticator(packet, request_authenticator, secret)
+    packet.authenticator = ZERO_AUTHENTICATOR
+    data = packet.encode()
+    packet.authenticator = __md5_authenticator(data, request_authenticator, secret)
+    return data[:4] + packet.authenticator + data[HEADER.size:]
+
+
+def verify_response(data: bytes, request_authenticator: bytes, secret: bytes) -> bool:
+    """Check the Response Authenticator of an encoded response"""
+    expected = __md5_authenticator(data, request_authenticator, secret)
+    return hmac.compare_digest(data[4:HEADER.size], expected)
+
+
+def encrypt_password(password: bytes, authenticator: bytes, secret: bytes) -> bytes:
+    """Hide User-Password (RFC 2865 section 5.2)"""
+    padded = password.ljust(max(16, -(-len(password) // 16) * 16), b"\x00")
+    result = b""
+    previous = authenticator
+    for i in range(0, len(padded), 16):
+        key = hashlib.md5(secret + previous).digest()
+        previous = bytes(a ^ b for a, b in zip(padded[i:i + 16], key))
+        result += previous
+    return result
+
+
+def decrypt_password(hidden: bytes, authenticator: bytes, secret: bytes) -> bytes:
+    """Recover User-Password (RFC 2865 section 5.2)"""
+    result = b""
+    previous = authenticator
+    for i in range(0, len(hidden), 16):
+        key = hashlib.md5(secret + previous).digest()
+        result += bytes(a ^ b for a, b in zip(hidden[i:i + 16], key))
+        previous = hidden[i:i + 16]
+    return result.rstrip(b"\x00")
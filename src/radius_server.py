@@ -0,0 +1,208 @@
+"""Pure-Python asyncio RADIUS server standing in for FreeRADIUS during development and CI."""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict, Counter
+from typing import Union
+import src.radius as radius
+
+RADIUS_SERVERS = ["freeradius", "builtin"]
+SECRET = "secret"
+# Same reply attributes as the raa virtual server in provisioning/12-configure_freeradius.sh
+CLASSES = ["class1", "class2", "class3", "class4", "class5"]
+CUI = "cui1"
+ACCT_INTERIM_INTERVAL = 10
+DUPLICATE_CACHE_SIZE = 4096
+
+
+class RadiusProtocol(asyncio.DatagramProtocol):
+    """Answer Access-Requests and Accounting-Requests on one UDP socket"""
+
+    def __init__(self, server: "RadiusServer"):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = self.server.handle(data, addr)
+        if response is not None:
+            self.transport.sendto(response, addr)
+
+
+class RadiusServer:
+    """Drop-in replacement for procs.FreeRADIUS, runs an asyncio event loop in a thread.
+
+    Every Access-Request is accepted with the Class, Chargeable-User-Identity and
+    Acct-Interim-Interval attributes our FreeRADIUS configuration returns, unless
+    users are given and the User-Password does not match. EAP is not implemented,
+    EAP requests are rejected. Requests with a bad authenticator are dropped and
+    retransmissions get the cached response (RFC 5080)."""
+
+    def __init__(
+        self,
+        log_location,
+        debug=False,
+        port: int = 1812,
+        secret: str = SECRET,
+        host="0.0.0.0",
+        users: Union[dict, None] = None,
+        ready_timeout=10,
+    ):
+        self.name = "RADIUS server"
+        self.log_file = log_location
+        self.debug = debug
+        self.port = int(port)
+        self.secret = secret.encode("utf-8")
+        self.host = host
+        self.users = users
+        self.ready_timeout = ready_timeout
+        self.counters = Counter()
+        self.responses = OrderedDict()
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+        # Create directory for log file if it doesn't exist
+        directory = os.path.dirname(log_location)
+        if not os.path.exists(directory):
+            logging.info("Creating directory %s", directory)
+            os.makedirs(directory)
+
+    def __log(self, message: str):
+        """Append a line to the server log"""
+        with open(self.log_file, "a", encoding="utf-8") as log:
+            log.write(message + "\n")
+
+    def __access_response(self, request: radius.RadiusPacket) -> radius.RadiusPacket:
+        """Decide on an Access-Request"""
+        if request.get(radius.EAP_MESSAGE):
+            self.counters["eap_rejected"] += 1
+            return radius.RadiusPacket(radius.ACCESS_REJECT, request.identifier)
+        if self.users is not None:
+            username = (request.get_first(radius.USER_NAME) or b"").decode("utf-8", "replace")
+            hidden = request.get_first(radius.USER_PASSWORD)
+            password = (
+                radius.decrypt_password(hidden, request.authenticator, self.secret)
+                if hidden is not None
+                else None
+            )
+            expected = self.users.get(username)
+            if expected is None or password != expected.encode("utf-8"):
+                return radius.RadiusPacket(radius.ACCESS_REJECT, request.identifier)
+        response = radius.RadiusPacket(radius.ACCESS_ACCEPT, request.identifier)
+        for value in CLASSES:
+            response.add(radius.CLASS, value)
+        response.add(radius.CHARGEABLE_USER_IDENTITY, CUI)
+        response.add(radius.ACCT_INTERIM_INTERVAL, ACCT_INTERIM_INTERVAL)
+        return response
+
+    def handle(self, data: bytes, addr) -> Union[bytes, None]:
+        """Return the encoded response to a request, None to drop it"""
+        try:
+            request = radius.RadiusPacket.decode(data)
+        except radius.RadiusError as error:
+            self.counters["malformed"] += 1
+            if self.debug:
+                self.__log(f"Dropping malformed packet from {addr}: {error}")
+            return None
+
+        key = (addr, request.identifier, request.authenticator)
+        if key in self.responses:
+            self.counters["duplicates"] += 1
+            return self.responses[key]
+
+        if request.code == radius.ACCESS_REQUEST:
+            if not radius.verify_message_authenticator(data, self.secret):
+                self.counters["bad_authenticator"] += 1
+                return None
+            response = self.__access_response(request)
+            # Always sign Access responses, clients may require it (Blast-RADIUS)
+            encoded = radius.encode_response(
+                response, request.authenticator, self.secret, message_authenticator=True
+            )
+        elif request.code == radius.ACCOUNTING_REQUEST:
+            if not radius.verify_accounting_request(data, self.secret):
+                self.counters["bad_authenticator"] += 1
+                return None
+            response = radius.RadiusPacket(radius.ACCOUNTING_RESPONSE, request.identifier)
+            encoded = radius.encode_response(response, request.authenticator, self.secret)
+        else:
+            self.counters["unknown_code"] += 1
+            return None
+
+        self.counters["access_requests" if request.code == radius.ACCESS_REQUEST else "accounting_requests"] += 1
+        if self.debug:
+            self.__log(f"Received code {request.code} id {request.identifier} from {addr}, "
+                       f"sent code {response.code}")
+        self.responses[key] = encoded
+        if len(self.responses) > DUPLICATE_CACHE_SIZE:
+            self.responses.popitem(last=False)
+        return encoded
+
+    async def __serve(self):
+        """Listen on the auth and acct ports until the loop is stopped"""
+        transports = []
+        try:
+            for port in (self.port, self.port + 1):
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: RadiusProtocol(self), local_addr=(self.host, port)
+                )
+                transports.append(transport)
+        except OSError as error:
+            self.error = error
+            self.ready.set()
+            return
+        self.__log(f"Listening on {self.host} ports {self.port} and {self.port + 1}")
+        self.__log("Ready to process requests")
+        self.ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for transport in transports:
+                transport.close()
+
+    def __run(self):
+        self.loop = asyncio.new_event_loop()
+        task = self.loop.create_task(self.__serve())
+        try:
+            self.loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def start(self):
+        """Start serving, returns once both ports are bound"""
+        logging.info("Starting %s", self.name)
+        self.ready.clear()
+        self.error = None
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+        if not self.ready.wait(self.ready_timeout):
+            raise RuntimeError(f"{self.name} not ready within {self.ready_timeout} seconds")
+        if self.error is not None:
+            self.thread.join()
+            self.thread = None
+            raise RuntimeError(f"{self.name} could not bind to port {self.port}: {self.error}")
+
+    def stop(self):
+        """Stop serving and log request counters"""
+        if self.thread is None:
+            logging.debug("process %s already stopped...", self.name)
+            return
+        logging.info("Stopping %s", self.name)
+        loop = self.loop
+
+        def cancel_all():
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+
+        loop.call_soon_threadsafe(cancel_all)
+        self.thread.join()
+        self.thread = None
+        self.__log(f"Requests handled: {dict(self.counters)}")
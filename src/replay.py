@@ -0,0 +1,256 @@
+"""Replay RADIUS requests from a capture against a RADIUS server, optionally faster and fanned out.
+
+Run with: python -m src.replay capture.pcap --server 127.0.0.1 --speed 10 --copies 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Union
+import src.radius as radius
+from src.inputs import RADIUS_PORT
+from src.loadgen import LoadConfig, LoadResult, NasClient, RateLimiter
+from src.pcap_file import read_pcap, get_udp_payload
+from src.radius_server import RadiusServer, SECRET
+
+STATUS_NAMES = {
+    radius.ACCT_STATUS_START: "start",
+    radius.ACCT_STATUS_STOP: "stop",
+    radius.ACCT_STATUS_INTERIM: "interim",
+}
+
+
+@dataclass
+class ReplayConfig:
+    """Replay settings, speed 0 sends as fast as possible."""
+
+    server: str = "127.0.0.1"
+    radius_port: int = RADIUS_PORT
+    secret: str = SECRET
+    original_secret: str = SECRET
+    capture_port: int = RADIUS_PORT
+    speed: float = 1
+    copies: int = 1
+    rewrite_usernames: bool = False
+    rewrite_session_ids: bool = False
+    keep_retransmissions: bool = False
+    window: int = 256
+    timeout: float = 3
+    retries: int = 2
+
+
+@dataclass
+class CapturedRequest:
+    """A request read from the capture"""
+
+    timestamp: float
+    source: tuple
+    packet: radius.RadiusPacket
+
+
+@dataclass
+class ReplayResult(LoadResult):
+    """Load counters plus how well the schedule was kept."""
+
+    requests: int = 0
+    max_lag: float = 0
+
+    @property
+    def rate(self) -> float:
+        """Requests sent per second, first transmissions only"""
+        return (self.sent - self.retransmissions) / self.duration if self.duration else 0
+
+    def to_dict(self) -> dict:
+        result = super().to_dict()
+        result["rate"] = self.rate
+        return result
+
+    def __str__(self):
+        lines = [
+            f"{self.requests} requests replayed in {self.duration:.1f} s at {self.rate:.0f}/s, "
+            f"max lag behind schedule {self.max_lag * 1000:.1f} ms",
+            f"{self.responses} responses ({self.throughput:.0f}/s), {self.retransmissions} retransmissions, "
+            f"{self.timeouts} timeouts, {self.invalid_responses} invalid responses",
+        ]
+        for name, latency in self.get_latency_summary().items():
+            lines.append(
+                f"{name}: " + ", ".join(f"{key} {value:.2f} ms" for key, value in latency.items() if key != "count")
+            )
+        return "\n".join(lines)
+
+
+def read_requests(pcap_file: str, capture_port=RADIUS_PORT, keep_retransmissions=False) -> List[CapturedRequest]:
+    """Read Access-Requests and Accounting-Requests sent to the capture's RADIUS ports"""
+    requests = []
+    seen = set()
+    for timestamp, linktype, frame in read_pcap(pcap_file):
+        udp = get_udp_payload(linktype, frame)
+        if udp is None:
+            continue
+        src, sport, _, dport, payload = udp
+        if dport not in (capture_port, capture_port + 1):
+            continue
+        try:
+            packet = radius.RadiusPacket.decode(payload)
+        except radius.RadiusError:
+            continue
+        if packet.code not in (radius.ACCESS_REQUEST, radius.ACCOUNTING_REQUEST):
+            continue
+        # The replayer retransmits on its own
+        key = (src, sport, packet.identifier, packet.authenticator)
+        if key in seen and not keep_retransmissions:
+            continue
+        seen.add(key)
+        requests.append(CapturedRequest(timestamp, (src, sport), packet))
+    requests.sort(key=lambda request: request.timestamp)
+    return requests
+
+
+def rewrite_request(request: radius.RadiusPacket, config: ReplayConfig, copy: int) -> radius.RadiusPacket:
+    """Copy a request for the target server: new secret, and unique user and session per copy"""
+    original_secret = config.original_secret.encode("utf-8")
+    secret = config.secret.encode("utf-8")
+    packet = radius.RadiusPacket(request.code, request.identifier, request.authenticator)
+    for attr_type, value in request.attributes:
+        if attr_type == radius.USER_NAME and config.rewrite_usernames and copy:
+            user, at, realm = value.partition(b"@")
+            value = b"r%d." % copy + user + at + realm
+        elif attr_type == radius.ACCT_SESSION_ID and config.rewrite_session_ids and copy:
+            value = value + b"-r%d" % copy
+        elif attr_type == radius.USER_PASSWORD and original_secret != secret:
+            password = radius.decrypt_password(value, request.authenticator, original_secret)
+            value = radius.encrypt_password(password, request.authenticator, secret)
+        elif attr_type == radius.MESSAGE_AUTHENTICATOR:
+            # Recomputed with the new secret when encoding
+            continue
+        packet.attributes.append((attr_type, value))
+    if request.code == radius.ACCOUNTING_REQUEST:
+        packet.authenticator = radius.ZERO_AUTHENTICATOR
+    return packet
+
+
+def get_request_name(packet: radius.RadiusPacket) -> str:
+    """Name used for latency statistics"""
+    if packet.code == radius.ACCESS_REQUEST:
+        return "access"
+    return STATUS_NAMES.get(packet.get_int(radius.ACCT_STATUS_TYPE), "accounting")
+
+
+async def replay(requests: List[CapturedRequest], config: ReplayConfig) -> ReplayResult:
+    """Send every request copies times, keeping the capture's timing divided by speed"""
+    result = ReplayResult(requests=len(requests) * config.copies)
+    load_config = LoadConfig(server=config.server, radius_port=config.radius_port, secret=config.secret,
+                             timeout=config.timeout, retries=config.retries)
+    limiter = RateLimiter(None)
+    loop = asyncio.get_running_loop()
+    # One socket per original client and copy keeps identifiers apart
+    clients = {}
+    tasks = set()
+    # Bound outstanding requests so bursts do not overflow socket buffers
+    window = asyncio.Semaphore(config.window)
+
+    async def send(client: NasClient, packet: radius.RadiusPacket, port: int):
+        try:
+            await client.request(get_request_name(packet), packet, port)
+        finally:
+            window.release()
+
+    async def get_client(key) -> NasClient:
+        if key not in clients:
+            _, clients[key] = await loop.create_datagram_endpoint(
+                lambda: NasClient(load_config, result, limiter), local_addr=("0.0.0.0", 0)
+            )
+        return clients[key]
+
+    begin = time.perf_counter()
+    first = requests[0].timestamp if requests else 0
+    try:
+        for request in requests:
+            if config.speed:
+                due = begin + (request.timestamp - first) / config.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                result.max_lag = max(result.max_lag, time.perf_counter() - due)
+            port = config.radius_port + (request.packet.code == radius.ACCOUNTING_REQUEST)
+            for copy in range(config.copies):
+                client = await get_client((request.source, copy))
+                packet = rewrite_request(request.packet, config, copy)
+                await window.acquire()
+                task = loop.create_task(send(client, packet, port))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        result.duration = time.perf_counter() - begin
+        for client in clients.values():
+            client.transport.close()
+    return result
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    defaults = ReplayConfig()
+    parser = argparse.ArgumentParser(description="Replay RADIUS requests from a pcap against a RADIUS server")
+    parser.add_argument("pcap_file", type=str, help="Capture to replay, e.g. from generate_pcap")
+    parser.add_argument("--server", type=str, default=defaults.server, help=f"default: {defaults.server}")
+    parser.add_argument("--radius_port", type=int, default=defaults.radius_port,
+                        help=f"Auth port of the target, accounting uses the next one, default: {defaults.radius_port}")
+    parser.add_argument("--secret", type=str, default=defaults.secret, help="Shared secret of the target")
+    parser.add_argument("--original_secret", type=str, default=defaults.original_secret,
+                        help="Shared secret used in the capture, needed to re-encrypt User-Password")
+    parser.add_argument("--capture_port", type=int, default=defaults.capture_port,
+                        help=f"Auth port in the capture, default: {defaults.capture_port}")
+    parser.add_argument("--speed", type=float, default=defaults.speed,
+                        help="Speed-up over the original timing, 0 sends as fast as possible, default: 1")
+    parser.add_argument("--copies", type=int, default=defaults.copies,
+                        help="Copies of every request, each from its own socket, default: 1")
+    parser.add_argument("--rewrite_usernames", action="store_true",
+                        help="Prefix User-Name with the copy number for copies after the first")
+    parser.add_argument("--rewrite_session_ids", action="store_true",
+                        help="Suffix Acct-Session-Id with the copy number for copies after the first")
+    parser.add_argument("--keep_retransmissions", action="store_true",
+                        help="Replay retransmissions from the capture as separate requests")
+    parser.add_argument("--window", type=int, default=defaults.window,
+                        help=f"Maximum outstanding requests, default: {defaults.window}")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout, help=f"default: {defaults.timeout}")
+    parser.add_argument("--retries", type=int, default=defaults.retries, help=f"default: {defaults.retries}")
+    parser.add_argument("--builtin", action="store_true",
+                        help="Start the built-in RADIUS server on --server/--radius_port")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    return parser.parse_args(args)
+
+
+def main(args=None) -> ReplayResult:
+    """Main function to run the replayer."""
+    cliargs = vars(parse_cliargs(args))
+    pcap_file = cliargs.pop("pcap_file")
+    builtin = cliargs.pop("builtin")
+    output = cliargs.pop("output")
+    config = ReplayConfig(**cliargs)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    requests = read_requests(pcap_file, config.capture_port, config.keep_retransmissions)
+    logging.info("Replaying %d requests from %s", len(requests), pcap_file)
+    server = None
+    if builtin:
+        server = RadiusServer("/tmp/raa-replay/radius.log", port=config.radius_port,
+                              secret=config.secret, host=config.server)
+        server.start()
+    try:
+        result = asyncio.run(replay(requests, config))
+    finally:
+        if server is not None:
+            server.stop()
+    print(result)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"config": asdict(config), "result": result.to_dict()}, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""Write test case results as JSON and render them as PDF or HTML reports, outside the pytest session.
+
+Run with: python -m src.report test_name [test_name ...] --root_dir /path/to/root --format pdf --format html
+"""
+
+import argparse
+import html
+import json
+import logging
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import List, Union
+from fpdf import FPDF, XPos, YPos
+import src.bundle as src_bundle
+import src.files as files
+from src.inputs import ROOT_DIR, BUNDLE_COMPRESSION, BUNDLE_COMPRESSION_LEVEL
+from src.metadata import Metadata, get_metadata, metadata_from_dict
+
+# Bump when results files can not be read anymore
+RESULTS_FORMAT = 1
+
+PDF = "pdf"
+HTML = "html"
+FORMATS = [PDF, HTML]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEDIA_DIR = os.path.join(REPO_DIR, "media")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Renderers started in the background by this process
+__renders: List[subprocess.Popen] = []
+
+
+@dataclass
+class TestCaseResult:
+    """Outcome of one test case as pytest reported it, check holds the values a check measured"""
+
+    nodeid: str
+    markers: List[str]
+    outcome: str
+    context: str = ""
+    duration: float = 0
+    check: Union[dict, None] = None
+
+    @property
+    def test_file(self) -> str:
+        return self.nodeid.split("::")[0]
+
+    @property
+    def category(self) -> str:
+        parts = self.nodeid.split("::")
+        return parts[1] if len(parts) == 3 else ""
+
+    @property
+    def test_case(self) -> str:
+        return self.nodeid.split("::")[-1]
+
+
+@dataclass
+class TestResults:
+    """Everything a report shows, written once by the test session and rendered any number of times"""
+
+    test_name: str
+    metadata: dict
+    results: List[TestCaseResult] = field(default_factory=list)
+    format: int = RESULTS_FORMAT
+
+    def get_metadata(self) -> Metadata:
+        return metadata_from_dict(self.metadata)
+
+    def count(self, outcome: str) -> int:
+        return sum(1 for result in self.results if result.outcome == outcome)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "TestResults":
+        if values.get("format") != RESULTS_FORMAT:
+            raise ValueError(f"Unsupported results format {values.get('format')}, expected {RESULTS_FORMAT}")
+        values = dict(values)
+        values["results"] = [TestCaseResult(**result) for result in values["results"]]
+        return cls(**values)
+
+
+def write_results(test_name: str, root_dir: str, results: List[TestCaseResult]) -> str:
+    """Write results with the test's metadata next to the reports, return the filename"""
+    test_results = TestResults(test_name, get_metadata(test_name, root_dir).get_dict(), results)
+    filename = files.get_results_filename(test_name, root_dir)
+    with open(filename, "w", encoding="utf-8") as file:
+        json.dump(test_results.to_dict(), file, indent=2, default=str)
+    logging.info(f"Results written to {filename}")
+    return filename
+
+
+def read_results(test_name: str, root_dir: str) -> TestResults:
+    with open(files.get_results_filename(test_name, root_dir), "r", encoding="utf-8") as file:
+        return TestResults.from_dict(json.load(file))
+
+
+def get_capture_warning(d: Metadata) -> Union[str, None]:
+    """Warning shown above the metadata when the capture may be incomplete, None when it is reliable"""
+    health = d.capture_health
+    if not health or health["reliable"]:
+        return None
+    stats = health["stats"] or {}
+    return (
+        "WARNING: the capture may be incomplete, test case results can be wrong "
+        f"(dropped by kernel: {stats.get('packets_dropped_by_kernel')}, "
+        f"unanswered requests: {len(health['unanswered_requests'])}, "
+        f"missing identifiers: {len(health['missing_identifiers'])})"
+    )
+
+
+def get_metadata_lines(test_name: str, d: Metadata) -> List[str]:
+    """Lines describing the test, shared by PDF and HTML"""
+    lines = [
+        f"Name: {test_name}",
+        f"SUT Brand: {d.sut_brand}",
+        f"SUT Hardware: {d.sut_hardware}",
+        f"SUT Software: {d.sut_software}",
+        f"Start Time: {d.start_time.strftime(DATE_FORMAT)}",
+        f"End Time: {d.end_time.strftime(DATE_FORMAT)}",
+        f"Chunks: {d.chunks}",
+        f"Chunk Size: {d.chunk_size}",
+        f"Uploaded: {d.uploaded}",
+        f"Downloaded: {d.downloaded}",
+        f"Session Duration (s): {d.session_duration}",
+        f"Username: {d.username}",
+    ]
+    for client in d.clients:
+        lines.append(
+            f"Client {client.client_interface}: username: {client.username}, "
+            f"session duration (s): {client.session_duration}"
+        )
+    auth = d.auth_events or {}
+    if auth.get("auth_latency") is not None:
+        lines.append(f"EAP Authentication Latency (s): {auth['auth_latency']:.3f}")
+    if auth:
+        lines.append(
+            f"Reauthentications: {auth['reauthentications']}, "
+            f"Reconnects: {auth['reconnects']}, Disconnects: {auth['disconnects']}"
+        )
+    for direction, tcp_info in [("Download", d.tcp_info_download), ("Upload", d.tcp_info_upload)]:
+        for endpoint, info in (tcp_info or {}).items():
+            if info is None:
+                continue
+            lines.append(
+                f"{direction} TCP ({endpoint}): retransmits: {info.total_retrans}, "
+                f"bytes retransmitted: {info.bytes_retrans}, bytes acked: {info.bytes_acked}, "
+                f"rtt: {info.rtt} us, cwnd: {info.snd_cwnd}"
+            )
+    health = d.capture_health
+    if health:
+        stats = health["stats"] or {}
+        lines.append(
+            f"Capture ({stats.get('engine', 'unknown')}): reliable: {health['reliable']}, "
+            f"captured: {stats.get('packets_captured')}, "
+            f"dropped by kernel: {stats.get('packets_dropped_by_kernel')}, "
+            f"dropped by interface: {stats.get('packets_dropped_by_interface')}"
+        )
+        lines.append(
+            f"Capture completeness: requests: {health['requests']}, responses: {health['responses']}, "
+            f"unanswered: {len(health['unanswered_requests'])}, "
+            f"unmatched responses: {health['unmatched_responses']}, "
+            f"missing identifiers: {len(health['missing_identifiers'])}"
+        )
+    for endpoint, options in (d.socket_options or {}).items():
+        options_str = ", ".join(f"{key}: {value}" for key, value in options.items())
+        lines.append(f"Socket options ({endpoint}): {options_str}")
+    return lines
+
+
+class PDFReport(FPDF):
+    def __init__(self, test_name: str, metadata: Metadata):
+        super().__init__(orientation="L")
+        self.test_name = test_name
+        self.metadata = metadata
+
+    def header(self):
+        self.set_font("Helvetica", "B", size=14)
+        self.cell(
+            0,
+            18,
+            f'Test Report for "{self.test_name}"',
+            0,
+            align="C",
+            new_x=XPos.LMARGIN,
+            new_y=YPos.NEXT,
+        )
+        # Add logos
+        self.image(os.path.join(MEDIA_DIR, "raa.logo.png"), x=240, y=8, w=45, h=15)
+        self.image(os.path.join(MEDIA_DIR, "wba.logo.png"), x=5, y=8, w=50, h=15)
+
+    def unset_color(self):
+        self.set_text_color(0, 0, 0)
+
+    def set_color(self, result: str):
+        if result.lower() == "passed":
+            self.set_text_color(0, 128, 0)
+        elif result.lower() == "failed":
+            self.set_text_color(128, 0, 0)
+        else:
+            self.unset_color()
+
+    def testcase_detail(self, title, markers, result, context):
+        """Create a section showing details of each test case."""
+
+        def create_border():
+            """Create a border for the test case details."""
+            self.set_draw_color(0, 0, 0)  # Set border color (black)
+            self.set_line_width(0.25)  # Set border line width
+            self.line(10, self.get_y(), 200, self.get_y())
+            self.ln(2)
+
+        def create_cell(
+            title: str, body: str = "", bold_title=False, size=10, whitespace=" "
+        ):
+            """Basic cell creation function for test case details."""
+
+            if bold_title:
+                self.set_font(style="B", size=size)
+            else:
+                self.set_font(style="", size=size)
+            title_width = self.get_string_width(title + whitespace)
+            self.cell(title_width, 8, title, 0, align="L")
+            self.set_font(style="", size=size)
+            self.set_color(body)
+            self.multi_cell(
+                0,
+                8,
+                body,
+                0,
+                align="L",
+                new_x=XPos.LMARGIN,
+                new_y=YPos.NEXT,
+            )
+            self.unset_color()
+
+        create_border()
+        create_cell(title, bold_title=True, size=11)
+        create_cell("markers :", ", ".join(markers))
+        create_cell("result :", result.upper())
+        create_cell("context :", context)
+        self.ln(5)
+
+
+def render_pdf(test_results: TestResults, filename: str):
+    """Render the PDF report of metadata, capture health and test results."""
+    test_name = test_results.test_name
+    results = test_results.results
+    pdf = PDFReport(test_name=test_name, metadata=test_results.get_metadata())
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=11)
+
+    def cell_template(text: str, align="L"):
+        pdf.cell(0, 7, text, 0, align=align, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    cell_template(
+        f"Passed: {test_results.count('passed')}, Failed: {test_results.count('failed')}, Total: {len(results)}",
+        align="C",
+    )
+    pdf.ln(10)
+
+    warning = get_capture_warning(pdf.metadata)
+    if warning:
+        pdf.set_font(style="B")
+        pdf.set_text_color(255, 255, 255)
+        pdf.set_fill_color(192, 0, 0)
+        pdf.multi_cell(0, 8, warning, border=1, align="C", fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.unset_color()
+        pdf.ln(5)
+
+    pdf.set_font(style="B")
+    cell_template("--- Test Metadata---")
+    pdf.set_font(style="")
+    for line in get_metadata_lines(test_name, pdf.metadata):
+        cell_template(line)
+    pdf.ln(10)
+
+    pdf.set_font(style="B")
+    cell_template("--- Test Case Summary---")
+    pdf.ln(5)
+    # Common setup for all cells
+    pdf.set_font("Helvetica", size=10)
+    cell_height = 10
+    whitespace = 3
+
+    rows = [("Marker(s)", "Category", "Test Case", "Result", "File")] + [
+        (
+            ", ".join(result.markers),
+            result.category.replace("Test", ""),
+            result.test_case.replace("test_", ""),
+            result.outcome.upper(),
+            result.test_file,
+        )
+        for result in results
+    ]
+    # Width of each column is that of its widest cell, measured once per distinct text
+    widths = [max(pdf.get_string_width(text) for text in set(column)) + whitespace for column in zip(*rows)]
+
+    # Write data to table
+    for row in rows:
+        for column, (text, width) in enumerate(zip(row, widths)):
+            # Set color based on result, red=failed, green=passed
+            if column == 3:
+                pdf.set_color(text)
+            pdf.cell(width, cell_height, text, border=1)
+            pdf.unset_color()
+        pdf.ln()
+
+    pdf.add_page()
+
+    # Add details for each test
+    pdf.ln(10)
+    pdf.set_font(style="B", size=11)
+    cell_template("--- Test Case Details---")
+    pdf.ln(5)
+    pdf.set_font(style="", size=10)
+
+    for result in results:
+        pdf.testcase_detail(
+            title=result.nodeid, markers=result.markers, result=result.outcome, context=result.context
+        )
+
+    logging.info(f"Writing report to {filename}")
+    pdf.output(filename)
+    logging.info(f"Report written to {filename}")
+
+
+HTML_STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #999; padding: 0.2em 0.6em; text-align: left; vertical-align: top; }
+.passed { color: #008000; } .failed { color: #800000; }
+pre { margin: 0; white-space: pre-wrap; }
+.warning { background: #c00000; color: #fff; font-weight: bold; padding: 0.6em; border: 2px solid #800000; }
+"""
+
+
+def render_html(test_results: TestResults, filename: str):
+    """Render the same content as the PDF as a single HTML page, much faster for large reports."""
+    escape = html.escape
+    test_name = escape(test_results.test_name)
+    results = test_results.results
+    metadata = test_results.get_metadata()
+    warning = get_capture_warning(metadata)
+    parts = [
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Test Report for \"{test_name}\"</title>"
+        f"<style>{HTML_STYLE}</style></head><body>\n",
+        f"<h1>Test Report for \"{test_name}\"</h1>\n",
+        f"<p>Passed: {test_results.count('passed')}, Failed: {test_results.count('failed')}, "
+        f"Total: {len(results)}</p>\n",
+    ]
+    if warning:
+        parts.append(f"<p class=\"warning\">{escape(warning)}</p>\n")
+    parts.append("<h2>Test Metadata</h2>\n<ul>\n")
+    parts += [f"<li>{escape(line)}</li>\n" for line in get_metadata_lines(test_results.test_name, metadata)]
+    parts.append("</ul>\n<h2>Test Cases</h2>\n<table>\n<tr><th>Marker(s)</th><th>Category</th><th>Test Case</th>"
+                 "<th>Result</th><th>File</th><th>Context</th></tr>\n")
+    for result in results:
+        parts.append(
+            f"<tr><td>{escape(', '.join(result.markers))}</td><td>{escape(result.category)}</td>"
+            f"<td>{escape(result.test_case)}</td><td class=\"{escape(result.outcome)}\">{escape(result.outcome.upper())}"
+            f"</td><td>{escape(result.test_file)}</td><td><pre>{escape(result.context)}</pre></td></tr>\n"
+        )
+    parts.append("</table>\n</body></html>\n")
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write("".join(parts))
+    logging.info(f"Report written to {filename}")
+
+
+RENDERERS = {
+    PDF: (render_pdf, files.get_report_filename),
+    HTML: (render_html, files.get_html_report_filename),
+}
+
+
+def render(test_name: str, root_dir: str, formats=(PDF,), bundle=False, compression=BUNDLE_COMPRESSION,
+           level=BUNDLE_COMPRESSION_LEVEL) -> List[str]:
+    """Render reports of a test from its results file, then optionally zip the bundle, return the reports"""
+    test_results = read_results(test_name, root_dir)
+    reports = []
+    for report_format in formats:
+        renderer, get_filename = RENDERERS[report_format]
+        filename = get_filename(test_name, root_dir)
+        renderer(test_results, filename)
+        reports.append(filename)
+    if bundle:
+        src_bundle.write_bundle(test_name, root_dir, compression, level)
+    return reports
+
+
+def render_many(test_names: List[str], root_dir: str, formats=(PDF,), bundle=False, workers=1,
+                compression=BUNDLE_COMPRESSION, level=BUNDLE_COMPRESSION_LEVEL) -> dict:
+    """Render reports of many tests in worker processes, return reports per test name"""
+    if workers <= 1:
+        return {test_name: render(test_name, root_dir, formats, bundle, compression, level)
+                for test_name in test_names}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {test_name: executor.submit(render, test_name, root_dir, formats, bundle, compression, level)
+                   for test_name in test_names}
+        return {test_name: future.result() for test_name, future in futures.items()}
+
+
+def start_render(test_name: str, root_dir: str, formats=(PDF,), bundle=True, compression=BUNDLE_COMPRESSION,
+                 level=BUNDLE_COMPRESSION_LEVEL) -> subprocess.Popen:
+    """Render reports and the bundle of a test in a background process"""
+    args = [sys.executable, "-m", "src.report", test_name, "--root_dir", root_dir]
+    args += [arg for report_format in formats for arg in ("--format", report_format)]
+    if bundle:
+        args += ["--bundle", "--compression", compression, "--level", str(level)]
+    logging.info("Rendering reports of %s in the background", test_name)
+    process = subprocess.Popen(args, cwd=REPO_DIR)
+    __renders.append(process)
+    return process
+
+
+def wait_for_renders(timeout: Union[float, None] = None) -> bool:
+    """Wait for background renderers this process started, return whether all succeeded"""
+    succeeded = True
+    while __renders:
+        process = __renders.pop(0)
+        if process.wait(timeout) != 0:
+            logging.error("Rendering reports failed with exit code %s: %s", process.returncode, process.args)
+            succeeded = False
+    return succeeded
+
+
+def parse_cliargs(args=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Render reports from the results files of tests")
+    parser.add_argument("test_names", nargs="+", help="Names of tests under the root directory")
+    parser.add_argument("--root_dir", default=ROOT_DIR, help=f"Directory of the tests, default: {ROOT_DIR}")
+    parser.add_argument("--format", action="append", dest="formats", choices=FORMATS,
+                        help="Report format, can be repeated, default: pdf")
+    parser.add_argument("--bundle", action="store_true", help="Zip the bundle of each test after rendering")
+    parser.add_argument("--compression", choices=src_bundle.COMPRESSIONS, default=BUNDLE_COMPRESSION,
+                        help=f"Compression of the bundle, default: {BUNDLE_COMPRESSION}")
+    parser.add_argument("--level", type=int, default=BUNDLE_COMPRESSION_LEVEL,
+                        help=f"Compression level of the bundle, default: {BUNDLE_COMPRESSION_LEVEL}")
+    parser.add_argument("--workers", type=int, default=1, help="Tests rendered at the same time, default: 1")
+    return parser.parse_args(args)
+
+
+def main(args=None) -> dict:
+    """Main function to render reports."""
+    cliargs = parse_cliargs(args)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    return render_many(cliargs.test_names, cliargs.root_dir, cliargs.formats or [PDF], cliargs.bundle,
+                       cliargs.workers, cliargs.compression, cliargs.level)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,31 @@
 """Contains test setup-related imports."""
 
 from datetime import datetime
-from typing import List
-from dataclasses import dataclass
+from typing import List, Union
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import time
 import os
 import sys
 import logging
-import subprocess
 import json
+import pytest
 import yaml
 
 import src.processes as procs
 import src.files as files
 import src.inputs as inputs
-from src.data_transfer import TCPServer
-from src.metadata import Metadata
+import src.netlink as netlink
+import src.tracing as tracing
+import src.report as report
+from src.data_transfer import TCPServer, SocketOptions
+from src.capture import RingCapture, get_capture_health
+from src.observer import RadiusObserver
+from src.live import LiveSampler
+from src.radius_server import RadiusServer
+from src.metadata import Metadata, get_metadata
+
+RAATESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raatests")
 
 
 @dataclass
@@ -41,6 +51,26 @@ class TestConfig:
     sut_hardware: str
     sut_software: str
     radius_port: int
+    so_sndbuf: Union[int, None] = None
+    so_rcvbuf: Union[int, None] = None
+    tcp_nodelay: Union[bool, None] = None
+    tcp_congestion: Union[str, None] = None
+    tcp_maxseg: Union[int, None] = None
+    ip_tos: Union[int, None] = None
+    transfer_mode: str = inputs.TRANSFER_MODE
+    payload: str = inputs.PAYLOAD
+    buffer_size: int = inputs.BUFFER_SIZE
+    client_interfaces: List[str] = field(default_factory=list)
+    capture_engine: str = inputs.CAPTURE_ENGINE
+    radius_server: str = inputs.RADIUS_SERVER
+    accounting_timeout: float = inputs.ACCOUNTING_TIMEOUT
+    bundle_compression: str = inputs.BUNDLE_COMPRESSION
+    bundle_compression_level: int = inputs.BUNDLE_COMPRESSION_LEVEL
+
+    @property
+    def all_client_interfaces(self) -> List[str]:
+        """Client interfaces, each runs its own supplicant and accounting session."""
+        return list(self.client_interfaces) or [self.client_interface]
 
     @property
     def pcap_dir(self):
@@ -58,6 +88,17 @@ class TestConfig:
     def configs_dir(self):
         return files.get_config_dir(self.local_output_directory)
 
+    @property
+    def socket_options(self):
+        return SocketOptions(
+            sndbuf=self.so_sndbuf,
+            rcvbuf=self.so_rcvbuf,
+            nodelay=self.tcp_nodelay,
+            congestion=self.tcp_congestion,
+            maxseg=self.tcp_maxseg,
+            tos=self.ip_tos,
+        )
+
     def __to_dict__(self):
         return self.__dict__
 
@@ -112,6 +153,21 @@ def get_testconfig(test_name: str,
         sut_hardware=all_opts[inputs.KEY_HARDWARE],
         sut_software=all_opts[inputs.KEY_SOFTWARE],
         radius_port=all_opts[inputs.KEY_RADIUS_PORT],
+        so_sndbuf=all_opts[inputs.KEY_SO_SNDBUF],
+        so_rcvbuf=all_opts[inputs.KEY_SO_RCVBUF],
+        tcp_nodelay=all_opts[inputs.KEY_TCP_NODELAY],
+        tcp_congestion=all_opts[inputs.KEY_TCP_CONGESTION],
+        tcp_maxseg=all_opts[inputs.KEY_TCP_MAXSEG],
+        ip_tos=all_opts[inputs.KEY_IP_TOS],
+        transfer_mode=all_opts[inputs.KEY_TRANSFER_MODE],
+        payload=all_opts[inputs.KEY_PAYLOAD],
+        buffer_size=all_opts[inputs.KEY_BUFFER_SIZE],
+        client_interfaces=all_opts[inputs.KEY_CLIENT_IFACES],
+        capture_engine=all_opts[inputs.KEY_CAPTURE_ENGINE],
+        radius_server=all_opts[inputs.KEY_RADIUS_SERVER],
+        accounting_timeout=float(all_opts[inputs.KEY_ACCOUNTING_TIMEOUT]),
+        bundle_compression=all_opts[inputs.KEY_BUNDLE_COMPRESSION],
+        bundle_compression_level=int(all_opts[inputs.KEY_BUNDLE_COMPRESSION_LEVEL]),
     )
     return test_config
 
@@ -140,14 +196,7 @@ def create_dir_if_not_exists(directory):
 def check_interfaces_exist(self, *args):
     """Check if the specified network interfaces exist"""
     for iface in args:
-        try:
-            subprocess.run(
-                ["ip", "link", "show", iface],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError:
+        if not netlink.interface_exists(iface):
             self.logger.error(f"Interface {iface} does not exist.")
             return False
     return True
@@ -165,7 +214,7 @@ class TestSetup:
         self.__create_dirs()
         self.__initialize_proc_vars()
         logging.debug("Test configuration: %s", self.config.pretty_print)
-        if not check_interfaces_exist(self, self.config.client_interface, self.config.server_interface):
+        if not check_interfaces_exist(self, *self.config.all_client_interfaces, self.config.server_interface):
             sys.exit()
 
     def __create_dirs(self):
@@ -181,22 +230,22 @@ class TestSetup:
     def __initialize_proc_vars(self):
         """Initialize all processes variables"""
         self.freeradius = None
-        self.wpasupplicant = None
+        self.wpasupplicants = []
         self.data_server = None
         self.radius_tcpdump = None
+        self.radius_observer = None
+        self.live_sampler = None
+        self.start_times = {}
 
-    def __check_for_ip(self):
-        """Check if network interface has IP"""
-        result = subprocess.run(
-            ["ip", "addr", "show", self.config.client_interface],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        if "inet " in result.stdout:
-            return True
-        else:
-            return False
+    @property
+    def wpasupplicant(self):
+        """Supplicant of the first client"""
+        return self.wpasupplicants[0] if self.wpasupplicants else None
+
+    @property
+    def usernames(self) -> dict:
+        """Username per client interface"""
+        return {proc.interface: proc.get_username() for proc in self.wpasupplicants}
 
     def __initialize_output_locations(self):
         """Initialize output locations for logs and pcap files"""
@@ -210,142 +259,282 @@ class TestSetup:
         self.radius_pcap_location = files.get_pcap_filename(
             self.config.test_name, self.root_dir
         )
-        self.wpa_supplicant_log = files.get_wpasupplicant_log_filename(
-            self.config.test_name, self.root_dir
-        )
+        interfaces = self.config.all_client_interfaces
+        if len(interfaces) == 1:
+            self.wpa_supplicant_logs = {
+                interfaces[0]: files.get_wpasupplicant_log_filename(self.config.test_name, self.root_dir)
+            }
+        else:
+            self.wpa_supplicant_logs = {
+                iface: files.get_wpasupplicant_log_filename(self.config.test_name, self.root_dir, iface)
+                for iface in interfaces
+            }
 
     def __initialize_proc_objs(self):
         """Initialize process objects for the test"""
         self.__initialize_output_locations()
         port = int(self.config.radius_port)
-        _filter = f"port {port} or port {port + 1}"
-        self.radius_tcpdump = procs.TCPDump(
-            interface=self.config.server_interface,
-            pcap_location=self.radius_pcap_location,
-            log_location=self.radius_tcpdump_log,
-            _filter=_filter,
-        )
-        self.wpasupplicant = procs.WpaSupplicant(
-            interface=self.config.client_interface,
-            log_location=self.wpa_supplicant_log,
-            ssid=self.config.ssid,
-        )
-        self.freeradius = procs.FreeRADIUS(
-            log_location=self.freeradius_log, debug=self.debug, port=port
-        )
+        if self.config.capture_engine == "afpacket":
+            self.radius_tcpdump = RingCapture(
+                interface=self.config.server_interface,
+                pcap_location=self.radius_pcap_location,
+                log_location=self.radius_tcpdump_log,
+                radius_port=port,
+            )
+        else:
+            _filter = f"port {port} or port {port + 1}"
+            self.radius_tcpdump = procs.TCPDump(
+                interface=self.config.server_interface,
+                pcap_location=self.radius_pcap_location,
+                log_location=self.radius_tcpdump_log,
+                _filter=_filter,
+            )
+        self.radius_observer = RadiusObserver(self.radius_pcap_location, port)
+        # Each supplicant gets its own config file and with it its own username
+        self.wpasupplicants = [
+            procs.WpaSupplicant(
+                interface=iface,
+                log_location=log_location,
+                ssid=self.config.ssid,
+                config_location=f"/tmp/wpa_supplicant.{iface}.conf",
+            )
+            for iface, log_location in self.wpa_supplicant_logs.items()
+        ]
+        if self.config.radius_server == "builtin":
+            self.freeradius = RadiusServer(
+                log_location=self.freeradius_log, debug=self.debug, port=port
+            )
+        else:
+            self.freeradius = procs.FreeRADIUS(
+                log_location=self.freeradius_log, debug=self.debug, port=port
+            )
 
         self.username = self.wpasupplicant.get_username()
+        self.live_sampler = LiveSampler(
+            files.get_live_samples_filename(self.config.test_name, self.root_dir),
+            self.usernames, self.radius_observer,
+        )
 
-    def start(self, wait_for_ip=True, extra_wait_time=3):
-        """Start processes"""
+    def __start_client(self, wpasupplicant, wait_for_ip):
+        """Start supplicant of one client, return time when its session started"""
+        with tracing.span("start wpa_supplicant", interface=wpasupplicant.interface):
+            wpasupplicant.start()
+        if not wait_for_ip:
+            return time.perf_counter()
+        # Block until wireless interface has IP, start counter when IP is given
+        self.logger.info(f"Waiting for IP on {wpasupplicant.interface}...")
+        with tracing.span("wait for IP", interface=wpasupplicant.interface):
+            return netlink.wait_for_address(wpasupplicant.interface)
+
+    def wait_for_accounting(self, status: str, after: float = 0) -> bool:
+        """Wait until every client's Accounting-Request of a status sent after a time was answered"""
+        if self.radius_observer is None:
+            return False
+        found = True
+        with tracing.span(f"wait for Accounting {status}"):
+            for username in self.usernames.values():
+                event = self.radius_observer.wait_for_accounting(
+                    username, status, after=after, timeout=self.config.accounting_timeout
+                )
+                found = found and event is not None
+        return found
+
+    def start(self, wait_for_ip=True):
+        """Start processes, return start time of the first client session"""
         self.stop()
         self.__initialize_proc_objs()
         self.logger.info(f'Starting test "{self.config.test_name}"...')
 
         def start_proc(proc):
             assert proc is not None
-            proc.start()
+            with tracing.span(f"start {proc.name}"):
+                proc.start()
 
         start_proc(self.radius_tcpdump)
+        self.radius_observer.start()
+        self.live_sampler.start()
         start_proc(self.freeradius)
-        start_proc(self.wpasupplicant)
 
-        if wait_for_ip:
-            # Block until wireless interface has IP
-            self.logger.info(f"Waiting for IP on {self.config.client_interface}...")
-            while not self.__check_for_ip():
-                time.sleep(0.05)
-        start_time = time.perf_counter()  # start counter after IP given
-        time.sleep(extra_wait_time)  # wait for network to settle
-        return start_time
+        # Clients connect in parallel, they share tcpdump and FreeRADIUS
+        with ThreadPoolExecutor(max_workers=len(self.wpasupplicants)) as executor:
+            start_times = executor.map(
+                lambda proc: self.__start_client(proc, wait_for_ip), self.wpasupplicants
+            )
+            self.start_times = {
+                proc.interface: start_time
+                for proc, start_time in zip(self.wpasupplicants, start_times)
+            }
+        # Sessions are accounted for once the Accounting Start is answered
+        self.wait_for_accounting("start")
+        return self.start_times[self.wpasupplicant.interface]
 
     def stop(self):
         """Stop all processes"""
 
         def stop_proc(proc):
             if proc is not None:
-                proc.stop()
+                with tracing.span(f"stop {getattr(proc, 'name', type(proc).__name__)}"):
+                    proc.stop()
 
         # Stop wpa_supplicant first to get Stop record in PCAP
-        stop_proc(self.wpasupplicant)
-        time.sleep(2)
+        stopped = time.time()
+        for wpasupplicant in self.wpasupplicants:
+            stop_proc(wpasupplicant)
+        if self.wpasupplicants:
+            self.wait_for_accounting("stop", after=stopped)
         stop_proc(self.data_server)
         stop_proc(self.freeradius)
-        time.sleep(1)
         stop_proc(self.radius_tcpdump)
-
-
-def generate_pcap(test_config: TestConfig, logger: logging.Logger, debug=False):
-    """Run end-to-end test and generate PCAP + PCAP metadata."""
-
-    test = TestSetup(test_config, debug=debug, logger=logger)
-    chunks = test_config.chunks
-
-    # Start test for PCAP generation.
-    begin = test.start()
-    time.sleep(2)
-
-    # Create TCP server
+        stop_proc(self.radius_observer)
+        # After the observer, so the last sample has the Accounting Stop
+        stop_proc(self.live_sampler)
+
+
+def transfer_client_data(
+    test_config: TestConfig,
+    interface: str,
+    index: int,
+    logger: logging.Logger,
+    observer: Union[RadiusObserver, None] = None,
+    username: Union[str, None] = None,
+) -> dict:
+    """Run the configured downloads and uploads for one client, return usage per direction.
+
+    With an observer, the upload waits for the first Interim-Update after the download."""
+    # Each additional client uses the next data server and listen port.
     data_server = TCPServer(
         test_config.data_server_ip,
-        test_config.data_server_port,
-        test_config.data_server_listen_port,
+        test_config.data_server_port + index,
+        test_config.data_server_listen_port + index,
         test_config.chunk_size,
         test_config.chunks,
-        test_config.client_interface,
+        interface,
+        test_config.socket_options,
+        test_config.transfer_mode,
+        test_config.payload,
+        test_config.buffer_size,
     )
-
-    # Start data transfer.
-    logger.info(f"pulling {chunks} chunks")
-    start_time = datetime.now()
-    begin_data_transfer = time.perf_counter()
+    result = {
+        "usage_download": None,
+        "tcp_info_download": None,
+        "usage_upload": None,
+        "tcp_info_upload": None,
+        "socket_options": None,
+    }
     if test_config.download_chunks:
         data_server.start(download=True)
-        usage_download = data_server.transfer_data(logger=logger)
-        logger.debug(f"usage_download: {usage_download}")
-    else:
-        usage_download = None
+        result["usage_download"] = data_server.transfer_data(logger=logger)
+        result["tcp_info_download"] = data_server.tcp_info
+        result["socket_options"] = data_server.applied_socket_options
+        logger.debug(f"usage_download ({interface}): {result['usage_download']}")
 
     if test_config.upload_chunks:
         if test_config.download_chunks:
-            logger.info("sleeping for 10 seconds")
-            time.sleep(10)
+            if observer is not None:
+                logger.info(f"waiting for Interim-Update of {username}")
+                with tracing.span("wait for Accounting interim", interface=interface):
+                    observer.wait_for_accounting(
+                        username, "interim", after=time.time(), timeout=test_config.accounting_timeout
+                    )
+            else:
+                logger.info("sleeping for 10 seconds")
+                time.sleep(10)
         data_server.start(download=False)
-        usage_upload = data_server.transfer_data(logger=logger)
-        logger.debug(f"usage_upload: {usage_upload}")
-    else:
-        usage_upload = None
+        result["usage_upload"] = data_server.transfer_data(logger=logger)
+        result["tcp_info_upload"] = data_server.tcp_info
+        result["socket_options"] = data_server.applied_socket_options
+        logger.debug(f"usage_upload ({interface}): {result['usage_upload']}")
+    result["end"] = time.perf_counter()
+    result["end_time"] = datetime.now()
+    return result
+
+
+def generate_pcap(test_config: TestConfig, logger: logging.Logger, debug=False):
+    """Run end-to-end test and generate PCAP + PCAP metadata, phases are traced to the logs directory."""
+    trace_file = files.get_trace_filename(test_config.test_name, test_config.local_output_directory)
+    tracing.start_trace(trace_file, f"generate_pcap {test_config.test_name}", reset=True)
+    try:
+        with tracing.span("generate_pcap", test_name=test_config.test_name):
+            __generate_pcap(test_config, logger, debug)
+    finally:
+        tracing.stop_trace()
+
+
+def __generate_pcap(test_config: TestConfig, logger: logging.Logger, debug=False):
+    test = TestSetup(test_config, debug=debug, logger=logger)
+    chunks = test_config.chunks
+    interfaces = test_config.all_client_interfaces
+
+    # Start test for PCAP generation, returns once the whole stack is ready.
+    with tracing.span("TestSetup.start"):
+        test.start()
+
+    # Start data transfer, clients transfer in parallel.
+    logger.info(f"pulling {chunks} chunks")
+    start_time = datetime.now()
+    begin_data_transfer = time.perf_counter()
+    with tracing.span("data transfer"), ThreadPoolExecutor(max_workers=len(interfaces)) as executor:
+        results = list(executor.map(
+            lambda args: transfer_client_data(
+                test_config, args[1].interface, args[0], logger,
+                test.radius_observer, args[1].get_username(),
+            ),
+            enumerate(test.wpasupplicants),
+        ))
 
     # Data transfer completed, stop test.
-    end = time.perf_counter()
-    end_time = datetime.now()
-    session_duration = int(end - begin)
-    data_transfer_duration = end - begin_data_transfer
+    data_transfer_duration = time.perf_counter() - begin_data_transfer
     logger.info(f"Data transfer completed in {data_transfer_duration:.2f} seconds")
 
-    time.sleep(10)
-    test.stop()
+    # Let every session report its final usage in an Interim-Update before it is stopped.
+    with tracing.span("wait for Accounting interim"):
+        for wpasupplicant, result in zip(test.wpasupplicants, results):
+            test.radius_observer.wait_for_accounting(
+                wpasupplicant.get_username(), "interim",
+                after=result["end_time"].timestamp(), timeout=test_config.accounting_timeout,
+            )
+    with tracing.span("TestSetup.stop"):
+        test.stop()
 
-    # Write test metadata to file.
+    # Check the capture can be trusted before test cases draw conclusions from it.
+    with tracing.span("capture health"):
+        capture_health = get_capture_health(
+            test.radius_tcpdump.stats, test.radius_pcap_location, test_config.radius_port
+        )
+    if not capture_health["reliable"]:
+        logger.warning(f"Capture may be incomplete: {capture_health}")
+
+    # Write test metadata to file, one entry per client.
     filename_withdir = files.get_metadata_filename(
         test_config.test_name, test_config.local_output_directory
     )
-    test_metadata = Metadata(
-        username=test.username,
-        session_duration=session_duration,
-        chunk_size=str(test_config.chunk_size),
-        chunks=str(chunks),
-        sut_brand=test_config.sut_brand,
-        sut_hardware=test_config.sut_hardware,
-        sut_software=test_config.sut_software,
-        start_time=start_time,
-        uploaded=test_config.upload_chunks,
-        usage_upload=usage_upload,
-        downloaded=test_config.download_chunks,
-        usage_download=usage_download,
-        end_time=end_time,
-        radius_port=test_config.radius_port,
-    )
+    clients_metadata = []
+    for wpasupplicant, result in zip(test.wpasupplicants, results):
+        begin = test.start_times[wpasupplicant.interface]
+        clients_metadata.append(Metadata(
+            username=wpasupplicant.get_username(),
+            session_duration=int(result["end"] - begin),
+            chunk_size=str(test_config.chunk_size),
+            chunks=str(chunks),
+            sut_brand=test_config.sut_brand,
+            sut_hardware=test_config.sut_hardware,
+            sut_software=test_config.sut_software,
+            start_time=start_time,
+            uploaded=test_config.upload_chunks,
+            usage_upload=result["usage_upload"],
+            downloaded=test_config.download_chunks,
+            usage_download=result["usage_download"],
+            end_time=result["end_time"],
+            radius_port=test_config.radius_port,
+            tcp_info_upload=result["tcp_info_upload"],
+            tcp_info_download=result["tcp_info_download"],
+            socket_options=result["socket_options"],
+            auth_events=wpasupplicant.get_auth_summary(),
+            client_interface=wpasupplicant.interface,
+        ))
+    test_metadata = clients_metadata[0]
+    test_metadata.capture_health = capture_health
+    test_metadata.clients = clients_metadata[1:]
     test_metadata_dict = test_metadata.get_dict()
 
     logger.info(f'Writing metadata to file "{filename_withdir}"')
@@ -353,3 +542,31 @@ def generate_pcap(test_config: TestConfig, logger: logging.Logger, debug=False):
         json.dump(test_metadata_dict, f)
     logger.info(f"Test {test_config.test_name} completed")
 
+
+def execute_test_cases(config: TestConfig, logger: logging.Logger, markers: Union[List[str], None] = None) -> int:
+    """Run test cases against the PCAP of a test, waits for the report and bundle, return pytest's exit code."""
+    test_name = config.test_name
+    metadata = get_metadata(test_name, config.local_output_directory)
+    logger.info(
+        f'\n\nMetadata for "{test_name}":\n{metadata.pretty_print_format()}\n')
+    markers = " or ".join(config.markers if markers is None else markers)
+    pytest_args = [
+        "-v", RAATESTS_DIR, "--test_name", test_name, "--root_dir", config.local_output_directory,
+        "--bundle_compression", config.bundle_compression,
+        "--bundle_compression_level", str(config.bundle_compression_level),
+    ]
+    extra_args = ["-m", markers]
+    logger.debug(f"\n\npytest args: {pytest_args + extra_args}\n")
+    # Appends to the trace generate_pcap wrote for the same test
+    trace_file = files.get_trace_filename(test_name, config.local_output_directory)
+    tracing.start_trace(trace_file, f"test cases {test_name}")
+    try:
+        with tracing.span("pytest", markers=markers):
+            exit_code = pytest.main(pytest_args + extra_args)
+        # Reports and bundle are rendered in a background process once the results were written
+        with tracing.span("render reports"):
+            if not report.wait_for_renders():
+                logger.error(f'Rendering reports of "{test_name}" failed')
+        return exit_code
+    finally:
+        tracing.stop_trace()
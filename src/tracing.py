@@ -0,0 +1,114 @@
+"""Record phases of a run as spans and write them as a Chrome trace, viewable in Perfetto or chrome://tracing."""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Union
+
+CATEGORY = "raa"
+
+
+def now_us() -> int:
+    """Wall clock in microseconds, shared by every process writing to the same trace"""
+    return time.time_ns() // 1000
+
+
+class Tracer:
+    """Collect complete ("X") events of one process in memory until written"""
+
+    def __init__(self, filename: str, process_name: str):
+        self.filename = filename
+        self.pid = os.getpid()
+        self.events = [{
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": process_name},
+        }]
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: int, duration: int, category=CATEGORY, args: Union[dict, None] = None):
+        """Add a finished span, times in microseconds"""
+        thread = threading.current_thread()
+        event = {
+            "name": name, "cat": category, "ph": "X", "ts": start, "dur": duration,
+            "pid": self.pid, "tid": thread.native_id,
+        }
+        if args:
+            event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                             for key, value in args.items()}
+        with self.lock:
+            if thread.native_id not in self.threads:
+                self.threads.add(thread.native_id)
+                self.events.append({
+                    "name": "thread_name", "ph": "M", "pid": self.pid, "tid": thread.native_id,
+                    "args": {"name": thread.name},
+                })
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category=CATEGORY, **args):
+        start = now_us()
+        try:
+            yield
+        finally:
+            self.add(name, start, now_us() - start, category, args)
+
+    def write(self):
+        """Merge events into the trace file, other processes of the same test may have written it"""
+        events = []
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, "r", encoding="utf-8") as file:
+                    events = json.load(file)["traceEvents"]
+            except (ValueError, KeyError) as error:
+                logging.warning("Overwriting unreadable trace %s: %s", self.filename, error)
+        with self.lock:
+            events.extend(self.events)
+            self.events = []
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.filename, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        logging.info("Wrote trace to %s", self.filename)
+
+
+__tracer: Union[Tracer, None] = None
+
+
+def start_trace(filename: str, process_name: str, reset=False) -> Tracer:
+    """Start collecting spans of this process for a trace file, reset drops a previous run's trace"""
+    global __tracer
+    if reset and os.path.exists(filename):
+        os.remove(filename)
+    __tracer = Tracer(filename, process_name)
+    return __tracer
+
+
+def get_tracer() -> Union[Tracer, None]:
+    return __tracer
+
+
+def span(name: str, category=CATEGORY, **args):
+    """Context manager timing a phase, does nothing unless a trace was started"""
+    if __tracer is None:
+        return nullcontext()
+    return __tracer.span(name, category, **args)
+
+
+def flush_trace():
+    """Write spans collected so far and keep tracing, e.g. before the trace file is bundled"""
+    if __tracer is not None:
+        __tracer.write()
+
+
+def stop_trace():
+    """Write collected spans and stop tracing"""
+    global __tracer
+    if __tracer is None:
+        return
+    tracer, __tracer = __tracer, None
+    tracer.write()
@@ -0,0 +1,191 @@
+"""Client for the wpa_supplicant control interface, used to time authentication events."""
+
+import os
+import time
+import queue
+import socket
+import logging
+import threading
+import itertools
+from dataclasses import dataclass
+from typing import List, Union
+
+CTRL_DIR = "/var/run/wpa_supplicant"
+EVENT_EAP_STARTED = "CTRL-EVENT-EAP-STARTED"
+EVENT_EAP_SUCCESS = "CTRL-EVENT-EAP-SUCCESS"
+EVENT_EAP_FAILURE = "CTRL-EVENT-EAP-FAILURE"
+EVENT_CONNECTED = "CTRL-EVENT-CONNECTED"
+EVENT_DISCONNECTED = "CTRL-EVENT-DISCONNECTED"
+EVENTS = [
+    EVENT_EAP_STARTED,
+    EVENT_EAP_SUCCESS,
+    EVENT_EAP_FAILURE,
+    EVENT_CONNECTED,
+    EVENT_DISCONNECTED,
+]
+REQUEST_TIMEOUT = 5
+
+_client_ids = itertools.count()
+
+
+@dataclass
+class WpaEvent:
+    """wpa_supplicant event with the time it was received."""
+
+    name: str
+    text: str
+    timestamp: float
+    perf_counter: float
+
+    def to_dict(self):
+        """Convert the WpaEvent object to a dictionary for easier interpretation."""
+        return {"name": self.name, "text": self.text, "timestamp": self.timestamp}
+
+
+class WpaCtrlClient:
+    """Attach to the wpa_supplicant control socket of an interface and record events."""
+
+    def __init__(self, interface, ctrl_dir=CTRL_DIR):
+        self.interface = interface
+        self.ctrl_path = os.path.join(ctrl_dir, interface)
+        self.local_path = f"/tmp/raa_wpa_ctrl_{os.getpid()}_{next(_client_ids)}"
+        self.sock = None
+        self.thread = None
+        self.events: List[WpaEvent] = []
+        self.responses = queue.Queue()
+        self.new_event = threading.Condition()
+        self.closed = threading.Event()
+        # perf_counter time teardown began, later events are not counted in the summary
+        self.teardown = None
+
+    def connect(self, timeout=10, is_alive=None):
+        """Connect to the control socket, waiting for wpa_supplicant to create it."""
+        deadline = time.perf_counter() + timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if os.path.exists(self.local_path):
+            os.unlink(self.local_path)
+        self.sock.bind(self.local_path)
+        while True:
+            try:
+                self.sock.connect(self.ctrl_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if is_alive is not None and not is_alive():
+                    self.close()
+                    raise RuntimeError("wpa_supplicant ended before its control socket was ready") from e
+                if time.perf_counter() > deadline:
+                    self.close()
+                    raise RuntimeError(
+                        f"wpa_supplicant control socket {self.ctrl_path} not ready within {timeout} seconds"
+                    ) from e
+                time.sleep(0.05)
+        self.thread = threading.Thread(target=self.__receive, daemon=True)
+        self.thread.start()
+
+    def __receive(self):
+        """Receive events and command responses until the client is closed."""
+        while not self.closed.is_set():
+            try:
+                data = self.sock.recv(4096)
+            except OSError:
+                break
+            timestamp = time.time()
+            perf = time.perf_counter()
+            message = data.decode("utf-8", errors="replace").strip()
+            # Unsolicited events are prefixed with their level, e.g. "<3>CTRL-EVENT-CONNECTED ..."
+            if message.startswith("<") and ">" in message:
+                text = message.split(">", 1)[1]
+                name = text.split(" ", 1)[0]
+                if name in EVENTS:
+                    logging.debug("wpa_supplicant event: %s", text)
+                    with self.new_event:
+                        self.events.append(WpaEvent(name, text, timestamp, perf))
+                        self.new_event.notify_all()
+            else:
+                self.responses.put(message)
+
+    def request(self, command: str, timeout=REQUEST_TIMEOUT) -> str:
+        """Send a control command and return the response."""
+        self.sock.send(command.encode())
+        try:
+            return self.responses.get(timeout=timeout)
+        except queue.Empty as e:
+            raise RuntimeError(f'No response from wpa_supplicant to "{command}"') from e
+
+    def attach(self):
+        """Subscribe to wpa_supplicant events."""
+        response = self.request("ATTACH")
+        if response != "OK":
+            raise RuntimeError(f"wpa_supplicant ATTACH failed: {response}")
+
+    def wait_for_event(self, name: str, timeout=None, after=0.0) -> Union[WpaEvent, None]:
+        """Block until event name is received after perf_counter time after, None on timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+
+        def find():
+            for event in self.events:
+                if event.name == name and event.perf_counter >= after:
+                    return event
+            return None
+
+        with self.new_event:
+            while True:
+                event = find()
+                if event is not None:
+                    return event
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.new_event.wait(remaining)
+
+    def mark_teardown(self):
+        """Mark that the supplicant is being stopped, e.g. its own disconnect is not counted."""
+        self.teardown = time.perf_counter()
+
+    def close(self):
+        """Detach and close the control socket."""
+        self.closed.set()
+        if self.sock is not None:
+            try:
+                self.sock.send(b"DETACH")
+            except OSError:
+                pass
+            self.sock.close()
+        if os.path.exists(self.local_path):
+            os.unlink(self.local_path)
+
+    def get_summary(self) -> dict:
+        """Return authentication latency and reconnect counts from events before teardown."""
+        recorded = list(self.events)
+        events = [event for event in recorded if self.teardown is None or event.perf_counter < self.teardown]
+
+        def first(name, after=0.0):
+            for event in events:
+                if event.name == name and event.perf_counter >= after:
+                    return event
+            return None
+
+        def count(name):
+            return sum(1 for event in events if event.name == name)
+
+        eap_started = first(EVENT_EAP_STARTED)
+        auth_latency = None
+        connect_latency = None
+        if eap_started is not None:
+            eap_success = first(EVENT_EAP_SUCCESS, eap_started.perf_counter)
+            connected = first(EVENT_CONNECTED, eap_started.perf_counter)
+            if eap_success is not None:
+                auth_latency = eap_success.perf_counter - eap_started.perf_counter
+            if connected is not None:
+                connect_latency = connected.perf_counter - eap_started.perf_counter
+        return {
+            "auth_latency": auth_latency,
+            "connect_latency": connect_latency,
+            "eap_started": count(EVENT_EAP_STARTED),
+            "eap_success": count(EVENT_EAP_SUCCESS),
+            "eap_failure": count(EVENT_EAP_FAILURE),
+            "reauthentications": max(count(EVENT_EAP_STARTED) - 1, 0),
+            "reconnects": max(count(EVENT_CONNECTED) - 1, 0),
+            "disconnects": count(EVENT_DISCONNECTED),
+            "events": [event.to_dict() for event in recorded],
+        }
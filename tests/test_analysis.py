@@ -0,0 +1,43 @@
+"""Test the shared analysis context derives the same views as pcap_extract."""
+
+import json
+import shutil
+import src.files as files
+import src.pcap_extract as pe
+from src.analysis import AnalysisContext
+from test_metadata import create_metadata
+
+
+def test_analysis_context(tmp_path, monkeypatch, large_download_username, large_upload_username):
+    """Test the capture is parsed once and every client gets its own views."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    pcap_file = files.get_pcap_filename("test", root_dir)
+    shutil.copy("tests/data/pcaps/test_dl_5gb.tcpdump.radius.pcap", pcap_file)
+    metadata = create_metadata(large_download_username, "wlan0")
+    metadata.clients = [create_metadata(large_upload_username, "wlan1")]
+    with open(files.get_metadata_filename("test", root_dir), "w", encoding="utf-8") as file:
+        json.dump(metadata.get_dict(), file, default=str)
+
+    parsed = []
+    get_radius_packets = pe.get_radius_packets
+    monkeypatch.setattr(pe, "get_radius_packets", lambda *args: parsed.append(args) or get_radius_packets(*args))
+    analysis = AnalysisContext("test", root_dir)
+    assert analysis.client_count == 2
+    assert parsed == []
+    client, other = analysis.clients
+    assert analysis.clients is analysis.clients
+    assert parsed == [(pcap_file, 1812)]
+
+    assert client.metadata.username == large_download_username
+    assert other.packets == []
+    packets = pe.get_relevant_packets(pcap_file, large_download_username)
+    assert len(client.packets) == len(packets)
+    assert len(client.stop_packets) == len(pe.get_stop_packets(packets)) == 1
+    assert len(client.start_packets) == len(pe.get_start_packets(packets))
+    assert len(client.update_packets) == len(pe.get_update_packets(packets))
+    assert len(client.acct_session_ids) == len(client.accounting_requests)
+    assert client.output_octets[-1] == pe.get_total_output_octets(client.stop_packets[0])
+    assert client.output_octets == sorted(client.output_octets)
+    # Views are computed once and shared
+    assert client.stop_packets is client.stop_packets
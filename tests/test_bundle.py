@@ -0,0 +1,81 @@
+"""Test bundles written in parallel are read back by zipfile."""
+
+import os
+import zipfile
+import pytest
+import src.bundle as bundle
+import src.files as files
+
+
+@pytest.fixture
+def test_files(tmp_path) -> dict:
+    """Compressible and random files larger than a block, plus an empty one, by path."""
+    contents = {
+        os.path.join("logs", "test.freeradius.log"): b"rlm_sql: Executing query\n" * 100000,
+        os.path.join("pcap", "test.tcpdump.radius.pcap"): os.urandom(bundle.BLOCK_SIZE + 123),
+        os.path.join("config", "test.config.yaml"): b"",
+    }
+    paths = {}
+    for name, content in contents.items():
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(content)
+        paths[str(path)] = content
+    return paths
+
+
+@pytest.mark.parametrize("compression", bundle.COMPRESSIONS)
+def test_write_zip(tmp_path, test_files, compression):
+    """Test every compression method round trips through zipfile."""
+    zip_file_name = str(tmp_path / "test.bundle.zip")
+    members = bundle.write_zip(zip_file_name, list(test_files), str(tmp_path), compression, workers=3)
+    assert [member.data_file for member in members] == [None] * len(test_files)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".bundle.")]
+    with zipfile.ZipFile(zip_file_name) as zipf:
+        assert zipf.testzip() is None
+        for path, content in test_files.items():
+            info = zipf.getinfo(path.removeprefix(str(tmp_path)).lstrip("/"))
+            assert info.compress_type == bundle.METHODS[compression]
+            assert zipf.read(info) == content
+    if compression != bundle.STORED:
+        log = members[0]
+        assert log.compress_size < log.file_size / 10
+
+
+def test_write_zip64(tmp_path, test_files, monkeypatch):
+    """Test zip64 records, forced here by lowering the limits, are read by zipfile."""
+    monkeypatch.setattr(bundle, "ZIP64_LIMIT", 1000)
+    monkeypatch.setattr(bundle, "ZIP64_COUNT_LIMIT", 2)
+    zip_file_name = str(tmp_path / "test.bundle.zip")
+    bundle.write_zip(zip_file_name, list(test_files), str(tmp_path), bundle.DEFLATED)
+    with zipfile.ZipFile(zip_file_name) as zipf:
+        assert zipf.testzip() is None
+        assert [zipf.read(info) for info in zipf.infolist()] == list(test_files.values())
+
+
+def test_write_bundle_includes_logs(tmp_path):
+    """Test a test's logs and traces go into its bundle and the bundle can be appended to."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    for filename in [
+        files.get_metadata_filename("test", root_dir),
+        files.get_pcap_filename("test", root_dir),
+        files.get_freeradius_log_filename("test", root_dir),
+        files.get_wpasupplicant_log_filename("test", root_dir, "wlan1"),
+        files.get_trace_filename("test", root_dir),
+        files.get_freeradius_log_filename("test2", root_dir),
+    ]:
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write("test")
+    zip_file_name = bundle.write_bundle("test", root_dir)
+    with zipfile.ZipFile(zip_file_name, "a") as zipf:
+        zipf.writestr("logs/test.test_cases.prof", b"profile")
+    with zipfile.ZipFile(zip_file_name) as zipf:
+        assert sorted(zipf.namelist()) == [
+            "logs/test.freeradius.log",
+            "logs/test.test_cases.prof",
+            "logs/test.trace.json",
+            "logs/test.wlan1.wpasupplicant.log",
+            "metadata/test.metadata.json",
+            "pcap/test.tcpdump.radius.pcap",
+        ]
@@ -0,0 +1,38 @@
+"""Test expanding campaign matrices into test configurations."""
+
+from campaign import build_configs, expand_matrix
+
+
+def test_expand_matrix():
+    """Test every combination is produced, dict values set several options."""
+    matrix = {
+        "chunk_size": [1024, 65536],
+        "direction": [{"download_chunks": True, "upload_chunks": False},
+                      {"download_chunks": False, "upload_chunks": True}],
+        "sut_software": "1.0",
+    }
+    combinations = expand_matrix(matrix)
+    assert len(combinations) == 4
+    assert combinations[0] == {"chunk_size": 1024, "download_chunks": True, "upload_chunks": False,
+                               "sut_software": "1.0"}
+    assert combinations[3]["chunk_size"] == 65536 and combinations[3]["upload_chunks"]
+    assert expand_matrix(None) == [{}]
+
+
+def test_build_configs(tmp_path):
+    """Test runs get numbered names and matrix values override base options."""
+    campaign = {
+        "test_name": "fw",
+        "data_server_ip": "10.10.10.10",
+        "data_server_port": 8000,
+        "local_output_dir": str(tmp_path),
+        "chunks": 5,
+        "sut_software": "base",
+        "matrix": {"sut_software": ["1.0", "1.1"], "chunk_size": [1024]},
+    }
+    configs = build_configs(campaign)
+    assert [config.test_name for config in configs] == ["fw_001", "fw_002"]
+    assert [config.sut_software for config in configs] == ["1.0", "1.1"]
+    assert all(config.chunks == 5 and config.chunk_size == 1024 for config in configs)
+    assert all(config.local_output_directory == str(tmp_path) for config in configs)
+    assert configs[0].data_server_port == 8000
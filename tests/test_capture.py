@@ -0,0 +1,71 @@
+"""Test in-process AF_PACKET capture."""
+
+import socket
+import pytest
+from scapy.all import rdpcap, Radius
+import src.pcap_extract as pe
+from src.capture import RingCapture, udp_ports_filter, parse_tcpdump_stats, get_capture_health, BPF_RET_K
+
+RADIUS_PORT = 18120
+
+
+def can_capture():
+    try:
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+    except (PermissionError, AttributeError):
+        return False
+    return True
+
+
+def test_udp_ports_filter():
+    """Test every jump in the filter lands inside the program."""
+    program = udp_ports_filter([1812, 1813])
+    for i, (code, jt, jf, _) in enumerate(program):
+        if code != BPF_RET_K:
+            assert i + 1 + max(jt, jf) < len(program)
+    assert program[-1] == (BPF_RET_K, 0, 0, 0)
+
+
+@pytest.mark.skipif(not can_capture(), reason="AF_PACKET sockets need CAP_NET_RAW")
+def test_capture_loopback(tmp_path):
+    """Test only RADIUS packets on lo are captured, once each."""
+    pcap_file = str(tmp_path / "capture.pcap")
+    capture = RingCapture(pcap_file, str(tmp_path / "capture.log"), "lo", RADIUS_PORT)
+    capture.start()
+    request = bytes(Radius(code=4, id=7))
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _ in range(3):
+            sock.sendto(request, ("127.0.0.1", RADIUS_PORT + 1))
+        # Not a RADIUS port, the kernel filter drops it
+        sock.sendto(request, ("127.0.0.1", RADIUS_PORT + 2))
+    with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+        sock.sendto(request, ("::1", RADIUS_PORT))
+    capture.stop()
+
+    assert capture.writer.count == 4
+    assert capture.stats.packets_captured == 4
+    assert capture.stats.dropped == 0
+    # Requests were never answered
+    health = get_capture_health(capture.stats, pcap_file, RADIUS_PORT)
+    assert health["requests"] == 4
+    assert not health["reliable"]
+    assert len(rdpcap(pcap_file)) == 4
+    packets = pe.get_radius_packets(pcap_file, RADIUS_PORT)
+    assert len(packets) == 4
+    assert all(packet.id == 7 for packet in packets)
+
+
+def test_parse_tcpdump_stats():
+    """Test reading the statistics tcpdump prints on exit."""
+    output = (
+        "tcpdump: listening on eth0, link-type EN10MB (Ethernet), snapshot length 262144 bytes\n"
+        "388 packets captured\n"
+        "390 packets received by filter\n"
+        "2 packets dropped by kernel\n"
+    )
+    stats = parse_tcpdump_stats(output)
+    assert stats.packets_captured == 388
+    assert stats.packets_received == 390
+    assert stats.dropped == 2
+    assert stats.packets_dropped_by_interface is None
+    assert parse_tcpdump_stats("tcpdump: eth0: No such device exists\n") is None
@@ -0,0 +1,123 @@
+"""Test checks run without pytest over an analysed client session."""
+
+import dataclasses
+import json
+import os
+import shutil
+import pytest
+import src.checks as checks
+import src.files as files
+import src.pcap_extract as pe
+from src.analysis import AnalysisContext, ClientAnalysis
+from conftest import PCAPDIR
+from src.metadata import UsageCounter
+from test_metadata import create_metadata
+
+
+@pytest.fixture
+def download_client(large_download_pcap, large_download_username, large_download_duration) -> ClientAnalysis:
+    metadata = create_metadata(large_download_username, "wlan0")
+    metadata.session_duration = large_download_duration
+    packets = pe.get_packets_by_username(large_download_pcap, large_download_username)
+    octets = pe.get_total_output_octets(pe.get_stop_packets(packets)[0])
+    metadata.usage_download = UsageCounter(10, 20, 0, octets, "wlan0")
+    return ClientAnalysis(metadata, packets)
+
+
+def test_run_check_outcomes(download_client):
+    """Test passing, failing and skipped checks return structured results."""
+    result = checks.run_check("start_update_stop_present", download_client)
+    assert result.outcome == checks.PASSED
+    assert result.values == {"start": 1, "update": len(download_client.update_packets), "stop": 1}
+    assert result.context.startswith("Packet Count: Start: 1")
+
+    result = checks.run_check("output_tonnage_accuracy", download_client)
+    assert result.outcome == checks.PASSED
+    assert result.values["percentage_off"] == 0
+
+    download_client.metadata.session_duration = 30
+    result = checks.run_check("session_duration_accuracy", download_client)
+    assert result.outcome == checks.FAILED
+    assert "outside" in result.message
+
+    result = checks.run_check("input_tonnage_accuracy", download_client)
+    assert result.outcome == checks.SKIPPED
+    assert result.message == "No upload data"
+    assert result.to_dict()["category"] == checks.ACCURACY
+
+
+def test_run_check_error(download_client):
+    """Test an error in a check fails it, or propagates when asked to."""
+    download_client.metadata.usage_download = None
+    result = checks.run_check("output_tonnage_accuracy", download_client)
+    assert result.outcome == checks.FAILED
+    assert result.message.startswith("AttributeError")
+    with pytest.raises(AttributeError):
+        checks.run_check("output_tonnage_accuracy", download_client, raise_errors=True)
+
+
+def test_get_checks():
+    """Test checks are selected by marker and name."""
+    assert [check.name for check in checks.get_checks(["core_upload"])] == [
+        "in_gigaword_rolls_over", "input_tonnage_accuracy"
+    ]
+    assert [check.name for check in checks.get_checks(names=["cui_echoed"])] == ["cui_echoed"]
+    assert len(checks.get_checks()) == len(checks.CHECKS)
+    with pytest.raises(ValueError):
+        checks.get_checks(names=["no_such_check"])
+
+
+@pytest.fixture
+def stored_test(tmp_path, large_download_username, large_download_duration):
+    """Test name and root directory of a stored download test."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    shutil.copy(os.path.join(PCAPDIR, "test_dl_5gb.tcpdump.radius.pcap"), files.get_pcap_filename("test", root_dir))
+    metadata = create_metadata(large_download_username, "wlan0")
+    metadata.session_duration = large_download_duration
+    with open(files.get_metadata_filename("test", root_dir), "w", encoding="utf-8") as file:
+        json.dump(metadata.get_dict(), file, default=str)
+    return "test", root_dir
+
+
+def test_check_cache(stored_test, monkeypatch):
+    """Test results are reused until the check or the metadata changes."""
+    test_name, root_dir = stored_test
+    first = checks.run_checks(AnalysisContext(test_name, root_dir), ["core"], cache=checks.CheckCache(test_name, root_dir))
+    assert os.path.exists(files.get_check_results_filename(test_name, root_dir))
+
+    def no_parsing(*_):
+        raise AssertionError("Capture parsed although all results were cached")
+
+    monkeypatch.setattr(pe, "get_radius_packets", no_parsing)
+    cache = checks.CheckCache(test_name, root_dir)
+    second = checks.run_checks(AnalysisContext(test_name, root_dir), ["core"], cache=cache)
+    assert [result.to_dict() for result in second] == [result.to_dict() for result in first]
+    assert (cache.hits, cache.misses) == (len(first), 0)
+    monkeypatch.undo()
+
+    # A changed check is run again, the others are reused
+    monkeypatch.setitem(checks.CHECKS, "cui_echoed", dataclasses.replace(checks.CHECKS["cui_echoed"], version="2"))
+    cache = checks.CheckCache(test_name, root_dir)
+    checks.run_checks(AnalysisContext(test_name, root_dir), ["core"], cache=cache)
+    assert (cache.hits, cache.misses) == (len(first) - 1, 1)
+
+    # Changed metadata drops every result
+    with open(files.get_metadata_filename(test_name, root_dir), "a", encoding="utf-8") as file:
+        file.write("\n")
+    cache = checks.CheckCache(test_name, root_dir)
+    checks.run_checks(AnalysisContext(test_name, root_dir), ["core"], cache=cache)
+    assert (cache.hits, cache.misses) == (0, len(first))
+
+
+def test_code_hash_covers_helpers(monkeypatch):
+    """Test a check's hash changes with the helpers it calls and its version."""
+    registered = checks.CHECKS["input_packet_count_nonzero"]
+
+    def packet_count(result, packet_attributes):
+        result.values["packets"] = packet_attributes[0]
+
+    assert dataclasses.replace(registered).code_hash == registered.code_hash
+    assert dataclasses.replace(registered, version="2").code_hash != registered.code_hash
+    monkeypatch.setattr(checks, "__packet_count", packet_count)
+    assert dataclasses.replace(registered).code_hash != registered.code_hash
@@ -1,8 +1,10 @@
 """Test data transfer functionality using TCPServer."""
 
 import logging
+import socket
+import threading
 import pytest
-from src.data_transfer import TCPServer
+from src.data_transfer import TCPServer, TCPInfoPoller, SocketOptions, get_socket_options, drain_socket
 
 CHUNK_SIZE = 1000
 CHUNKS = 1000
@@ -45,3 +47,109 @@ def test_upload(data_server):
     upper = CHUNK_SIZE * CHUNKS * (1 + TEST_TOLERANCE)
     assert usage.bytes_sent > lower
     assert usage.bytes_sent < upper
+
+
+def test_tcp_info():
+    """Test TCP_INFO is read from a connected socket."""
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        conn, _ = server.accept()
+        with client, conn:
+            client.sendall(b"x" * CHUNK_SIZE)
+            conn.recv(CHUNK_SIZE)
+            poller = TCPInfoPoller(client, interval=0.01)
+            poller.start()
+            info = poller.stop()
+    assert info is not None
+    assert info.samples >= 2
+    assert info.snd_mss > 0
+    assert info.bytes_acked >= CHUNK_SIZE
+    assert "total_retrans" in info.to_dict()
+
+
+def test_drain_socket():
+    """Test the sender's final sample counts every byte once the receiver read them."""
+    size = CHUNK_SIZE * CHUNKS
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        conn, _ = server.accept()
+        # Reads until the sender's FIN
+        reader = threading.Thread(target=lambda: list(iter(lambda: conn.recv(size), b"")))
+        with client, conn:
+            poller = TCPInfoPoller(client)
+            poller.start()
+            client.sendall(b"x" * size)
+            reader.start()
+            assert drain_socket(client)
+            info = poller.stop()
+            reader.join()
+    assert info.unacked == 0
+    assert info.bytes_acked >= size
+
+
+def test_socket_options():
+    """Test socket options are applied and reported back."""
+    options = SocketOptions(sndbuf=65536, nodelay=True, congestion="cubic", tos=0x20)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        options.apply(sock)
+        applied = get_socket_options(sock)
+    # Linux doubles the requested buffer size for bookkeeping overhead.
+    assert applied["sndbuf"] >= 65536
+    assert applied["nodelay"] is True
+    assert applied["congestion"] == "cubic"
+    assert applied["tos"] == 0x20
+
+
+def test_upload_process_mode():
+    """Test the upload functionality with transfer endpoints in worker processes."""
+    server = TCPServer(
+        dst_host="127.0.0.1",
+        dst_port=8001,
+        listen_port=8001,
+        chunk_size=CHUNK_SIZE,
+        chunks=CHUNKS,
+        client_iface=CLIENT_IFACE,
+        transfer_mode="process",
+    )
+    server.start(download=False)
+    usage = server.transfer_data()
+    assert usage.bytes_sent > CHUNK_SIZE * CHUNKS
+    # The receiver got every byte, and the sender's sample was taken once all of them were ACKed,
+    # both counters include the SYN
+    assert server.tcp_info["server"].bytes_received > CHUNK_SIZE * CHUNKS
+    assert server.tcp_info["client"].bytes_acked > CHUNK_SIZE * CHUNKS
+
+
+def test_start_invalid_socket_options():
+    """Test options the kernel rejects fail start() instead of hanging it."""
+    server = TCPServer("127.0.0.1", 8002, 8002, CHUNK_SIZE, CHUNKS,
+                       socket_options=SocketOptions(congestion="no-such-algorithm"))
+    with pytest.raises(ValueError, match="no-such-algorithm"):
+        server.start()
+
+
+def test_start_server_error(monkeypatch):
+    """Test an error in the server thread is raised by start()."""
+    apply = SocketOptions.apply
+    calls = []
+
+    def fail_in_server(options, sock):
+        calls.append(sock)
+        if len(calls) > 1:
+            raise OSError("rejected by the server socket")
+        apply(options, sock)
+
+    monkeypatch.setattr(SocketOptions, "apply", fail_in_server)
+    server = TCPServer("127.0.0.1", 8003, 8003, CHUNK_SIZE, CHUNKS)
+    with pytest.raises(OSError, match="rejected by the server socket"):
+        server.start()
+
+
+def test_process_mode_client_error():
+    """Test a client worker's error is raised in the parent."""
+    server = TCPServer("127.0.0.1", 8004, 8004, CHUNK_SIZE, CHUNKS, client_iface=CLIENT_IFACE,
+                       transfer_mode="process")
+    server.download = True
+    # No server listens on the port
+    with pytest.raises(ConnectionRefusedError):
+        server.transfer_data()
@@ -27,10 +27,14 @@ def test_file_creation():
         files.get_metadata_filename(test_name=test_name, root_dir=root_dir),
         files.get_pcap_filename(test_name=test_name, root_dir=root_dir),
         files.get_report_filename(test_name=test_name, root_dir=root_dir),
+        files.get_html_report_filename(test_name=test_name, root_dir=root_dir),
+        files.get_results_filename(test_name=test_name, root_dir=root_dir),
         files.get_config_filename(test_name=test_name, root_dir=root_dir),
         files.get_freeradius_log_filename(test_name=test_name, root_dir=root_dir),
         files.get_wpasupplicant_log_filename(test_name=test_name, root_dir=root_dir),
         files.get_tcpdump_log_filename(test_name=test_name, root_dir=root_dir),
+        files.get_trace_filename(test_name=test_name, root_dir=root_dir),
+        files.get_check_results_filename(test_name=test_name, root_dir=root_dir),
         files.get_zipped_bundle_filename(test_name=test_name, root_dir=root_dir),
     ]
     # Create files
@@ -0,0 +1,126 @@
+"""Test jobs are queued, run and cancelled through their state files."""
+
+import os
+import subprocess
+import threading
+import pytest
+import src.files as files
+import src.jobs as jobs
+from src.testbed_setup import get_testconfig
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch) -> jobs.JobManager:
+    """Manager whose submits do not start a worker, tests run the queue themselves."""
+    monkeypatch.setattr(jobs.JobManager, "start_worker", lambda self: None)
+    return jobs.JobManager(files.get_jobs_dir(str(tmp_path)))
+
+
+def get_config(tmp_path, test_name="test") -> dict:
+    """Config of a test that neither captures nor runs test cases."""
+    config = get_testconfig(test_name, "127.0.0.1", 8000, {}, {})
+    config.local_output_directory = str(tmp_path / "output")
+    config.generate_pcap = False
+    config.generate_report = False
+    return config.__to_dict__()
+
+
+def test_submit_and_cancel_queued(tmp_path, manager):
+    """Test jobs are listed in submit order and a queued job is cancelled without running."""
+    first = manager.submit(get_config(tmp_path, "first"))
+    second = manager.submit(get_config(tmp_path, "second"))
+    assert [job.test_name for job in manager.list_jobs()] == ["first", "second"]
+    assert manager.cancel(first.id).state == jobs.CANCELLED
+    states = {job.id: job.state for job in jobs.JobManager(manager.jobs_dir).list_jobs()}
+    assert states == {first.id: jobs.CANCELLED, second.id: jobs.QUEUED}
+
+
+def test_work(tmp_path, manager):
+    """Test the worker runs queued jobs to the end and skips cancelled ones."""
+    cancelled = manager.submit(get_config(tmp_path, "cancelled"))
+    manager.cancel(cancelled.id)
+    job = manager.submit(get_config(tmp_path))
+    manager.work()
+    job = manager.load(job.id)
+    assert job.state == jobs.FINISHED
+    assert job.exit_code == 0
+    assert job.phase == "done"
+    assert manager.load(cancelled.id).started is None
+    assert os.path.exists(files.get_config_filename("test", job.root_dir))
+    log, offset = manager.read_log(job.id)
+    assert "Job finished" in log
+    assert offset == os.path.getsize(manager.get_log_filename(job.id))
+
+
+def test_read_log_incremental(manager):
+    """Test the log is read from an offset and a line still being written is left for later."""
+    with open(manager.get_log_filename("job"), "w", encoding="utf-8") as log:
+        log.write("first\nsec")
+    text, offset = manager.read_log("job")
+    assert text == "first\n"
+    with open(manager.get_log_filename("job"), "a", encoding="utf-8") as log:
+        log.write("ond\n")
+    assert manager.read_log("job", offset) == ("second\n", offset + 7)
+    assert manager.read_log("missing", 5) == ("", 5)
+
+
+def test_dead_job_failed(tmp_path, manager):
+    """Test a running job whose process is gone is marked failed."""
+    job = manager.submit(get_config(tmp_path))
+    # Highest pid Linux hands out by default, not running here
+    manager.update(job.id, state=jobs.RUNNING, pid=4194304)
+    job = manager.list_jobs()[0]
+    assert job.state == jobs.FAILED
+    assert job.error
+
+
+def test_update_keeps_concurrent_changes(tmp_path, manager):
+    """Test a cancel is not lost while the job keeps writing its phase."""
+    job = manager.submit(get_config(tmp_path))
+    manager.update(job.id, state=jobs.RUNNING)
+
+    def write_phases():
+        for phase in range(300):
+            manager.update(job.id, phase=str(phase))
+
+    thread = threading.Thread(target=write_phases)
+    thread.start()
+    manager.cancel(job.id)
+    thread.join()
+    job = manager.load(job.id)
+    assert job.cancel_requested
+    assert job.phase == "299"
+
+
+def test_cancel_while_starting(tmp_path, manager, monkeypatch):
+    """Test a job cancelled while its process starts is stopped instead of marked running."""
+    job = manager.submit(get_config(tmp_path))
+    popen = subprocess.Popen
+
+    def cancel_then_popen(*args, **kwargs):
+        manager.cancel(job.id)
+        return popen(*args, **kwargs)
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", cancel_then_popen)
+    manager.work()
+    job = manager.load(job.id)
+    assert job.state == jobs.CANCELLED
+    assert job.started is None
+
+
+def test_reaped_job_finished_without_error(tmp_path, manager, monkeypatch):
+    """Test a job listed as dead right after its process exited ends finished, with no error."""
+    job = manager.submit(get_config(tmp_path))
+
+    class ListedOnExit(subprocess.Popen):
+        def poll(self):
+            returncode = super().poll()
+            if returncode is not None:
+                assert manager.list_jobs()[0].state == jobs.FAILED
+            return returncode
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", ListedOnExit)
+    manager.work()
+    job = manager.load(job.id)
+    assert job.state == jobs.FINISHED
+    assert job.error == ""
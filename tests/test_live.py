@@ -0,0 +1,74 @@
+"""Test live samples are written during a run and read back incrementally for charts."""
+
+import json
+import src.radius as radius
+from src.live import LiveSampler, LiveSeries, ChartColumns, read_samples, ACCOUNTING, COUNTERS
+from src.observer import RadiusObserver, RadiusEvent
+
+
+def accounting_event(timestamp: float, input_octets: int, output_octets: int) -> RadiusEvent:
+    return RadiusEvent(
+        timestamp, radius.ACCOUNTING_REQUEST, 1, ("10.0.0.2", 40000), "raauser",
+        radius.ACCT_STATUS_INTERIM, input_octets, output_octets,
+    )
+
+
+def test_sampler(tmp_path):
+    """Test counters of the client interface and new accounting usage are written once each."""
+    filename = str(tmp_path / "test.live.jsonl")
+    observer = RadiusObserver(str(tmp_path / "missing.pcap"))
+    observer.events.append(RadiusEvent(1.0, radius.ACCESS_REQUEST, 1, ("10.0.0.2", 40000), "raauser"))
+    sampler = LiveSampler(filename, {"lo": "raauser", "missing0": "other"}, observer, interval=60)
+    sampler.start()
+    observer.events.append(accounting_event(2.0, 100, 200))
+    sampler.stop()
+    records, offset = read_samples(filename)
+    counters = [record for record in records if record["kind"] == COUNTERS]
+    assert [record["interface"] for record in counters] == ["lo", "lo"]
+    assert counters[0]["bytes_sent"] == counters[0]["bytes_recv"] == 0
+    assert [record for record in records if record["kind"] == ACCOUNTING] == [{
+        "kind": ACCOUNTING, "time": 2.0, "interface": "lo", "username": "raauser",
+        "status": "interim", "input_octets": 100, "output_octets": 200,
+    }]
+    assert read_samples(filename, offset) == ([], offset)
+
+
+def test_series(tmp_path):
+    """Test charts and lag grow with each refresh and a partly written line waits for the next."""
+    filename = tmp_path / "test.live.jsonl"
+    records = [
+        {"kind": COUNTERS, "time": 10.0, "interface": "wlan0", "bytes_sent": 0, "bytes_recv": 0},
+        {"kind": COUNTERS, "time": 12.0, "interface": "wlan0", "bytes_sent": 500000, "bytes_recv": 1000000},
+        {"kind": ACCOUNTING, "time": 13.0, "interface": "wlan0", "username": "raauser", "status": "interim",
+         "input_octets": 400000, "output_octets": 900000},
+    ]
+    filename.write_text("".join(json.dumps(record) + "\n" for record in records[:2]) + '{"kind"')
+    series = LiveSeries(str(filename))
+    assert series.refresh() == 2
+    assert series.throughput["value"] == [2.0, 4.0]
+    assert series.get_lag()["wlan0"] == {
+        "report_age": None, "unreported_upload": 500000, "unreported_download": 1000000,
+    }
+    filename.write_text("".join(json.dumps(record) + "\n" for record in records))
+    assert series.refresh() == 1
+    assert series.octets["elapsed"][-2:] == [3.0, 3.0]
+    assert series.octets["series"][-2:] == ["wlan0 upload (reported)", "wlan0 download (reported)"]
+    assert series.get_lag()["wlan0"] == {
+        "report_age": 0.0, "unreported_upload": 100000, "unreported_download": 100000,
+    }
+
+
+def test_chart_columns_downsampled():
+    """Test points older than the window are merged per resolution seconds and the chart stays bounded."""
+    rate = ChartColumns(mean=True, window=10, resolution=5)
+    total = ChartColumns(window=10, resolution=5)
+    for second in range(1000):
+        rate.append(float(second), "wlan0 upload", float(second % 5))
+        total.append(float(second), "wlan0 upload", float(second))
+    assert len(rate) == len(total) < 1000 / 5 + 15
+    columns = rate.to_dict()
+    assert columns["elapsed"][:2] == [4.0, 9.0]
+    assert columns["value"][:2] == [2.0, 2.0]
+    assert columns["elapsed"][-11:] == [float(second) for second in range(989, 1000)]
+    assert total.to_dict()["value"][:2] == [4.0, 9.0]
+    assert columns["elapsed"] == sorted(columns["elapsed"])
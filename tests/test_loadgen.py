@@ -0,0 +1,50 @@
+"""Test the RADIUS load generator against the built-in server."""
+
+import asyncio
+import pytest
+from src.loadgen import LoadConfig, run_load, split_octets
+from src.radius_server import RadiusServer
+
+PORT = 18400
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = RadiusServer(str(tmp_path / "radius.log"), port=PORT, host="127.0.0.1",
+                          users={"raauser": "secret"})
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_split_octets():
+    """Test 64-bit counters roll over into gigawords."""
+    assert split_octets(2**32 - 1) == (2**32 - 1, 0)
+    assert split_octets(2**32) == (0, 1)
+    assert split_octets(5 * 2**32 + 7) == (7, 5)
+
+
+def test_run_load(server):
+    """Test every session authenticates and sends Start, Interim-Updates and Stop."""
+    sessions = 300
+    config = LoadConfig(
+        radius_port=PORT, sessions=sessions, clients=2, interim_interval=0.4,
+        session_duration=1, ramp=0.2, timeout=1, initial_octets=2**32 - 1000,
+    )
+    result = asyncio.run(run_load(config))
+    assert result.completed_sessions == sessions
+    assert result.accepts == sessions
+    assert result.timeouts == result.invalid_responses == 0
+    counts = {name: len(values) for name, values in result.latencies.items()}
+    assert counts == {"access": sessions, "start": sessions, "interim": 2 * sessions, "stop": sessions}
+    assert server.counters["accounting_requests"] == 4 * sessions
+    assert result.to_dict()["latency_ms"]["stop"]["count"] == sessions
+
+
+def test_run_load_rejected(server):
+    """Test rejected sessions do not send accounting."""
+    config = LoadConfig(radius_port=PORT, sessions=5, password="wrong", session_duration=0.1, ramp=0)
+    result = asyncio.run(run_load(config))
+    assert result.rejects == 5
+    assert result.completed_sessions == 0
+    assert server.counters["accounting_requests"] == 0
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime
+from src.data_transfer import UsageCounter
+from src.metadata import Metadata, metadata_from_dict
+from src.testbed_setup import get_testconfig
+
+
+def create_metadata(username, interface):
+    return Metadata(
+        username=username,
+        session_duration=30,
+        chunk_size="1024",
+        chunks="10",
+        sut_brand="brand",
+        sut_hardware="hardware",
+        sut_software="software",
+        start_time=datetime(2024, 1, 1, 12, 0, 0),
+        end_time=datetime(2024, 1, 1, 12, 0, 30),
+        uploaded=False,
+        downloaded=True,
+        radius_port=1812,
+        usage_download=UsageCounter(10, 20, 10240, 400, "wlan0"),
+        client_interface=interface,
+    )
+
+
+def test_multi_client_metadata_round_trip():
+    """Test per-client metadata survives conversion to JSON and back."""
+    metadata = create_metadata("user0", "wlan0")
+    metadata.clients = [create_metadata("user1", "wlan1")]
+    converted = metadata_from_dict(json.loads(json.dumps(metadata.get_dict())))
+    clients = converted.get_all_clients()
+    assert [client.username for client in clients] == ["user0", "user1"]
+    assert [client.client_interface for client in clients] == ["wlan0", "wlan1"]
+    assert clients[1].usage_download == metadata.clients[0].usage_download
+    assert clients[1].clients == []
+
+
+def test_single_client_metadata_without_clients():
+    """Test metadata written before multi-client support is still readable."""
+    metadata_dict = create_metadata("user0", "wlan0").get_dict()
+    metadata_dict.pop("clients")
+    metadata_dict.pop("client_interface")
+    converted = metadata_from_dict(metadata_dict)
+    assert converted.get_all_clients() == [converted]
+
+
+def test_all_client_interfaces():
+    """Test client_iface is used when no client interfaces are given."""
+    config = get_testconfig("test", "127.0.0.1", 8000, {}, {})
+    assert config.all_client_interfaces == [config.client_interface]
+    config.client_interfaces = ["wlan1", "wlan2"]
+    assert config.all_client_interfaces == ["wlan1", "wlan2"]
@@ -0,0 +1,39 @@
+"""Test waiting for interface addresses."""
+
+import socket
+import pytest
+import src.netlink as netlink
+
+
+def test_interface_exists():
+    """Test interface lookup without forking ip(8)."""
+    assert netlink.interface_exists("lo")
+    assert not netlink.interface_exists("raatest-missing0")
+
+
+def test_wait_for_existing_address():
+    """Test an address that is already present is seen right away."""
+    timestamp = netlink.wait_for_address_netlink("lo", timeout=2)
+    assert timestamp > 0
+
+
+def test_wait_for_address_timeout():
+    """Test waiting for an address that never shows up times out."""
+    # Only the host-scope ::1 exists on lo, it is not a usable IPv6 address.
+    with pytest.raises(TimeoutError):
+        netlink.wait_for_address("lo", timeout=0.2, families=(socket.AF_INET6,))
+
+
+def test_wait_for_address_polling():
+    """Test polling fallback."""
+    assert netlink.wait_for_address_polling("lo", timeout=2) > 0
+
+
+def test_parse_messages():
+    """Test splitting a netlink datagram into messages."""
+    payload = netlink.IFADDRMSG.pack(socket.AF_INET, 24, 0, 0, 7)
+    message = netlink.NLMSGHDR.pack(netlink.NLMSGHDR.size + len(payload), netlink.RTM_NEWADDR, 0, 0, 0)
+    messages = list(netlink.parse_messages((message + payload) * 2))
+    assert messages == [(netlink.RTM_NEWADDR, payload)] * 2
+    assert netlink.is_usable_address(payload, 7, (socket.AF_INET,))
+    assert not netlink.is_usable_address(payload, 8, (socket.AF_INET,))
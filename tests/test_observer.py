@@ -0,0 +1,94 @@
+"""Test following a capture for accounting events while it is written."""
+
+import socket
+import threading
+import time
+import pytest
+import src.radius as radius
+from src.capture import RingCapture
+from src.observer import RadiusObserver, get_total_octets
+from src.pcap_file import PcapWriter
+from src.pcapgen import udp_frame
+from src.radius_server import RadiusServer, SECRET
+
+RADIUS_PORT = 18900
+NAS = socket.inet_aton("10.0.0.2")
+SERVER = socket.inet_aton("10.0.0.1")
+
+
+def accounting(identifier: int, status: int, username="raauser") -> radius.RadiusPacket:
+    packet = radius.RadiusPacket(radius.ACCOUNTING_REQUEST, identifier)
+    packet.add(radius.USER_NAME, username)
+    packet.add(radius.ACCT_STATUS_TYPE, status)
+    return packet
+
+
+def write_exchange(writer: PcapWriter, identifier: int, status: int, timestamp: int, answer=True):
+    """Write an Accounting-Request and optionally its response"""
+    request = accounting(identifier, status)
+    data = radius.encode_accounting_request(request, SECRET.encode())
+    writer.write(udp_frame(NAS, SERVER, 40000, RADIUS_PORT + 1, data), timestamp, 0)
+    if answer:
+        response = radius.RadiusPacket(radius.ACCOUNTING_RESPONSE, identifier)
+        data = radius.encode_response(response, request.authenticator, SECRET.encode())
+        writer.write(udp_frame(SERVER, NAS, RADIUS_PORT + 1, 40000, data), timestamp, 500)
+    writer.flush()
+
+
+def test_wait_for_accounting(tmp_path):
+    """Test waits return once the response is written and respect the time filter."""
+    pcap_file = str(tmp_path / "capture.pcap")
+    observer = RadiusObserver(pcap_file, RADIUS_PORT, poll_interval=0.01)
+    observer.start()
+    with PcapWriter(pcap_file) as writer:
+        write_exchange(writer, 1, radius.ACCT_STATUS_START, 100)
+        assert observer.wait_for_accounting("raauser", "start", timeout=5).timestamp == 100
+        # Unanswered requests and retransmissions do not count
+        write_exchange(writer, 2, radius.ACCT_STATUS_INTERIM, 110, answer=False)
+        write_exchange(writer, 2, radius.ACCT_STATUS_INTERIM, 111, answer=False)
+        assert observer.wait_for_accounting("raauser", "interim", timeout=0.2) is None
+        timer = threading.Timer(0.1, write_exchange, (writer, 3, radius.ACCT_STATUS_INTERIM, 120))
+        timer.start()
+        event = observer.wait_for_accounting("raauser", "interim", after=115, timeout=5)
+        timer.join()
+    observer.stop()
+    assert event.identifier == 3 and event.answered
+    assert observer.wait_for_accounting("raauser", "interim", after=130, timeout=1) is None
+    assert len(observer.events) == 3
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_PACKET"), reason="AF_PACKET sockets need Linux")
+def test_follow_ring_capture(tmp_path):
+    """Test the afpacket engine writes records the observer can follow live."""
+    pcap_file = str(tmp_path / "capture.pcap")
+    try:
+        capture = RingCapture(pcap_file, str(tmp_path / "capture.log"), "lo", RADIUS_PORT)
+        capture.start()
+    except PermissionError:
+        pytest.skip("AF_PACKET sockets need CAP_NET_RAW")
+    server = RadiusServer(str(tmp_path / "radius.log"), port=RADIUS_PORT, host="127.0.0.1")
+    server.start()
+    observer = RadiusObserver(pcap_file, RADIUS_PORT, poll_interval=0.01)
+    observer.start()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            data = radius.encode_accounting_request(accounting(9, radius.ACCT_STATUS_STOP), SECRET.encode())
+            sock.sendto(data, ("127.0.0.1", RADIUS_PORT + 1))
+            sock.recv(4096)
+        begin = time.perf_counter()
+        event = observer.wait_for_accounting("raauser", "stop", timeout=5)
+        assert event is not None and event.response_code == radius.ACCOUNTING_RESPONSE
+        assert time.perf_counter() - begin < 2
+    finally:
+        observer.stop()
+        server.stop()
+        capture.stop()
+
+
+def test_total_octets():
+    """Test usage includes gigawords and is None without octets."""
+    packet = accounting(1, radius.ACCT_STATUS_INTERIM)
+    assert get_total_octets(packet, radius.ACCT_INPUT_OCTETS, radius.ACCT_INPUT_GIGAWORDS) is None
+    packet.add(radius.ACCT_INPUT_OCTETS, 5)
+    packet.add(radius.ACCT_INPUT_GIGAWORDS, 2)
+    assert get_total_octets(packet, radius.ACCT_INPUT_OCTETS, radius.ACCT_INPUT_GIGAWORDS) == (2 << 32) + 5
@@ -0,0 +1,57 @@
+"""Test payload sources for data transfers."""
+
+import tracemalloc
+import zlib
+import pytest
+from src.payload import PayloadSource
+
+
+def test_chunk_larger_than_buffer():
+    """Test a chunk larger than the buffer is made up of buffer slices."""
+    payload = PayloadSource("random", buffer_size=1000)
+    sizes = [len(data) for data in payload.chunk(2500)]
+    assert sizes == [1000, 1000, 500]
+
+
+def test_large_chunk_bounded_memory():
+    """Test memory stays bounded for very large chunk sizes."""
+    payload = PayloadSource("zeros", buffer_size=4096)
+    chunk = payload.chunk(2 * 1024 * 1024 * 1024)
+    assert len(next(chunk)) == 4096
+    assert len(payload.buffer) == 4096
+
+
+def test_zeros_compressible():
+    """Test zeros payload compresses and random payload does not."""
+    zeros = bytes(next(PayloadSource("zeros", buffer_size=10000).chunk(10000)))
+    rand = bytes(next(PayloadSource("random", buffer_size=10000).chunk(10000)))
+    assert len(zlib.compress(zeros)) < 100
+    assert len(zlib.compress(rand)) > 9000
+
+
+def test_prng_refreshed():
+    """Test prng payload changes between sends."""
+    payload = PayloadSource("prng", buffer_size=1000)
+    first, second = [bytes(data) for data in payload.chunk(2000)]
+    assert first != second
+
+
+def test_unknown_mode():
+    """Test unknown payload mode is rejected."""
+    with pytest.raises(ValueError):
+        PayloadSource("unknown")
+
+
+
+def test_prng_sends_cheap_and_distinct():
+    """Test prng sends never repeat and reuse one bounded buffer, without allocating per send."""
+    payload = PayloadSource("prng", buffer_size=4096)
+    sends = {zlib.crc32(data) for data in payload.chunk(1000 * 4096)}
+    assert len(sends) == 1000
+    assert len(payload.buffer) == 2 * 4096
+    tracemalloc.start()
+    for data in payload.chunk(10000 * 4096):
+        zlib.crc32(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 4096
@@ -84,3 +84,27 @@ class TestPcapExtract:
         out_octets = pe.get_total_output_octets(down_packets[0])
         assert in_octets == 5682070141
         assert out_octets == 5682218308
+
+    def test_capture_complete(self, large_download_pcap):
+        """Test every request in a clean capture is answered."""
+        completeness = pe.get_capture_completeness(large_download_pcap)
+        assert completeness["requests"] == completeness["responses"] == 194
+        assert completeness["complete"]
+
+    def test_capture_incomplete(self, large_download_pcap):
+        """Test dropped packets show up as unanswered requests and missing identifiers."""
+        requests = pe.get_packets_by_codes(large_download_pcap, 1, 4)
+        dropped = {id(requests[10]), id(requests[11])}
+        # Drop two requests, and the response to a third one
+        packets = [packet for packet in large_download_pcap if id(packet) not in dropped]
+        answered = requests[20]
+        responses = [
+            packet for packet in packets
+            if packet.code in (2, 5, 11) and packet.id == answered.id
+        ]
+        packets.remove(responses[0])
+        completeness = pe.get_capture_completeness(packets)
+        assert not completeness["complete"]
+        assert len(completeness["unanswered_requests"]) == 1
+        assert completeness["unmatched_responses"] == 2
+        assert completeness["missing_identifiers"] == sorted([requests[10].id, requests[11].id])
@@ -0,0 +1,63 @@
+"""Test synthetic captures match their ground truth."""
+
+import json
+import pytest
+import src.pcap_extract as pe
+from src.pcapgen import PcapGenConfig, generate, parse_size, get_ground_truth_filename, main
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("pcapgen")
+    pcap_file = str(directory / "synthetic.pcap")
+    config = PcapGenConfig(sessions=40, users=5, concurrency=15, max_interims=4,
+                           retransmission_ratio=0.1, out_of_order_ratio=0.1, seed=1)
+    truth = generate(pcap_file, str(directory / "synthetic.truth.json"), config)
+    return pcap_file, truth
+
+
+def test_parse_size():
+    """Test human readable sizes."""
+    assert parse_size("1048576") == 2**20
+    assert parse_size("500K") == 500 * 2**10
+    assert parse_size("1.5GB") == 3 * 2**29
+
+
+def unique(packets):
+    """Drop retransmitted copies of the same request."""
+    return list({bytes(packet): packet for packet in packets}.values())
+
+
+def test_ground_truth_counts(synthetic):
+    """Test pcap_extract finds what the generator wrote."""
+    pcap_file, truth = synthetic
+    packets = pe.get_radius_packets(pcap_file)
+    assert len(packets) == truth["radius_packets"]
+    assert truth["noise_packets"] > 0 and truth["retransmissions"] > 0 and truth["out_of_order"] > 0
+    assert len(unique(pe.get_start_packets(packets))) == truth["status_types"]["start"]
+    assert len(unique(pe.get_update_packets(packets))) == truth["status_types"]["interim"]
+    for username, expected in truth["users"].items():
+        user_packets = pe.get_packets_by_username(packets, username)
+        assert len(user_packets) == expected["packets"]
+        stops = unique(pe.get_stop_packets(user_packets))
+        assert len(stops) == expected["stop"]
+        assert sum(pe.get_total_input_octets(packet) for packet in stops) == expected["input_octets"]
+        assert sum(pe.get_total_output_octets(packet) for packet in stops) == expected["output_octets"]
+
+
+def test_capture_complete(synthetic):
+    """Test retransmissions and noise do not look like capture loss."""
+    pcap_file, _ = synthetic
+    completeness = pe.get_capture_completeness(pe.get_radius_packets(pcap_file))
+    assert completeness["complete"]
+
+
+def test_size_limit(tmp_path):
+    """Test a capture limited by --size with lots of noise still matches its ground truth."""
+    pcap_file = str(tmp_path / "sized.pcap")
+    main([pcap_file, "--size", "300K", "--noise_ratio", "0.9", "--concurrency", "50", "--seed", "2"])
+    with open(get_ground_truth_filename(pcap_file), encoding="utf-8") as file:
+        truth = json.load(file)
+    assert truth["config"]["size"] == 300 * 2**10
+    assert truth["noise_packets"] > 0
+    assert len(pe.get_radius_packets(pcap_file)) == truth["radius_packets"]
@@ -0,0 +1,45 @@
+"""Test background commands and their readiness probes."""
+
+import os
+import time
+import pytest
+from src.processes import Command
+
+LOG_DIR = "/tmp/raatest_processes"
+
+
+@pytest.fixture
+def log_file(request):
+    """Return a fresh log file for a test."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    path = os.path.join(LOG_DIR, f"{request.node.name}.log")
+    if os.path.exists(path):
+        os.remove(path)
+    return path
+
+
+def test_ready_pattern(log_file):
+    """Test start returns as soon as the ready pattern is logged."""
+    cmd = Command("ready", ["sh", "-c", "sleep 0.2; echo ready now; sleep 5"], log_file,
+                  ready_pattern="ready now", ready_timeout=5)
+    begin = time.perf_counter()
+    cmd.start()
+    elapsed = time.perf_counter() - begin
+    cmd.stop()
+    assert elapsed < 3
+
+
+def test_ready_pattern_ignores_old_log(log_file):
+    """Test the ready pattern is only looked for in output of the current run."""
+    with open(log_file, "w", encoding="utf-8") as log:
+        log.write("ready now\n")
+    cmd = Command("old log", ["sleep", "5"], log_file, ready_pattern="ready now", ready_timeout=0.5)
+    with pytest.raises(RuntimeError, match="not ready within"):
+        cmd.start()
+
+
+def test_exit_before_ready(log_file):
+    """Test a clear error if the command exits before it is ready."""
+    cmd = Command("exits", ["sh", "-c", "exit 3"], log_file, ready_pattern="never", ready_timeout=5)
+    with pytest.raises(RuntimeError, match="return code 3"):
+        cmd.start()
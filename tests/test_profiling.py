@@ -0,0 +1,83 @@
+"""Test phase profiles and their place in the bundle."""
+
+import os
+import pstats
+import threading
+from zipfile import ZipFile
+import src.files as files
+from src.profiling import Profiler, add_to_bundle, PROFILE_THREADS
+
+
+def busy_thread_work(results=None):
+    total = sum(i * i for i in range(20000))
+    if results is not None:
+        results.append(total)
+    return total
+
+
+def run_phase():
+    thread = threading.Thread(target=busy_thread_work)
+    thread.start()
+    thread.join()
+    return [bytearray(1024) for _ in range(100)]
+
+
+def test_profile_phase(tmp_path):
+    """Test a phase writes stats that include threads it started where supported, and a memory summary."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    profiler = Profiler("test", root_dir, enabled=False, memory=True)
+    with profiler.phase("generate_pcap"):
+        run_phase()
+    stats = pstats.Stats(files.get_profile_filename("test", root_dir, "generate_pcap"))
+    assert any(function == "busy_thread_work" for _, _, function in stats.stats) == PROFILE_THREADS
+    with open(files.get_profile_summary_filename("test", root_dir, "generate_pcap"), encoding="utf-8") as file:
+        summary = file.read()
+    assert "Phase generate_pcap of test" in summary
+    assert "Memory: peak" in summary
+
+
+def test_threads_run_during_phase(tmp_path):
+    """Test threads started inside a phase run their target, whether or not they are profiled."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    results = []
+    with Profiler("test", root_dir).phase("generate_pcap"):
+        threads = [threading.Thread(target=busy_thread_work, args=(results,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(results) == 3
+
+
+def test_profile_disabled(tmp_path):
+    """Test nothing is written unless profiling is enabled."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    with Profiler("test", root_dir, enabled=False).phase("test_cases"):
+        run_phase()
+    assert files.get_profile_files("test", root_dir) == []
+
+
+def test_add_to_bundle(tmp_path):
+    """Test profiles written after zipping are added once."""
+    root_dir = str(tmp_path)
+    files.init_dirs(root_dir)
+    profiler = Profiler("test", root_dir)
+    with profiler.phase("generate_pcap"):
+        run_phase()
+    zip_file_name = files.get_zipped_bundle_filename("test", root_dir)
+    with ZipFile(zip_file_name, "w") as zipf:
+        for filename in files.get_profile_files("test", root_dir):
+            zipf.write(filename, arcname=filename.removeprefix(root_dir))
+    with profiler.phase("test_cases"):
+        run_phase()
+    add_to_bundle("test", root_dir)
+    add_to_bundle("test", root_dir)
+    with ZipFile(zip_file_name) as zipf:
+        names = zipf.namelist()
+    assert sorted(names) == sorted(
+        os.path.join("logs", f"test.{phase}.{suffix}")
+        for phase in ("generate_pcap", "test_cases") for suffix in ("prof", "profile.txt")
+    )
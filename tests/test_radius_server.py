@@ -0,0 +1,92 @@
+"""Test the built-in RADIUS server and codec."""
+
+import socket
+import pytest
+import src.radius as radius
+from src.radius_server import RadiusServer, CLASSES, CUI
+
+PORT = 18200
+SECRET = b"secret"
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = RadiusServer(str(tmp_path / "radius.log"), port=PORT, host="127.0.0.1",
+                          users={"raauser": "secret"})
+    server.start()
+    yield server
+    server.stop()
+
+
+def exchange(data: bytes, port=PORT, attempts=1) -> bytes:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(2)
+        responses = []
+        for _ in range(attempts):
+            sock.sendto(data, ("127.0.0.1", port))
+            responses.append(sock.recv(radius.MAX_PACKET_SIZE))
+        assert len(set(responses)) == 1
+        return responses[0]
+
+
+def access_request(password: bytes, identifier=1):
+    request = radius.RadiusPacket(radius.ACCESS_REQUEST, identifier, radius.new_authenticator())
+    request.add(radius.USER_NAME, "raauser")
+    request.add(radius.USER_PASSWORD, radius.encrypt_password(password, request.authenticator, SECRET))
+    data = request.encode()
+    return request, data
+
+
+def test_password_round_trip():
+    """Test User-Password hiding."""
+    authenticator = radius.new_authenticator()
+    for password in [b"", b"secret", b"a" * 16, b"b" * 40]:
+        hidden = radius.encrypt_password(password, authenticator, SECRET)
+        assert len(hidden) % 16 == 0
+        assert radius.decrypt_password(hidden, authenticator, SECRET) == password
+
+
+def test_access_accept(server):
+    """Test accepted users get the same reply attributes as from FreeRADIUS."""
+    request, data = access_request(b"secret")
+    response_data = exchange(data, attempts=2)
+    assert radius.verify_response(response_data, request.authenticator, SECRET)
+    assert radius.verify_message_authenticator(response_data, SECRET, request.authenticator)
+    response = radius.RadiusPacket.decode(response_data)
+    assert response.code == radius.ACCESS_ACCEPT
+    assert response.get(radius.CLASS) == [value.encode() for value in CLASSES]
+    assert response.get(radius.CHARGEABLE_USER_IDENTITY) == [CUI.encode()]
+    assert response.get_int(radius.ACCT_INTERIM_INTERVAL) == 10
+    # The retransmission got the cached response
+    assert server.counters["duplicates"] == 1
+    assert server.counters["access_requests"] == 1
+
+
+def test_access_reject(server):
+    """Test wrong password is rejected."""
+    _, data = access_request(b"wrong")
+    assert radius.RadiusPacket.decode(exchange(data)).code == radius.ACCESS_REJECT
+
+
+def test_accounting(server):
+    """Test Accounting-Requests are answered and bad authenticators dropped."""
+    request = radius.RadiusPacket(radius.ACCOUNTING_REQUEST, 2)
+    request.add(radius.ACCT_STATUS_TYPE, radius.ACCT_STATUS_START)
+    request.add(radius.ACCT_SESSION_ID, "session")
+    data = radius.encode_accounting_request(request, SECRET)
+    assert radius.verify_accounting_request(data, SECRET)
+    response_data = exchange(data, PORT + 1)
+    assert radius.RadiusPacket.decode(response_data).code == radius.ACCOUNTING_RESPONSE
+    assert radius.verify_response(response_data, request.authenticator, SECRET)
+
+    forged = radius.encode_accounting_request(request, b"other")
+    with pytest.raises(socket.timeout):
+        exchange(forged, PORT + 1)
+    assert server.counters["bad_authenticator"] == 1
+
+
+def test_port_in_use(server, tmp_path):
+    """Test start fails if the ports are taken."""
+    other = RadiusServer(str(tmp_path / "other.log"), port=PORT, host="127.0.0.1")
+    with pytest.raises(RuntimeError):
+        other.start()
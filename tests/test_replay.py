@@ -0,0 +1,71 @@
+"""Test replaying captures against the built-in RADIUS server."""
+
+import asyncio
+import pytest
+import src.radius as radius
+from src.pcap_file import read_pcap, get_udp_payload
+from src.pcapgen import PcapGenConfig, generate
+from src.radius_server import RadiusServer
+from src.replay import ReplayConfig, read_requests, replay, rewrite_request
+
+PORT = 18700
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("replay")
+    pcap_file = str(directory / "synthetic.pcap")
+    config = PcapGenConfig(sessions=20, users=4, concurrency=10, max_interims=3,
+                           retransmission_ratio=0.1, seed=2)
+    truth = generate(pcap_file, str(directory / "synthetic.truth.json"), config)
+    return pcap_file, truth
+
+
+def test_read_pcap():
+    """Test the raw reader sees the same UDP frames as tcpdump wrote."""
+    frames = [get_udp_payload(linktype, frame)
+              for _, linktype, frame in read_pcap("tests/data/pcaps/test_dl_5gb.tcpdump.radius.pcap")]
+    assert len(frames) == 388
+    assert all(frame is not None for frame in frames)
+
+
+def test_read_requests(synthetic):
+    """Test retransmissions in the capture are dropped, the replayer resends on its own."""
+    pcap_file, truth = synthetic
+    requests = read_requests(pcap_file)
+    assert len(requests) == truth["codes"]["1"] + truth["codes"]["4"] - truth["retransmissions"]
+    assert [request.timestamp for request in requests] == sorted(request.timestamp for request in requests)
+    assert len(read_requests(pcap_file, keep_retransmissions=True)) == truth["codes"]["1"] + truth["codes"]["4"]
+
+
+def test_rewrite_request():
+    """Test copies get their own user and session, and passwords follow the new secret."""
+    request = radius.RadiusPacket(radius.ACCESS_REQUEST, 7, radius.new_authenticator())
+    request.add(radius.USER_NAME, "raauser@example.com")
+    request.add(radius.USER_PASSWORD, radius.encrypt_password(b"pw", request.authenticator, b"old"))
+    request.add(radius.ACCT_SESSION_ID, "abc")
+    config = ReplayConfig(secret="new", original_secret="old", rewrite_usernames=True, rewrite_session_ids=True)
+    packet = rewrite_request(request, config, 2)
+    assert packet.get_first(radius.USER_NAME) == b"r2.raauser@example.com"
+    assert packet.get_first(radius.ACCT_SESSION_ID) == b"abc-r2"
+    hidden = packet.get_first(radius.USER_PASSWORD)
+    assert radius.decrypt_password(hidden, packet.authenticator, b"new") == b"pw"
+    assert rewrite_request(request, config, 0).get_first(radius.USER_NAME) == b"raauser@example.com"
+
+
+def test_replay(synthetic, tmp_path):
+    """Test every copy of every request is answered without retransmissions."""
+    pcap_file, _ = synthetic
+    requests = read_requests(pcap_file)
+    server = RadiusServer(str(tmp_path / "radius.log"), port=PORT, host="127.0.0.1")
+    server.start()
+    try:
+        config = ReplayConfig(radius_port=PORT, speed=0, copies=2, rewrite_usernames=True,
+                              rewrite_session_ids=True, timeout=1)
+        result = asyncio.run(replay(requests, config))
+    finally:
+        server.stop()
+    assert result.requests == 2 * len(requests)
+    assert result.responses == 2 * len(requests)
+    assert result.timeouts == result.invalid_responses == result.retransmissions == 0
+    assert server.counters["duplicates"] == 0
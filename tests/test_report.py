@@ -0,0 +1,90 @@
+"""Test reports are rendered from the results file without running test cases."""
+
+import json
+import os
+from zipfile import ZipFile
+import src.files as files
+import src.report as report
+from test_metadata import create_metadata
+
+
+def write_test(root_dir: str, test_name="test", capture_health=None):
+    """Write metadata, an empty pcap and results of a test."""
+    files.init_dirs(root_dir)
+    metadata = create_metadata("user0", "wlan0")
+    metadata.capture_health = capture_health
+    with open(files.get_metadata_filename(test_name, root_dir), "w", encoding="utf-8") as file:
+        json.dump(metadata.get_dict(), file)
+    with open(files.get_pcap_filename(test_name, root_dir), "wb"):
+        pass
+    with open(files.get_config_filename(test_name, root_dir), "w", encoding="utf-8") as file:
+        file.write("test_name: test\n")
+    report.write_results(test_name, root_dir, [
+        report.TestCaseResult("test_core.py::TestAttributeChecks::test_cui_echoed", ["core"], "passed"),
+        report.TestCaseResult("test_core.py::TestAccuracyChecks::test_session_duration_accuracy", ["core"],
+                              "failed", "Session Time: 1773 <&>\n", 0.01, {"values": {"lower_bound": 18.5}}),
+    ])
+
+
+def test_results_round_trip(tmp_path):
+    """Test results read back equal those written, with the test's metadata."""
+    root_dir = str(tmp_path)
+    write_test(root_dir)
+    results = report.read_results("test", root_dir)
+    assert results.get_metadata().username == "user0"
+    assert [result.outcome for result in results.results] == ["passed", "failed"]
+    assert results.results[1].category == "TestAccuracyChecks"
+    assert results.results[1].test_case == "test_session_duration_accuracy"
+    assert results.results[1].check == {"values": {"lower_bound": 18.5}}
+    assert results.count("failed") == 1
+
+
+def test_render_and_bundle(tmp_path):
+    """Test PDF and HTML are rendered and bundled with the results."""
+    root_dir = str(tmp_path)
+    write_test(root_dir)
+    reports = report.render("test", root_dir, [report.PDF, report.HTML], bundle=True)
+    assert reports == [files.get_report_filename("test", root_dir), files.get_html_report_filename("test", root_dir)]
+    with open(reports[1], encoding="utf-8") as file:
+        page = file.read()
+    assert "Session Time: 1773 &lt;&amp;&gt;" in page
+    assert "Passed: 1, Failed: 1, Total: 2" in page
+    with ZipFile(files.get_zipped_bundle_filename("test", root_dir)) as zipf:
+        names = zipf.namelist()
+    assert "reports/test.results.json" in names
+    assert "reports/test.pdf" in names
+
+
+def test_render_in_background(tmp_path):
+    """Test a batch of tests is rendered by a background process."""
+    root_dir = str(tmp_path)
+    write_test(root_dir, "test_a")
+    write_test(root_dir, "test_b")
+    report.start_render("test_a", root_dir, [report.HTML], bundle=False)
+    assert report.wait_for_renders(60)
+    assert os.path.exists(files.get_html_report_filename("test_a", root_dir))
+    report.render_many(["test_a", "test_b"], root_dir, [report.PDF], workers=2)
+    assert os.path.exists(files.get_report_filename("test_b", root_dir))
+
+
+def test_unreliable_capture_warning(tmp_path):
+    """Test an unreliable capture is called out above the metadata and a reliable one is not."""
+    health = {
+        "stats": {"engine": "ring", "packets_captured": 10, "packets_dropped_by_kernel": 3,
+                  "packets_dropped_by_interface": 0},
+        "requests": 5, "responses": 4, "retransmissions": 0, "unanswered_requests": ["code 1 id 4"],
+        "unmatched_responses": 0, "missing_identifiers": [], "complete": False, "reliable": False,
+    }
+    root_dir = str(tmp_path)
+    write_test(root_dir, "unreliable", health)
+    write_test(root_dir, "reliable", {**health, "reliable": True})
+    unreliable = report.render("unreliable", root_dir, [report.PDF, report.HTML])
+    reliable = report.render("reliable", root_dir, [report.HTML])
+    with open(unreliable[1], encoding="utf-8") as file:
+        page = file.read()
+    assert '<p class="warning">WARNING: the capture may be incomplete' in page
+    assert "dropped by kernel: 3, unanswered requests: 1" in page
+    assert page.index('class="warning"') < page.index("Test Metadata")
+    assert os.path.exists(unreliable[0])
+    with open(reliable[0], encoding="utf-8") as file:
+        assert 'class="warning"' not in file.read()
@@ -0,0 +1,70 @@
+"""Test phase spans are written as a Chrome trace."""
+
+import json
+import threading
+import src.tracing as tracing
+
+
+def read_spans(filename):
+    with open(filename, "r", encoding="utf-8") as file:
+        events = json.load(file)["traceEvents"]
+    return [event for event in events if event["ph"] == "X"]
+
+
+def threaded():
+    with tracing.span("threaded"):
+        pass
+
+
+def test_span_without_trace():
+    """Test spans cost nothing when no trace was started."""
+    assert tracing.get_tracer() is None
+    with tracing.span("untraced"):
+        pass
+
+
+def test_trace_merges_processes(tmp_path):
+    """Test nested and threaded spans are recorded and later writers append to the trace."""
+    filename = str(tmp_path / "logs" / "test.trace.json")
+    tracing.start_trace(filename, "capture", reset=True)
+    with tracing.span("outer", test_name="test"):
+        with tracing.span("inner"):
+            pass
+        thread = threading.Thread(target=threaded)
+        thread.start()
+        thread.join()
+    tracing.stop_trace()
+    assert tracing.get_tracer() is None
+
+    spans = {span["name"]: span for span in read_spans(filename)}
+    assert set(spans) == {"outer", "inner", "threaded"}
+    assert spans["threaded"]["tid"] != spans["outer"]["tid"]
+    assert spans["outer"]["args"] == {"test_name": "test"}
+    assert spans["outer"]["ts"] <= spans["inner"]["ts"]
+    assert spans["inner"]["ts"] + spans["inner"]["dur"] <= spans["outer"]["ts"] + spans["outer"]["dur"]
+
+    tracing.start_trace(filename, "test cases")
+    with tracing.span("pytest"):
+        pass
+    tracing.stop_trace()
+    assert [span["name"] for span in read_spans(filename)][-1] == "pytest"
+    assert len(read_spans(filename)) == 4
+
+    # A new run starts a new trace
+    tracing.start_trace(filename, "capture", reset=True)
+    tracing.stop_trace()
+    assert read_spans(filename) == []
+
+
+def test_flush_trace(tmp_path):
+    """Test spans written early are kept once and later spans are merged after them."""
+    filename = str(tmp_path / "logs" / "test.trace.json")
+    tracing.start_trace(filename, "test cases", reset=True)
+    with tracing.span("test case"):
+        pass
+    tracing.flush_trace()
+    assert [span["name"] for span in read_spans(filename)] == ["test case"]
+    with tracing.span("render reports"):
+        pass
+    tracing.stop_trace()
+    assert [span["name"] for span in read_spans(filename)] == ["test case", "render reports"]
@@ -0,0 +1,92 @@
+"""Test the wpa_supplicant control interface client against a fake control socket."""
+
+import os
+import socket
+import threading
+import pytest
+from src.wpa_ctrl import WpaCtrlClient
+
+CTRL_DIR = "/tmp/raatest_wpa_ctrl"
+INTERFACE = "wlan_test"
+EVENTS = [
+    "<3>CTRL-EVENT-EAP-STARTED EAP authentication started",
+    "<3>CTRL-EVENT-EAP-SUCCESS EAP authentication completed successfully",
+    "<3>CTRL-EVENT-CONNECTED - Connection to 00:11:22:33:44:55 completed",
+    "<3>CTRL-EVENT-DISCONNECTED bssid=00:11:22:33:44:55 reason=3",
+    "<3>CTRL-EVENT-EAP-STARTED EAP authentication started",
+    "<3>CTRL-EVENT-CONNECTED - Connection to 00:11:22:33:44:55 completed",
+]
+
+
+@pytest.fixture
+def fake_wpa_supplicant():
+    """Answer ATTACH and ENABLE_NETWORK, then send events like wpa_supplicant does."""
+    os.makedirs(CTRL_DIR, exist_ok=True)
+    path = os.path.join(CTRL_DIR, INTERFACE)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    server.bind(path)
+
+    def serve():
+        while True:
+            data, client = server.recvfrom(4096)
+            if data == b"DETACH":
+                break
+            server.sendto(b"OK\n", client)
+            if data == b"TERMINATE":
+                server.sendto(EVENTS[3].encode(), client)
+            if data == b"ENABLE_NETWORK all":
+                for event in EVENTS:
+                    server.sendto(event.encode(), client)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield
+    thread.join(timeout=2)
+    server.close()
+    os.unlink(path)
+
+
+def test_events(fake_wpa_supplicant):
+    """Test events are recorded and summarized."""
+    client = WpaCtrlClient(INTERFACE, ctrl_dir=CTRL_DIR)
+    client.connect(timeout=2)
+    client.attach()
+    assert client.request("ENABLE_NETWORK all") == "OK"
+    first = client.wait_for_event("CTRL-EVENT-CONNECTED", timeout=2)
+    assert first is not None
+    second = client.wait_for_event("CTRL-EVENT-CONNECTED", timeout=2, after=first.perf_counter + 1e-9)
+    assert second is not None
+    client.close()
+    summary = client.get_summary()
+    assert summary["auth_latency"] >= 0
+    assert summary["connect_latency"] >= summary["auth_latency"]
+    assert summary["reauthentications"] == 1
+    assert summary["reconnects"] == 1
+    assert summary["disconnects"] == 1
+    assert len(summary["events"]) == len(EVENTS)
+
+
+def test_teardown_disconnect_not_counted(fake_wpa_supplicant):
+    """Test the disconnect reported while wpa_supplicant exits is recorded but not counted."""
+    client = WpaCtrlClient(INTERFACE, ctrl_dir=CTRL_DIR)
+    client.connect(timeout=2)
+    client.attach()
+    client.request("ENABLE_NETWORK all")
+    first = client.wait_for_event("CTRL-EVENT-CONNECTED", timeout=2)
+    client.wait_for_event("CTRL-EVENT-CONNECTED", timeout=2, after=first.perf_counter + 1e-9)
+    client.mark_teardown()
+    client.request("TERMINATE")
+    assert client.wait_for_event("CTRL-EVENT-DISCONNECTED", timeout=2, after=client.teardown) is not None
+    client.close()
+    summary = client.get_summary()
+    assert summary["disconnects"] == 1
+    assert len(summary["events"]) == len(EVENTS) + 1
+
+
+def test_connect_timeout():
+    """Test a clear error if the control socket never shows up."""
+    client = WpaCtrlClient("wlan_missing", ctrl_dir=CTRL_DIR)
+    with pytest.raises(RuntimeError, match="not ready"):
+        client.connect(timeout=0.2)